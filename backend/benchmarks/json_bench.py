@@ -0,0 +1,131 @@
+"""
+Benchmark pentru serializarea JSON: compară throughput-ul endpoint-urilor cu FAST_JSON
+dezactivat (json standard + validarea response_model) și activat (orjson + model_dump_json).
+
+Rulare (din directorul backend; necesită mongomock-motor, orjson opțional):
+    python -m benchmarks.json_bench [--seconds 3]
+
+Aplicația rulează în proces (httpx.ASGITransport), MongoDB este înlocuit cu mongomock-motor,
+iar MAIB cu un httpx.MockTransport, deci se măsoară doar costul din backend.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "json_bench")
+os.environ.setdefault("MAIB_TOKEN_PREFETCH", "false")
+os.environ.setdefault("MAIB_TOKEN_SHARED_STORE", "false")
+# toți utilizatorii virtuali vin de pe aceeași adresă: limitarea per client ar măsura doar 429-uri
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import fast_json  # noqa: E402
+import server  # noqa: E402
+from maib_service import MaibPaymentService  # noqa: E402
+
+MAIB_STATUS_RESULT = {
+    "payId": "f16a9006-128a-46bc-8e2a-77a6ee99df75",
+    "orderId": "ORD-1001",
+    "status": "PENDING",
+    "statusCode": "000",
+    "statusMessage": "Pending",
+    "amount": 1250.5,
+    "currency": "MDL",
+    "items": [{"id": f"gene-{i}", "name": f"Gene {i} mm", "price": 12.5, "quantity": 1} for i in range(50)],
+}
+
+ROUNDS = 3
+
+
+def maib_handler(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path.endswith("/generate-token"):
+        return httpx.Response(200, json={"ok": True, "result": {"accessToken": "token", "expiresIn": 300}})
+    if path.startswith("/v1/pay-info/"):
+        return httpx.Response(200, json={"ok": True, "result": MAIB_STATUS_RESULT})
+    return httpx.Response(200, json={"ok": True, "result": {"payId": str(uuid.uuid4()), "payUrl": "https://maib.test/pay"}})
+
+
+def session_body() -> dict:
+    return {
+        "amount": 1250.5,
+        "orderId": f"ORD-{uuid.uuid4().hex[:10]}",
+        "orderDescription": "Comandă Address Beauty",
+        "customerEmail": "client@example.com",
+        "customerName": "Client Test",
+        "callbackUrl": "https://example.com/api/payment/maib/callback",
+        "redirectUrl": "https://example.com/plata-reusita",
+        "items": [{"id": f"gene-{i}", "name": f"Gene {i} mm", "price": 12.5, "quantity": 1} for i in range(20)],
+    }
+
+
+async def measure(label: str, call, seconds: float) -> float:
+    for _ in range(20):
+        await call()
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        response = await call()
+        response.raise_for_status()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+async def main(seconds: float) -> None:
+    db = AsyncMongoMockClient()["json_bench"]
+    server.db = db
+    server.maib_ledger.collection = db.maib_payments
+    server.maib_status_cache.pending_ttl = 0
+    MaibPaymentService.http_client = httpx.AsyncClient(transport=httpx.MockTransport(maib_handler))
+
+    started = datetime(2024, 1, 1)
+    await db.status_checks.insert_many([
+        {"id": f"{i:08d}", "client_name": f"agent-{i % 50}", "timestamp": started + timedelta(seconds=i)}
+        for i in range(5000)
+    ])
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench")
+    scenarios = {
+        "GET /api/status?limit=500": lambda: client.get("/api/status", params={"limit": 500}),
+        "POST /api/status": lambda: client.post("/api/status", json={"client_name": "agent"}),
+        "POST maib/session": lambda: client.post("/api/payment/maib/session", json=session_body()),
+        "POST maib/status": lambda: client.post(
+            "/api/payment/maib/status", json={"payId": str(uuid.uuid4())}
+        ),
+    }
+
+    print(f"orjson available: {fast_json.ORJSON_AVAILABLE}")
+    print(f"{'scenario':<28}{'default req/s':>15}{'fast req/s':>13}{'speedup':>10}")
+    for label, call in scenarios.items():
+        # runde alternate, cu registrul golit înainte de fiecare: mongomock scanează liniar,
+        # iar o colecție care crește ar dezavantaja varianta măsurată a doua
+        best = {False: 0.0, True: 0.0}
+        for _ in range(ROUNDS):
+            for enabled in (False, True):
+                await db.maib_payments.delete_many({})
+                await db.status_checks.delete_many({"client_name": "agent"})
+                fast_json.FAST_JSON_CONFIG['enabled'] = enabled
+                best[enabled] = max(best[enabled], await measure(label, call, seconds / ROUNDS))
+        print(f"{label:<28}{best[False]:>15.0f}{best[True]:>13.0f}{best[True] / best[False]:>9.2f}x")
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark serializare JSON (FAST_JSON)")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(main(args.seconds))
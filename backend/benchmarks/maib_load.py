@@ -0,0 +1,164 @@
+"""
+Generator de încărcare pentru fluxul de plată MAIB, end-to-end prin aplicația FastAPI.
+
+Fiecare utilizator virtual repetă: creare sesiune -> polling status până la un status final
+(callback-ul vine de la simulator sau, cu --callbacks direct, este trimis de generator).
+
+Rulare (din directorul backend), cu simulatorul și backend-ul pornite:
+    uvicorn maib_simulator:app --port 8100
+    RATE_LIMIT_ENABLED=false MAIB_API_URL=http://localhost:8100 uvicorn server:app --port 8000
+    python -m benchmarks.maib_load --users 50 --duration 30
+
+Toți utilizatorii virtuali vin de pe aceeași adresă, deci backend-ul trebuie pornit fără limitarea
+per client (RATE_LIMIT_ENABLED=false) sau cu limite mărite (RATE_LIMIT_RATE / RATE_LIMIT_BURST);
+altfel aproape fiecare flux se oprește cu 429 (numărate separat în raport).
+
+Raportează throughput și percentilele de latență (p50/p90/p99/max) per etapă.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from maib_signature import MaibCallbackVerifier  # noqa: E402
+
+TERMINAL_STATUSES = {"OK", "SUCCESS", "APPROVED", "FAILED", "FAIL", "DECLINED", "CANCELLED", "REVERSED"}
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def observe(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.steps: Dict[str, StepStats] = {}
+        self.signer = MaibCallbackVerifier(args.signature_key)
+        self.flows_completed = 0
+        self.flows_failed = 0
+        self.rate_limited = 0
+
+    def step(self, name: str) -> StepStats:
+        if name not in self.steps:
+            self.steps[name] = StepStats()
+        return self.steps[name]
+
+    async def timed(self, name: str, coro):
+        started = time.perf_counter()
+        try:
+            response = await coro
+            response.raise_for_status()
+            return response
+        except Exception as e:
+            self.step(name).errors += 1
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                self.rate_limited += 1
+            raise
+        finally:
+            self.step(name).observe(time.perf_counter() - started)
+
+    async def flow(self, client: httpx.AsyncClient) -> None:
+        order_id = f"load-{uuid.uuid4().hex[:12]}"
+        amount = 100.0
+        started = time.perf_counter()
+        session = await self.timed("session", client.post("/api/payment/maib/session", json={
+            "amount": amount,
+            "currency": "MDL",
+            "orderId": order_id,
+            "orderDescription": "Load test",
+            "customerEmail": "load@example.com",
+            "customerName": "Load Test",
+            "callbackUrl": self.args.callback_url,
+            "redirectUrl": "http://localhost:3000/plata-reusita",
+        }))
+        pay_id = session.json()["payId"]
+
+        if self.args.callbacks == "direct":
+            result = {"payId": pay_id, "orderId": order_id, "status": "OK", "statusCode": "000",
+                      "statusMessage": "Approved", "amount": amount, "currency": "MDL"}
+            await self.timed("callback", client.post("/api/payment/maib/callback", json={
+                "result": result, "signature": self.signer.result_signature(result).decode("ascii"),
+            }))
+
+        for _ in range(self.args.max_polls):
+            status = await self.timed("status", client.post(
+                "/api/payment/maib/status", json={"payId": pay_id, "orderId": order_id}
+            ))
+            if str(status.json().get("status") or "").upper() in TERMINAL_STATUSES:
+                self.step("end_to_end").observe(time.perf_counter() - started)
+                self.flows_completed += 1
+                return
+            await asyncio.sleep(self.args.poll_interval)
+        self.flows_failed += 1
+
+    async def user(self, client: httpx.AsyncClient, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            try:
+                await self.flow(client)
+            except Exception:
+                self.flows_failed += 1
+
+    async def run(self) -> float:
+        limits = httpx.Limits(max_connections=self.args.users, max_keepalive_connections=self.args.users)
+        async with httpx.AsyncClient(base_url=self.args.base_url, limits=limits, timeout=60) as client:
+            started = time.perf_counter()
+            deadline = started + self.args.duration
+            await asyncio.gather(*(self.user(client, deadline) for _ in range(self.args.users)))
+            return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> None:
+        print(f"users={self.args.users} duration={elapsed:.1f}s "
+              f"flows ok={self.flows_completed} failed={self.flows_failed} "
+              f"({self.flows_completed / elapsed:.1f} flows/s)")
+        if self.rate_limited:
+            print(f"atenție: {self.rate_limited} răspunsuri 429 - porniți backend-ul cu RATE_LIMIT_ENABLED=false")
+        print(f"{'step':<12}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, stats in self.steps.items():
+            lat = stats.latencies
+            print(f"{name:<12}{len(lat):>8}{stats.errors:>8}{len(lat) / elapsed:>9.1f}"
+                  f"{percentile(lat, 50) * 1000:>9.1f}{percentile(lat, 90) * 1000:>9.1f}"
+                  f"{percentile(lat, 99) * 1000:>9.1f}{(max(lat) if lat else 0) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test pentru fluxul de plată MAIB")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--max-polls", type=int, default=20)
+    parser.add_argument("--callbacks", choices=("simulator", "direct"), default="simulator",
+                        help="cine trimite callback-ul: simulatorul MAIB sau generatorul")
+    parser.add_argument("--callback-url", default="http://localhost:8000/api/payment/maib/callback")
+    parser.add_argument("--signature-key",
+                        default=os.getenv('MAIB_SIGNATURE_KEY', '4fa8f893-7f39-4f13-b5c2-34e6629b84dc'))
+    args = parser.parse_args()
+
+    test = LoadTest(args)
+    elapsed = asyncio.run(test.run())
+    test.report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
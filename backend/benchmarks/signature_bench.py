@@ -0,0 +1,87 @@
+"""
+Micro-benchmark pentru verificarea semnăturii callback-urilor MAIB.
+
+Rulare (din directorul backend):
+    python -m benchmarks.signature_bench [--seconds 2]
+
+Afișează verificări/secundă pentru formatul cu "result" și pentru formatul plat,
+comparativ cu o implementare de referință (dict filtrat + f-string la fiecare apel).
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from maib_signature import MaibCallbackVerifier  # noqa: E402
+
+SIGNATURE_KEY = "4fa8f893-7f39-4f13-b5c2-34e6629b84dc"
+
+RESULT = {
+    "payId": "f16a9006-128a-46bc-8e2a-77a6ee99df75",
+    "orderId": "123",
+    "status": "OK",
+    "statusCode": "000",
+    "statusMessage": "Approved",
+    "threeDs": "AUTHENTICATED",
+    "rrn": "331711380059",
+    "approval": "327593",
+    "cardNumber": "510218******1124",
+    "amount": 10.25,
+    "currency": "MDL",
+}
+
+
+def naive_result_signature(result, key):
+    values = [str(result[k]) for k in sorted(result)]
+    values.append(key)
+    return base64.b64encode(hashlib.sha256(":".join(values).encode("utf-8")).digest()).decode()
+
+
+def naive_legacy_signature(data, key):
+    filtered = {k: v for k, v in data.items() if k != "signature"}
+    parts = [f"{k}={'' if filtered[k] is None else filtered[k]}" for k in sorted(filtered)]
+    return hashlib.sha256(f"{'&'.join(parts)}&key={key}".encode("utf-8")).hexdigest()
+
+
+def run(label, fn, seconds):
+    # încălzire
+    for _ in range(1000):
+        fn()
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            fn()
+        count += 1000
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {count / elapsed:>12,.0f} verif/s  {elapsed / count * 1e6:>8.2f} µs/verif")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="durata fiecărui benchmark")
+    args = parser.parse_args()
+
+    verifier = MaibCallbackVerifier(SIGNATURE_KEY)
+
+    nested = {"result": RESULT, "signature": naive_result_signature(RESULT, SIGNATURE_KEY)}
+    flat = dict(RESULT)
+    flat["signature"] = naive_legacy_signature(flat, SIGNATURE_KEY)
+    assert verifier.verify(nested) and verifier.verify(flat)
+
+    run("verifier (result format)", lambda: verifier.verify(nested), args.seconds)
+    run("reference (result format)", lambda: hmac.compare_digest(
+        naive_result_signature(nested["result"], SIGNATURE_KEY), nested["signature"]), args.seconds)
+    run("verifier (flat format)", lambda: verifier.verify(flat), args.seconds)
+    run("reference (flat format)", lambda: hmac.compare_digest(
+        naive_legacy_signature(flat, SIGNATURE_KEY), flat["signature"]), args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Catalog Cache
+Cache in-process pentru datele de catalog citite din Supabase (ex. opțiunile variantelor gene),
+invalidat prin versiunea tabelei din `catalog_versions` (incrementată de un trigger la orice
+modificare pe tabelă). Versiunea se verifică cel mult o dată la `version_check_interval` secunde,
+deci între verificări răspunsurile nu costă niciun apel către baza de date.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ttl_cache import TTLCache, ValueLoader
+
+# Configurație cache catalog
+CATALOG_CACHE_CONFIG = {
+    'max_entries': int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', '2000')),
+    # plasă de siguranță dacă versiunea nu poate fi citită
+    'ttl': float(os.getenv('CATALOG_CACHE_TTL', '600')),
+    # cât de veche poate fi o intrare după o modificare în catalog
+    'version_check_interval': float(os.getenv('CATALOG_CACHE_VERSION_CHECK_INTERVAL', '5')),
+}
+
+VersionLoader = Callable[[], Awaitable[Optional[int]]]
+
+
+class CatalogCache(TTLCache):
+    """Cache LRU cu TTL pentru o tabelă de catalog, golit când versiunea tabelei se schimbă"""
+
+    def __init__(
+        self,
+        version_loader: VersionLoader,
+        max_entries: int = CATALOG_CACHE_CONFIG['max_entries'],
+        ttl: float = CATALOG_CACHE_CONFIG['ttl'],
+        version_check_interval: float = CATALOG_CACHE_CONFIG['version_check_interval'],
+    ):
+        super().__init__(max_entries, ttl)
+        self.version_loader = version_loader
+        self.version_check_interval = version_check_interval
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._version_lock: Optional[asyncio.Lock] = None
+        self.invalidations = 0
+
+    async def check_version(self) -> Optional[int]:
+        """Recitește versiunea dacă a trecut intervalul; la schimbare golește cache-ul."""
+        if time.monotonic() - self._checked_at < self.version_check_interval:
+            return self.version
+        if self._version_lock is None:
+            self._version_lock = asyncio.Lock()
+        async with self._version_lock:
+            # alt request a verificat între timp
+            if time.monotonic() - self._checked_at < self.version_check_interval:
+                return self.version
+            version = await self.version_loader()
+            self._checked_at = time.monotonic()
+            if version != self.version:
+                # golirea scoate și încărcările în curs, deci o valoare de dinainte de schimbare
+                # nu mai ajunge în cache
+                if self.version is not None:
+                    self.invalidate()
+                self.version = version
+        return self.version
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        if key is None:
+            self.invalidations += 1
+        super().invalidate(key)
+
+    async def get_or_load(self, key: str, loader: ValueLoader) -> Any:
+        try:
+            await self.check_version()
+        except Exception:
+            # versiunea nu poate fi citită: servim din cache până la TTL
+            self._checked_at = time.monotonic()
+        return await super().get_or_load(key, loader)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "version": self.version, "invalidations": self.invalidations}
@@ -0,0 +1,67 @@
+"""
+Fast JSON
+Cale opțională de serializare rapidă (FAST_JSON=true): orjson pentru răspunsurile API și pentru
+parsarea răspunsurilor MAIB, model_dump_json direct pentru modelele Pydantic. Fără orjson
+instalat sau cu FAST_JSON=false se folosește json din biblioteca standard, cu același rezultat.
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+# orjson este opțional
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+FAST_JSON_CONFIG = {
+    'enabled': os.getenv('FAST_JSON', 'false').lower() == 'true',
+}
+
+
+def _use_orjson() -> bool:
+    return FAST_JSON_CONFIG['enabled'] and ORJSON_AVAILABLE
+
+
+def _default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value: Any) -> bytes:
+    """Serializează compact (UTF-8); datetime devine ISO 8601 în ambele variante."""
+    if _use_orjson():
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if _use_orjson():
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse randat cu orjson când FAST_JSON este activ (clasa implicită a aplicației)."""
+
+    def render(self, content: Any) -> bytes:
+        if _use_orjson():
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(content)
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> Union[BaseModel, Response]:
+    """
+    Cu FAST_JSON activ, serializează modelul direct cu model_dump_json, fără ca FastAPI
+    să-l mai valideze o dată față de response_model; altfel îl returnează neschimbat.
+    """
+    if not FAST_JSON_CONFIG['enabled']:
+        return model
+    return Response(model.model_dump_json(), status_code=status_code, media_type="application/json")
@@ -0,0 +1,98 @@
+"""
+Insert Batcher
+Micro-batching pentru scrierile mici în MongoDB: insert-urile venite în câteva milisecunde
+sunt grupate într-un singur insert_many(ordered=False), iar fiecare apelant primește
+rezultatul propriului document.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_FLUSH_SIZE = REGISTRY.histogram(
+    'mongo_insert_batch_size', 'Numărul de documente scrise la un flush al micro-batcher-ului',
+    ['collection'], buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+BATCH_FLUSH_SECONDS = REGISTRY.histogram(
+    'mongo_insert_batch_flush_seconds', 'Durata insert_many la un flush al micro-batcher-ului',
+    ['collection'],
+)
+BATCH_WAIT_SECONDS = REGISTRY.histogram(
+    'mongo_insert_batch_wait_seconds', 'Cât a stat un document în buffer până la scriere',
+    ['collection'],
+)
+
+PendingInsert = Tuple[Dict[str, Any], asyncio.Future, float]
+
+
+class InsertBatcher:
+    """Bufferează insert-urile unei colecții și le scrie împreună"""
+
+    def __init__(self, collection, max_batch: int = 500, max_delay: float = 0.005):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.name = getattr(collection, "name", "unknown")
+        self._pending: List[PendingInsert] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Set[asyncio.Task] = set()
+
+    async def insert(self, doc: Dict[str, Any]) -> None:
+        """Adaugă documentul în batch-ul curent și așteaptă scrierea lui."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((doc, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._write(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _write(self, batch: List[PendingInsert]) -> None:
+        started = time.perf_counter()
+        for _, _, queued_at in batch:
+            BATCH_WAIT_SECONDS.observe(started - queued_at, collection=self.name)
+        failed: Dict[int, Exception] = {}
+        try:
+            await self.collection.insert_many([doc for doc, _, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # ordered=False: restul documentelor au fost scrise, raportăm doar erorile
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = Exception(error.get("errmsg", "write error"))
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} inserts into {self.name}: {str(e)}")
+            failed = {i: e for i in range(len(batch))}
+        finally:
+            BATCH_FLUSH_SIZE.observe(len(batch), collection=self.name)
+            BATCH_FLUSH_SECONDS.observe(time.perf_counter() - started, collection=self.name)
+
+        for i, (_, future, _) in enumerate(batch):
+            if future.done():
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(None)
+
+    async def stop(self) -> None:
+        """Scrie ce a rămas în buffer (la oprirea aplicației)."""
+        self._flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
@@ -0,0 +1,176 @@
+"""
+Logging Configuration
+Configurarea logging-ului aplicației: format text sau JSON pe o singură linie, scriere
+non-blocantă (QueueHandler + QueueListener pe un thread separat) și jurnalizarea payload-urilor
+MAIB cu redactare, serializare leneșă și eșantionare pe calea de succes.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from settings import load_env
+
+load_env()
+
+# Configurație logging
+LOGGING_CONFIG = {
+    'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+    # text = formatul clasic, json = un obiect JSON compact per linie
+    'format': os.getenv('LOG_FORMAT', 'text').lower(),
+    # scrierea efectivă se face pe un thread separat, nu în event loop
+    'async': os.getenv('LOG_ASYNC', 'true').lower() == 'true',
+    # pentru ce fracțiune din răspunsurile MAIB reușite se loghează și payload-ul (linia de log
+    # este scrisă mereu; erorile sunt logate integral mereu)
+    'payload_sample_rate': float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.1')),
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Chei ale căror valori nu ajung niciodată în log-uri
+REDACTED_KEYS = frozenset({
+    'accesstoken', 'refreshtoken', 'token', 'authorization', 'projectsecret', 'signature',
+    'signaturekey', 'password', 'email', 'customeremail', 'phone', 'customerphone',
+    'cardnumber', 'clientip',
+})
+
+REDACTED = '***'
+
+_EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+
+# Atributele standard ale unui LogRecord; restul sunt câmpuri `extra` incluse în JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(value: Any) -> Any:
+    """Copie a payload-ului cu token-urile, semnăturile și datele personale mascate."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in REDACTED_KEYS and value[key] not in (None, '') else redact(value[key])
+            for key in value
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str) and '@' in value:
+        return _EMAIL_RE.sub(REDACTED, value)
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formatul text clasic; payload-ul (dacă există) este adăugat compact, pe aceeași linie."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            line = f"{line} {_dumps(redact(payload))}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Un obiect JSON per linie: timestamp, nivel, logger, mesaj și câmpurile `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = redact(value)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return _dumps(entry)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler care nu formatează în thread-ul apelant: mesajul este interpolat, iar
+    traceback-ul și payload-ul sunt serializate de listener, pe thread-ul lui.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # mai bine pierdem o linie de log decât să blocăm event loop-ul
+            pass
+
+
+def configure_logging() -> None:
+    """Configurează root logger-ul conform LOGGING_CONFIG (apelat o singură dată, la pornirea aplicației)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOGGING_CONFIG['format'] == 'json' else TextFormatter(TEXT_FORMAT)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(LOGGING_CONFIG['level'])
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if not LOGGING_CONFIG['async']:
+        root.addHandler(stream_handler)
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOGGING_CONFIG['queue_size'])
+    root.addHandler(_QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Golește coada de log-uri și oprește thread-ul listener-ului."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any,
+                level: int = logging.INFO, sampled: bool = True) -> None:
+    """
+    Loghează un payload (ex. răspuns MAIB) ca atribut `payload` al record-ului.
+
+    Payload-ul este redactat și serializat doar de formatter, deci numai dacă nivelul este
+    activ. Linia cu mesajul este scrisă mereu; cu `sampled=True` (calea de succes) payload-ul
+    este atașat doar pentru o fracțiune din apeluri.
+    Payload-ul nu trebuie modificat după apel (serializarea are loc ulterior).
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sampled and random.random() >= LOGGING_CONFIG['payload_sample_rate']:
+        logger.log(level, message)
+        return
+    logger.log(level, message, extra={'payload': payload})
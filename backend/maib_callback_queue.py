@@ -0,0 +1,282 @@
+"""
+MAIB Callback Queue
+Coadă asincronă pentru callback-urile MAIB: endpoint-ul salvează callback-ul în MongoDB
+(colecția maib_callback_inbox) și răspunde imediat, iar un grup de consumatori din background
+îl procesează (semnătură, registru, status comandă) cu reîncercări. Callback-urile care nu încap
+în coada din memorie sau care rămân neprocesate la un restart sunt reluate din MongoDB.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Configurație coadă callback-uri
+MAIB_CALLBACK_QUEUE_CONFIG = {
+    'max_size': int(os.getenv('MAIB_CALLBACK_QUEUE_MAX_SIZE', '1000')),
+    'workers': int(os.getenv('MAIB_CALLBACK_WORKERS', '4')),
+    'max_attempts': int(os.getenv('MAIB_CALLBACK_MAX_ATTEMPTS', '5')),
+    'retry_base_delay': float(os.getenv('MAIB_CALLBACK_RETRY_BASE_DELAY', '2')),
+    # cât timp un consumator deține un callback înainte să fie considerat abandonat
+    'lock_seconds': float(os.getenv('MAIB_CALLBACK_LOCK_SECONDS', '60')),
+    'sweep_interval': float(os.getenv('MAIB_CALLBACK_SWEEP_INTERVAL', '5')),
+    # callback-urile procesate sunt șterse automat din inbox după această perioadă
+    'retention_seconds': int(os.getenv('MAIB_CALLBACK_RETENTION_SECONDS', str(7 * 24 * 3600))),
+}
+
+CallbackHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# (id document, payload, momentul punerii în coadă - time.monotonic())
+QueueItem = Tuple[Optional[str], Dict[str, Any], float]
+
+
+class LatencyStats:
+    """Statistici simple (count/avg/max/last) pentru o durată măsurată în secunde"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avgMs": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "maxMs": round(self.max * 1000, 3),
+            "lastMs": round(self.last * 1000, 3),
+        }
+
+
+class CallbackQueue:
+    """Coadă limitată în memorie + inbox durabil în MongoDB pentru callback-urile MAIB"""
+
+    def __init__(
+        self,
+        collection,
+        handler: CallbackHandler,
+        max_size: int = MAIB_CALLBACK_QUEUE_CONFIG['max_size'],
+        workers: int = MAIB_CALLBACK_QUEUE_CONFIG['workers'],
+        max_attempts: int = MAIB_CALLBACK_QUEUE_CONFIG['max_attempts'],
+        retry_base_delay: float = MAIB_CALLBACK_QUEUE_CONFIG['retry_base_delay'],
+        lock_seconds: float = MAIB_CALLBACK_QUEUE_CONFIG['lock_seconds'],
+        sweep_interval: float = MAIB_CALLBACK_QUEUE_CONFIG['sweep_interval'],
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.max_size = max_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.lock_seconds = lock_seconds
+        self.sweep_interval = sweep_interval
+        self.owner = str(uuid.uuid4())
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._tasks: list = []
+        self.received = 0
+        self.spilled = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.lag = LatencyStats()
+        self.processing = LatencyStats()
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        return self._queue
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index(
+            [("status", ASCENDING), ("nextAttemptAt", ASCENDING)], name="status_nextAttemptAt"
+        )
+        await self.collection.create_index(
+            [("processedAt", ASCENDING)],
+            name="processedAt_ttl",
+            expireAfterSeconds=MAIB_CALLBACK_QUEUE_CONFIG['retention_seconds'],
+        )
+
+    async def submit(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Salvează callback-ul în inbox și îl pune în coadă; nu așteaptă procesarea.
+        """
+        self.received += 1
+        now = datetime.utcnow()
+        doc_id: Optional[str] = str(uuid.uuid4())
+        try:
+            await self.collection.insert_one({
+                "_id": doc_id,
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "receivedAt": now,
+                "nextAttemptAt": now,
+            })
+        except Exception as e:
+            # fără MongoDB procesăm totuși callback-ul, doar că nu mai e durabil
+            logger.error(f"Error persisting MAIB callback, processing in-memory only: {str(e)}")
+            doc_id = None
+        if not self._enqueue(doc_id, payload) and doc_id is None:
+            self.failed += 1
+            logger.error("MAIB callback dropped: queue full and inbox unavailable")
+        return doc_id
+
+    def _enqueue(self, doc_id: Optional[str], payload: Dict[str, Any]) -> bool:
+        if doc_id is not None and doc_id in self._queued:
+            return True
+        try:
+            self.queue.put_nowait((doc_id, payload, time.monotonic()))
+        except asyncio.QueueFull:
+            # rămâne în MongoDB; sweeper-ul îl preia când se eliberează coada
+            self.spilled += 1
+            return False
+        if doc_id is not None:
+            self._queued.add(doc_id)
+        return True
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _claim(self, doc_id: str) -> bool:
+        now = datetime.utcnow()
+        doc = await self.collection.find_one_and_update(
+            {
+                "_id": doc_id,
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "processing", "lockedUntil": {"$lt": now}},
+                ],
+            },
+            {"$set": {
+                "status": "processing",
+                "lockedBy": self.owner,
+                "lockedUntil": now + timedelta(seconds=self.lock_seconds),
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc is not None
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            doc_id, payload, enqueued_at = await self.queue.get()
+            self._queued.discard(doc_id)
+            try:
+                self.lag.observe(time.monotonic() - enqueued_at)
+                if doc_id is not None and not await self._claim(doc_id):
+                    # deja procesat sau preluat de alt worker
+                    continue
+                started = time.monotonic()
+                try:
+                    await self.handler(payload)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    await self._on_failure(doc_id, payload, e)
+                else:
+                    self.processed += 1
+                    self.processing.observe(time.monotonic() - started)
+                    if doc_id is not None:
+                        await self.collection.update_one(
+                            {"_id": doc_id},
+                            {"$set": {"status": "done", "processedAt": datetime.utcnow()},
+                             "$unset": {"lockedBy": "", "lockedUntil": ""}},
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MAIB callback worker {index} error: {str(e)}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def _on_failure(self, doc_id: Optional[str], payload: Dict[str, Any], error: Exception) -> None:
+        if doc_id is None:
+            self.failed += 1
+            logger.error(f"MAIB callback processing failed (not persisted): {str(error)}", exc_info=True)
+            return
+        doc = await self.collection.find_one_and_update(
+            {"_id": doc_id},
+            {"$inc": {"attempts": 1}, "$set": {"lastError": str(error)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        attempts = (doc or {}).get("attempts", self.max_attempts)
+        if attempts >= self.max_attempts:
+            self.failed += 1
+            logger.error(f"MAIB callback {doc_id} failed after {attempts} attempts: {str(error)}")
+            update = {"status": "failed", "failedAt": datetime.utcnow()}
+        else:
+            self.retried += 1
+            delay = self.retry_base_delay * (2 ** (attempts - 1))
+            logger.warning(f"MAIB callback {doc_id} failed (attempt {attempts}), retrying in {delay}s: {str(error)}")
+            update = {"status": "pending", "nextAttemptAt": datetime.utcnow() + timedelta(seconds=delay)}
+        await self.collection.update_one(
+            {"_id": doc_id}, {"$set": update, "$unset": {"lockedBy": "", "lockedUntil": ""}}
+        )
+
+    async def _sweeper(self) -> None:
+        """
+        Reia din MongoDB callback-urile rămase în urmă: cele care n-au încăput în coadă,
+        cele programate pentru reîncercare și cele abandonate la un restart.
+        """
+        while True:
+            try:
+                free = self.max_size - self.queue.qsize()
+                if free > 0:
+                    now = datetime.utcnow()
+                    cursor = self.collection.find(
+                        {"$or": [
+                            {"status": "pending", "nextAttemptAt": {"$lte": now}},
+                            {"status": "processing", "lockedUntil": {"$lt": now}},
+                        ]},
+                        {"payload": 1},
+                    ).sort("nextAttemptAt", ASCENDING).limit(free)
+                    async for doc in cursor:
+                        if not self._enqueue(doc["_id"], doc["payload"]):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MAIB callback sweeper error: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.queue.qsize(),
+            "maxSize": self.max_size,
+            "workers": self.workers,
+            "received": self.received,
+            "spilled": self.spilled,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lag": self.lag.as_dict(),
+            "processing": self.processing.as_dict(),
+        }
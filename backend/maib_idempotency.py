@@ -0,0 +1,149 @@
+"""
+MAIB Session Idempotency
+Strat de idempotență în fața MaibPaymentService.create_payment_session, indexat după
+(orderId, amount): request-urile simultane împart un singur apel /v1/pay, iar reîncercările
+din fereastra configurată primesc sesiunea deja creată (din memorie sau din registrul MongoDB).
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configurație idempotență sesiuni
+MAIB_SESSION_IDEMPOTENCY_CONFIG = {
+    # cât timp o sesiune creată este refolosită pentru același orderId + sumă
+    'window_seconds': float(os.getenv('MAIB_SESSION_IDEMPOTENCY_WINDOW', '900')),
+    'max_entries': int(os.getenv('MAIB_SESSION_IDEMPOTENCY_MAX_ENTRIES', '10000')),
+}
+
+SessionKey = Tuple[str, float]
+SessionCreator = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def _session_key(request_data: Dict[str, Any]) -> SessionKey:
+    return str(request_data.get("orderId")), round(float(request_data.get("amount") or 0), 2)
+
+
+def _is_expired(result: Dict[str, Any]) -> bool:
+    expires_at = result.get("expiresAt")
+    if not expires_at:
+        return False
+    try:
+        expires = datetime.fromisoformat(str(expires_at).replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if expires.tzinfo is not None:
+        expires = expires.replace(tzinfo=None) - (expires.utcoffset() or timedelta(0))
+    return expires <= datetime.utcnow()
+
+
+class SessionIdempotency:
+    """Coalescing + cache pentru crearea sesiunilor de plată MAIB"""
+
+    def __init__(
+        self,
+        ledger=None,
+        window_seconds: float = MAIB_SESSION_IDEMPOTENCY_CONFIG['window_seconds'],
+        max_entries: int = MAIB_SESSION_IDEMPOTENCY_CONFIG['max_entries'],
+    ):
+        self.ledger = ledger
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._recent: "OrderedDict[SessionKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[SessionKey, asyncio.Future] = {}
+        self.created = 0
+        self.reused = 0
+        self.coalesced = 0
+
+    async def create_once(self, request_data: Dict[str, Any], creator: SessionCreator) -> Dict[str, Any]:
+        """
+        Returnează sesiunea existentă pentru (orderId, amount) sau o creează prin `creator`.
+        """
+        key = _session_key(request_data)
+
+        cached = self._get_recent(key)
+        if cached is not None:
+            self.reused += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.ensure_future(self._create(key, creator))
+        self._inflight[key] = future
+        return await asyncio.shield(future)
+
+    async def _create(self, key: SessionKey, creator: SessionCreator) -> Dict[str, Any]:
+        try:
+            stored = await self._find_stored(key)
+            if stored is not None:
+                self.reused += 1
+                self._remember(key, stored)
+                return stored
+
+            result = await creator()
+            self.created += 1
+            self._remember(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def _get_recent(self, key: SessionKey) -> Optional[Dict[str, Any]]:
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic() or _is_expired(result):
+            del self._recent[key]
+            return None
+        return result
+
+    def _remember(self, key: SessionKey, result: Dict[str, Any]) -> None:
+        self._recent[key] = (time.monotonic() + self.window_seconds, result)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    def forget(self, order_id: str) -> None:
+        """Uită sesiunile unei comenzi (ex. după un callback cu plată eșuată)."""
+        for key in [k for k in self._recent if k[0] == order_id]:
+            del self._recent[key]
+
+    async def _find_stored(self, key: SessionKey) -> Optional[Dict[str, Any]]:
+        # sesiunea poate fi creată de alt worker: o căutăm în registrul plăților
+        if self.ledger is None:
+            return None
+        order_id, amount = key
+        try:
+            entry = await self.ledger.find_recent_session(
+                order_id, amount, datetime.utcnow() - timedelta(seconds=self.window_seconds)
+            )
+        except Exception as e:
+            logger.error(f"Error reading MAIB session from ledger: {str(e)}")
+            return None
+        if not entry or not entry.get("formUrl"):
+            return None
+        result = {
+            "orderId": entry.get("orderId"),
+            "payId": entry["payId"],
+            "formUrl": entry["formUrl"],
+            "redirectUrl": entry.get("redirectUrl"),
+            "expiresAt": entry.get("expiresAt"),
+        }
+        return None if _is_expired(result) else result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "entries": len(self._recent),
+        }
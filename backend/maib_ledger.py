@@ -0,0 +1,201 @@
+"""
+MAIB Payment Ledger
+Registru persistent al plăților MAIB în MongoDB (colecția maib_payments), alimentat de
+callback-uri, crearea sesiunilor și refund-uri. Statusul unei plăți devine o citire locală
+indexată; MAIB este interogat doar când registrul nu are încă un status final.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+from maib_service import MAIB_TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+# Tranziții permise între statusuri finale: o plată reușită poate fi returnată, invers nu
+SUCCESS_STATUSES = frozenset({'OK', 'SUCCESS', 'APPROVED'})
+REVERSAL_STATUSES = frozenset({'REVERSED', 'REFUNDED'})
+
+
+def is_terminal_status(status: Optional[str]) -> bool:
+    return bool(status) and status.upper() in MAIB_TERMINAL_STATUSES
+
+
+def _replaceable_terminal_statuses(status: str) -> FrozenSet[str]:
+    """Statusurile finale peste care poate fi scris `status` (cele intermediare pot fi mereu)."""
+    status = status.upper()
+    if status in REVERSAL_STATUSES:
+        return SUCCESS_STATUSES | REVERSAL_STATUSES
+    if status in SUCCESS_STATUSES:
+        return SUCCESS_STATUSES
+    if status in MAIB_TERMINAL_STATUSES:
+        return frozenset({status})
+    return frozenset()
+
+
+def _amount(value: Any) -> Optional[float]:
+    # callback-urile venite ca query string au suma ca text; find_recent_session compară numere
+    try:
+        return round(float(value), 2) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class PaymentLedger:
+    """Registrul plăților MAIB; un document per payId, actualizat idempotent (upsert)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([("payId", ASCENDING)], unique=True, name="payId_unique")
+        await self.collection.create_index([("orderId", ASCENDING)], name="orderId")
+        await self.collection.create_index(
+            [("status", ASCENDING), ("updatedAt", DESCENDING)], name="status_updatedAt"
+        )
+        # selecția plăților nefinalizate pentru reconciliere
+        await self.collection.create_index(
+            [("terminal", ASCENDING), ("updatedAt", ASCENDING)], name="terminal_updatedAt"
+        )
+
+    async def get(self, pay_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"payId": pay_id}, {"_id": 0})
+
+    async def get_by_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {"orderId": order_id}, {"_id": 0}, sort=[("updatedAt", DESCENDING)]
+        )
+
+    async def find_recent_session(
+        self, order_id: str, amount: float, since: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """Ultima sesiune încă deschisă pentru aceeași comandă și sumă, creată după `since`."""
+        return await self.collection.find_one(
+            {
+                "orderId": order_id,
+                "amount": amount,
+                "sessionCreatedAt": {"$gte": since},
+                "terminal": {"$ne": True},
+            },
+            {"_id": 0},
+            sort=[("sessionCreatedAt", DESCENDING)],
+        )
+
+    async def _upsert(self, pay_id: str, fields: Dict[str, Any], status: Optional[str] = None) -> None:
+        """
+        Upsert idempotent. Un status final nu este suprascris de unul intermediar (ex. un
+        callback întârziat sau un poll venit după callback-ul OK) și nici de un status final
+        care nu îi poate urma (ex. un callback OK relivrat după REVERSED).
+        """
+        now = datetime.utcnow()
+        update_fields = {k: v for k, v in fields.items() if v is not None}
+        update_fields["updatedAt"] = now
+        if status:
+            update_fields["status"] = status.upper()
+            update_fields["terminal"] = is_terminal_status(status)
+
+        if status:
+            # actualizăm doar un document fără status final sau cu unul din care tranziția e permisă
+            replaceable = [{"terminal": {"$ne": True}}]
+            previous = _replaceable_terminal_statuses(status)
+            if previous:
+                replaceable.append({"status": {"$in": sorted(previous)}})
+            result = await self.collection.update_one(
+                {"payId": pay_id, "$or": replaceable}, {"$set": update_fields}
+            )
+            if result.matched_count:
+                return
+            # documentul lipsește sau are un status final incompatibil: îl inserăm doar dacă lipsește
+            # (filtrul doar pe payId nu poate crea un al doilea document)
+            result = await self.collection.update_one(
+                {"payId": pay_id},
+                {"$setOnInsert": {**update_fields, "payId": pay_id, "createdAt": now}},
+                upsert=True,
+            )
+            if result.upserted_id is None:
+                logger.debug(f"MAIB ledger: kept terminal status for {pay_id}, ignored {update_fields['status']}")
+            return
+
+        await self.collection.update_one(
+            {"payId": pay_id},
+            {"$set": update_fields, "$setOnInsert": {"payId": pay_id, "createdAt": now}},
+            upsert=True,
+        )
+
+    async def record_session(self, request_data: Dict[str, Any], result: Dict[str, Any]) -> None:
+        pay_id = result.get("payId")
+        if not pay_id:
+            return
+        await self._upsert(
+            pay_id,
+            {
+                "orderId": result.get("orderId") or request_data.get("orderId"),
+                "amount": _amount(request_data.get("amount")) or 0.0,
+                "currency": request_data.get("currency"),
+                "formUrl": result.get("formUrl"),
+                "redirectUrl": result.get("redirectUrl"),
+                "expiresAt": result.get("expiresAt"),
+                "sessionCreatedAt": datetime.utcnow(),
+            },
+            status="CREATED",
+        )
+
+    async def record_callback(self, callback_data: Dict[str, Any]) -> None:
+        result = callback_data.get("result") if isinstance(callback_data.get("result"), dict) else callback_data
+        pay_id = result.get("payId") or result.get("pay_id")
+        if not pay_id:
+            return
+        await self._upsert(
+            pay_id,
+            {
+                "orderId": result.get("orderId") or result.get("order_id"),
+                "transactionId": result.get("transactionId") or result.get("rrn"),
+                "amount": _amount(result.get("amount")),
+                "currency": result.get("currency"),
+                "lastCallback": callback_data,
+                "callbackReceivedAt": datetime.utcnow(),
+            },
+            status=result.get("status") or result.get("Status"),
+        )
+
+    async def record_status(self, result: Dict[str, Any]) -> None:
+        pay_id = result.get("payId")
+        status = result.get("status")
+        if not pay_id or not status or status == "unknown_sandbox":
+            return
+        await self._upsert(
+            pay_id,
+            {"orderId": result.get("orderId"), "statusCheckedAt": datetime.utcnow()},
+            status=status,
+        )
+
+    async def record_refund(self, result: Dict[str, Any]) -> None:
+        pay_id = result.get("payId")
+        if not pay_id:
+            return
+        await self._upsert(
+            pay_id,
+            {
+                "orderId": result.get("orderId"),
+                "refundAmount": result.get("refundAmount"),
+                "refundStatus": result.get("status"),
+                "refundStatusCode": result.get("statusCode"),
+                "refundedAt": datetime.utcnow(),
+            },
+            # doar un refund complet (REVERSED) schimbă statusul plății
+            status="REVERSED" if (result.get("status") or "").upper() == "REVERSED" else None,
+        )
+
+    @staticmethod
+    def to_status_response(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Convertește o intrare din registru în formatul răspunsului /payment/maib/status."""
+        return {
+            "ok": True,
+            "payId": entry["payId"],
+            "status": entry.get("status"),
+            "orderId": entry.get("orderId"),
+            "raw": {"source": "ledger", "updatedAt": entry.get("updatedAt")},
+        }
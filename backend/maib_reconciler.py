@@ -0,0 +1,202 @@
+"""
+MAIB Reconciler
+Worker din background care reverifică la MAIB plățile rămase fără status final (callback
+pierdut, pay-info 404 în sandbox): selectează din registru plățile neactualizate de cel puțin
+`min_age_minutes`, le verifică în loturi cu rată limitată și scrie rezultatul înapoi prin hook.
+Cu mai mulți workeri uvicorn, un singur proces reconciliază la un moment dat (lease în MongoDB).
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from maib_resilience import MaibCircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Configurație reconciliere
+MAIB_RECONCILE_CONFIG = {
+    'enabled': os.getenv('MAIB_RECONCILE_ENABLED', 'true').lower() == 'true',
+    'interval': float(os.getenv('MAIB_RECONCILE_INTERVAL', '60')),
+    # plățile sunt reverificate doar după ce au stat neschimbate atâtea minute
+    'min_age_minutes': float(os.getenv('MAIB_RECONCILE_MIN_AGE_MINUTES', '10')),
+    # după această vârstă nu mai încercăm (sesiunea MAIB a expirat de mult)
+    'max_age_hours': float(os.getenv('MAIB_RECONCILE_MAX_AGE_HOURS', '48')),
+    'batch_size': int(os.getenv('MAIB_RECONCILE_BATCH_SIZE', '50')),
+    'rate_per_second': float(os.getenv('MAIB_RECONCILE_RATE', '5')),
+    'concurrency': int(os.getenv('MAIB_RECONCILE_CONCURRENCY', '5')),
+    # pauza maximă între două verificări ale aceleiași plăți (backoff exponențial)
+    'max_backoff_minutes': float(os.getenv('MAIB_RECONCILE_MAX_BACKOFF_MINUTES', '240')),
+}
+
+StatusChecker = Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]
+ResultHook = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+LEASE_ID = "maib_reconciler"
+
+
+class RateLimiter:
+    """Spațiază apelurile la cel puțin 1/rate secunde (fără rafale)"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class PaymentReconciler:
+    """Reverifică periodic plățile MAIB nefinalizate din registru"""
+
+    def __init__(
+        self,
+        ledger_collection,
+        lease_collection,
+        checker: StatusChecker,
+        on_result: ResultHook,
+        config: Dict[str, Any] = MAIB_RECONCILE_CONFIG,
+    ):
+        self.ledger = ledger_collection
+        self.leases = lease_collection
+        self.checker = checker
+        self.on_result = on_result
+        self.config = config
+        self.owner = str(uuid.uuid4())
+        self.limiter = RateLimiter(config['rate_per_second'])
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.checked = 0
+        self.resolved = 0
+        self.errors = 0
+        self.last_run_at: Optional[datetime] = None
+
+    async def _acquire_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            doc = await self.leases.find_one_and_update(
+                {"_id": LEASE_ID, "$or": [{"leaseUntil": {"$lt": now}}, {"leaseOwner": self.owner}]},
+                {"$set": {"leaseOwner": self.owner,
+                          "leaseUntil": now + timedelta(seconds=self.config['interval'] * 2)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # alt worker deține lease-ul
+            return False
+        return bool(doc and doc.get("leaseOwner") == self.owner)
+
+    async def run_once(self) -> Dict[str, int]:
+        """Un lot de reconciliere; returnează câte plăți au fost verificate și rezolvate."""
+        now = datetime.utcnow()
+        query = {
+            "terminal": {"$ne": True},
+            "updatedAt": {
+                "$lte": now - timedelta(minutes=self.config['min_age_minutes']),
+                "$gte": now - timedelta(hours=self.config['max_age_hours']),
+            },
+            "$or": [{"nextReconcileAt": {"$exists": False}}, {"nextReconcileAt": {"$lte": now}}],
+        }
+        projection = {"_id": 0, "payId": 1, "orderId": 1, "status": 1, "reconcileAttempts": 1}
+        entries = await self.ledger.find(query, projection).sort("updatedAt", 1).to_list(
+            self.config['batch_size']
+        )
+
+        semaphore = asyncio.Semaphore(max(1, self.config['concurrency']))
+        counts = {"checked": 0, "resolved": 0, "errors": 0}
+
+        async def reconcile(entry: Dict[str, Any]) -> None:
+            async with semaphore:
+                await self.limiter.wait()
+                pay_id = entry["payId"]
+                try:
+                    result = await self.checker(pay_id, entry.get("orderId"))
+                except MaibCircuitOpenError:
+                    # MAIB indisponibil: reîncercăm la următoarea rulare, fără să penalizăm plata
+                    return
+                except Exception as e:
+                    counts["errors"] += 1
+                    logger.warning(f"MAIB reconcile check failed for {pay_id}: {str(e)}")
+                    result = None
+                counts["checked"] += 1
+                if result is not None:
+                    try:
+                        await self.on_result(entry, result)
+                        new_status = (result.get("status") or "").upper()
+                        if new_status not in ("", "UNKNOWN_SANDBOX", (entry.get("status") or "").upper()):
+                            counts["resolved"] += 1
+                    except Exception as e:
+                        counts["errors"] += 1
+                        logger.error(f"MAIB reconcile write-back failed for {pay_id}: {str(e)}")
+                await self._schedule_next(entry)
+
+        await asyncio.gather(*(reconcile(entry) for entry in entries))
+        self.runs += 1
+        self.checked += counts["checked"]
+        self.resolved += counts["resolved"]
+        self.errors += counts["errors"]
+        self.last_run_at = now
+        if counts["checked"]:
+            logger.info(
+                f"MAIB reconcile: checked={counts['checked']} changed={counts['resolved']} errors={counts['errors']}"
+            )
+        return counts
+
+    async def _schedule_next(self, entry: Dict[str, Any]) -> None:
+        # backoff exponențial per plată: 2, 4, 8... × min_age, limitat la max_backoff_minutes
+        attempts = int(entry.get("reconcileAttempts") or 0) + 1
+        minutes = min(self.config['min_age_minutes'] * (2 ** attempts), self.config['max_backoff_minutes'])
+        await self.ledger.update_one(
+            {"payId": entry["payId"]},
+            {"$set": {"nextReconcileAt": datetime.utcnow() + timedelta(minutes=minutes),
+                      "reconciledAt": datetime.utcnow()},
+             "$inc": {"reconcileAttempts": 1}},
+        )
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await self._acquire_lease():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MAIB reconciler error: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.config['interval'])
+
+    def start(self) -> None:
+        if self._task is None and self.config['enabled']:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.config['enabled'],
+            "runs": self.runs,
+            "checked": self.checked,
+            "changed": self.resolved,
+            "errors": self.errors,
+            "lastRunAt": self.last_run_at,
+        }
@@ -0,0 +1,422 @@
+"""
+MAIB Refund Jobs
+Job-uri de refund în lot: lista de (payId, refundAmount) este salvată în MongoDB
+(maib_refund_jobs + maib_refund_job_items) și procesată în background cu concurență limitată.
+Fiecare element este preluat atomic înainte de apelul către MAIB, deci după un restart job-ul
+continuă cu elementele rămase; elementele întrerupte în timpul apelului (proces oprit, timeout,
+conexiune căzută după trimitere, 5xx) sunt marcate `uncertain` și nu sunt refăcute automat
+(refund-ul poate să fi trecut deja la MAIB). Un refund cu `refundId` (cheie de idempotență dată
+de apelant) este revendicat atomic în maib_refund_claims, atât de job-uri cât și de endpoint-ul
+de refund individual, deci nu este trimis de două ori; refund-urile fără refundId nu sunt
+deduplicate (două refund-uri parțiale cu aceeași sumă pot fi legitime).
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, ReturnDocument
+
+from maib_resilience import MaibCircuitOpenError, MaibUncertainResultError
+
+logger = logging.getLogger(__name__)
+
+# Configurație job-uri de refund
+MAIB_REFUND_JOB_CONFIG = {
+    # refund-uri simultane per job și în total (toate job-urile împart limita globală)
+    'concurrency': int(os.getenv('MAIB_REFUND_JOB_CONCURRENCY', '5')),
+    'max_concurrency': int(os.getenv('MAIB_REFUND_MAX_CONCURRENCY', '10')),
+    'max_items': int(os.getenv('MAIB_REFUND_JOB_MAX_ITEMS', '5000')),
+    # cât timp un element rămâne preluat de un worker înainte să fie considerat întrerupt
+    'lock_seconds': float(os.getenv('MAIB_REFUND_JOB_LOCK_SECONDS', '120')),
+    # cât de des verifică runner-ul lock-urile expirate ale elementelor preluate de alt proces
+    'lock_check_seconds': float(os.getenv('MAIB_REFUND_JOB_LOCK_CHECK_SECONDS', '5')),
+}
+
+ITEM_STATUSES = ("pending", "in_progress", "done", "failed", "uncertain", "skipped")
+
+Refunder = Callable[[str, Optional[float]], Awaitable[Dict[str, Any]]]
+RefundHook = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class RefundConflictError(Exception):
+    """refundId-ul a fost deja folosit (refund în curs, cu rezultat incert sau pentru altă plată/sumă)"""
+
+    def __init__(self, refund_id: str, claim: Dict[str, Any]):
+        super().__init__(f"Refund {refund_id} already {claim.get('status', 'sending')}")
+        self.refund_id = refund_id
+        self.claim = claim
+
+
+def _same_refund(claim: Dict[str, Any], pay_id: str, refund_amount: Optional[float]) -> bool:
+    return claim.get("payId") == pay_id and claim.get("refundAmount") == refund_amount
+
+
+class RefundJobs:
+    """Coordonează job-urile de refund în lot, cu progres persistat per element"""
+
+    def __init__(
+        self,
+        jobs_collection,
+        items_collection,
+        claims_collection,
+        refunder: Refunder,
+        on_refunded: Optional[RefundHook] = None,
+        concurrency: int = MAIB_REFUND_JOB_CONFIG['concurrency'],
+        max_concurrency: int = MAIB_REFUND_JOB_CONFIG['max_concurrency'],
+        lock_seconds: float = MAIB_REFUND_JOB_CONFIG['lock_seconds'],
+        lock_check_seconds: float = MAIB_REFUND_JOB_CONFIG['lock_check_seconds'],
+    ):
+        self.jobs = jobs_collection
+        self.items = items_collection
+        self.claims = claims_collection
+        self.refunder = refunder
+        self.on_refunded = on_refunded
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.lock_seconds = lock_seconds
+        self.lock_check_seconds = lock_check_seconds
+        self.owner = str(uuid.uuid4())
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runners: Dict[str, asyncio.Task] = {}
+        self._inflight: Set[str] = set()
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def ensure_indexes(self) -> None:
+        await self.items.create_index([("jobId", ASCENDING), ("status", ASCENDING)], name="jobId_status")
+        await self.items.create_index([("payId", ASCENDING), ("status", ASCENDING)], name="payId_status")
+        await self.jobs.create_index([("status", ASCENDING)], name="status")
+
+    async def create_job(self, items: List[Dict[str, Any]], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Salvează job-ul și elementele lui, apoi pornește procesarea în background.
+        Un refundId apare o singură dată per job.
+        """
+        unique: List[Dict[str, Any]] = []
+        refund_ids: Set[str] = set()
+        for item in items:
+            if not item.get("payId"):
+                continue
+            refund_id = item.get("refundId")
+            if refund_id:
+                if refund_id in refund_ids:
+                    continue
+                refund_ids.add(refund_id)
+            unique.append(item)
+
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        concurrency = max(1, min(concurrency or self.concurrency, self.max_concurrency))
+        await self.jobs.insert_one({
+            "_id": job_id,
+            "status": "running",
+            "total": len(unique),
+            "concurrency": concurrency,
+            "createdAt": now,
+            "startedAt": now,
+        })
+        if unique:
+            await self.items.insert_many([
+                {
+                    "_id": f"{job_id}:{index:06d}",
+                    "jobId": job_id,
+                    "payId": item["payId"],
+                    "refundAmount": item.get("refundAmount"),
+                    "refundId": item.get("refundId"),
+                    "status": "pending",
+                    "createdAt": now,
+                }
+                for index, item in enumerate(unique)
+            ], ordered=False)
+
+        self._start_runner(job_id, concurrency)
+        return {"jobId": job_id, "total": len(unique), "concurrency": concurrency}
+
+    def _start_runner(self, job_id: str, concurrency: int) -> None:
+        if job_id in self._runners:
+            return
+        task = asyncio.ensure_future(self._run(job_id, concurrency))
+        self._runners[job_id] = task
+        task.add_done_callback(lambda _: self._runners.pop(job_id, None))
+
+    async def _run(self, job_id: str, concurrency: int) -> None:
+        while True:
+            try:
+                await asyncio.gather(*(self._worker(job_id) for _ in range(concurrency)))
+                # elementele preluate de un proces oprit rămân `in_progress` până le expiră lock-ul;
+                # runner-ul le marchează `uncertain` ca job-ul să se poată încheia
+                await self._expire_locks(job_id)
+                if await self._finish_if_complete(job_id):
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # eroare trecătoare (ex. MongoDB indisponibil): job-ul rămâne `running` și este reluat
+                logger.error(f"MAIB refund job {job_id} runner error: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.lock_check_seconds)
+
+    async def _worker(self, job_id: str) -> None:
+        while True:
+            try:
+                async with self.semaphore:
+                    item = await self._claim(job_id)
+                    if item is None:
+                        return
+                    backoff = await self._process(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # un element rămas `in_progress` devine `uncertain` când îi expiră lock-ul
+                logger.error(f"MAIB refund job {job_id} worker error: {str(e)}", exc_info=True)
+                backoff = self.lock_check_seconds
+            # pauza (circuit deschis, eroare MongoDB) se face fără să ocupe un loc din limita globală
+            if backoff:
+                await asyncio.sleep(backoff)
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.items.find_one_and_update(
+            {"jobId": job_id, "status": "pending"},
+            {"$set": {
+                "status": "in_progress",
+                "lockedBy": self.owner,
+                "lockedUntil": now + timedelta(seconds=self.lock_seconds),
+                "startedAt": now,
+            }},
+            sort=[("_id", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _claim_refund(self, refund_id: str, owner: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Revendică atomic refund-ul `refund_id`. Întoarce revendicarea existentă dacă refund-ul
+        a fost deja trimis de altcineva (alt job sau endpoint-ul de refund individual), altfel None.
+        """
+        result = await self.claims.update_one(
+            {"_id": refund_id},
+            {"$setOnInsert": {**owner, "status": "sending", "createdAt": datetime.utcnow()}},
+            upsert=True,
+        )
+        if result.upserted_id is not None:
+            return None
+        claim = await self.claims.find_one({"_id": refund_id})
+        # același element revendicat înainte de o reîncercare
+        if claim is None or (owner.get("itemId") and claim.get("itemId") == owner["itemId"]):
+            return None
+        return claim
+
+    async def _release_refund(self, refund_id: Optional[str], owner: Dict[str, Any]) -> None:
+        # refund-ul sigur nu a fost executat: poate fi trimis din nou cu același refundId
+        if refund_id:
+            await self.claims.delete_one({"_id": refund_id, **owner})
+
+    async def _settle_refund(self, refund_id: Optional[str], status: str,
+                             result: Optional[Dict[str, Any]] = None) -> None:
+        if refund_id:
+            await self.claims.update_one(
+                {"_id": refund_id},
+                {"$set": {"status": status, "result": result, "finishedAt": datetime.utcnow()}},
+            )
+
+    async def refund(self, pay_id: str, refund_amount: Optional[float] = None,
+                     refund_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Refund individual (POST /payment/maib/refund), cu aceeași revendicare ca elementele job-urilor.
+        Un refundId deja executat întoarce rezultatul salvat; în curs, incert sau folosit pentru
+        altă plată / sumă ridică RefundConflictError.
+        """
+        if not refund_id:
+            return await self.refunder(pay_id, refund_amount)
+
+        owner = {"payId": pay_id, "refundAmount": refund_amount}
+        previous = await self._claim_refund(refund_id, owner)
+        if previous is not None:
+            if previous.get("status") == "done" and _same_refund(previous, pay_id, refund_amount):
+                return previous["result"]
+            raise RefundConflictError(refund_id, previous)
+
+        try:
+            result = await self.refunder(pay_id, refund_amount)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._settle_refund(refund_id, "uncertain"))
+            raise
+        except MaibUncertainResultError:
+            await self._settle_refund(refund_id, "uncertain")
+            raise
+        except Exception:
+            # circuit deschis, request-ul nu a plecat sau refuz clar de la MAIB
+            await self._release_refund(refund_id, owner)
+            raise
+        await self._settle_refund(refund_id, "done", result)
+        return result
+
+    async def _requeue(self, item: Dict[str, Any], error: str) -> None:
+        await self.items.update_one(
+            {"_id": item["_id"]},
+            {"$set": {"status": "pending", "lastError": error},
+             "$unset": {"lockedBy": "", "lockedUntil": ""}},
+        )
+
+    async def _process(self, item: Dict[str, Any]) -> Optional[float]:
+        """Procesează un element; întoarce pauza (secunde) înainte de următorul, dacă e cazul."""
+        pay_id = item["payId"]
+        refund_id = item.get("refundId")
+        owner = {"payId": pay_id, "refundAmount": item.get("refundAmount"),
+                 "itemId": item["_id"], "jobId": item["jobId"]}
+        self._inflight.add(item["_id"])
+        try:
+            if refund_id:
+                try:
+                    previous = await self._claim_refund(refund_id, owner)
+                except Exception as e:
+                    # refund-ul nu a fost trimis: elementul revine în coadă
+                    await self._requeue(item, str(e))
+                    return self.lock_check_seconds
+                # același refundId trimis deja (alt job sau refund individual): nu îl mai trimitem
+                if previous is not None:
+                    where = f" in job {previous['jobId']}" if previous.get("jobId") else ""
+                    await self._complete(item, "skipped", {"reason": f"refund {refund_id} already sent{where}"})
+                    return None
+
+            try:
+                result = await self.refunder(pay_id, item.get("refundAmount"))
+            except MaibCircuitOpenError as e:
+                # apelul nu a plecat spre MAIB: elementul revine în coadă după pauză
+                await self._release_refund(refund_id, {"itemId": item["_id"]})
+                await self._requeue(item, str(e))
+                return e.retry_after
+            except asyncio.CancelledError:
+                # oprire în timpul apelului: rezultatul la MAIB e necunoscut
+                await asyncio.shield(self._complete(item, "uncertain", {"error": "interrupted during refund"}))
+                await asyncio.shield(self._settle_refund(refund_id, "uncertain"))
+                raise
+            except MaibUncertainResultError as e:
+                # timeout / conexiune căzută după trimitere sau 5xx: refund-ul poate să fi trecut
+                await self._complete(item, "uncertain", {"error": str(e)})
+                await self._settle_refund(refund_id, "uncertain")
+                return None
+            except Exception as e:
+                # refuz clar de la MAIB (4xx / corp de eroare) sau request-ul nu a plecat
+                await self._release_refund(refund_id, {"itemId": item["_id"]})
+                await self._complete(item, "failed", {"error": str(e)})
+                return None
+
+            await self._settle_refund(refund_id, "done", result)
+            await self._complete(item, "done", {
+                "refundStatus": result.get("status"),
+                "statusCode": result.get("statusCode"),
+                "statusMessage": result.get("statusMessage"),
+                "refundedAmount": result.get("refundAmount"),
+            })
+            if self.on_refunded is not None:
+                try:
+                    await self.on_refunded(result)
+                except Exception as e:
+                    logger.error(f"MAIB refund job hook error for {pay_id}: {str(e)}")
+            return None
+        finally:
+            self._inflight.discard(item["_id"])
+
+    async def _complete(self, item: Dict[str, Any], status: str, fields: Dict[str, Any]) -> None:
+        await self.items.update_one(
+            {"_id": item["_id"]},
+            {"$set": {"status": status, "finishedAt": datetime.utcnow(), **fields},
+             "$unset": {"lockedBy": "", "lockedUntil": ""}},
+        )
+
+    async def _finish_if_complete(self, job_id: str) -> bool:
+        open_items = await self.items.count_documents(
+            {"jobId": job_id, "status": {"$in": ["pending", "in_progress"]}}
+        )
+        if open_items:
+            return False
+        await self.jobs.update_one(
+            {"_id": job_id, "status": "running"},
+            {"$set": {"status": "completed", "finishedAt": datetime.utcnow()}},
+        )
+        return True
+
+    async def _expire_locks(self, job_id: Optional[str] = None) -> int:
+        """
+        Elementele `in_progress` cu lock-ul expirat (procesul care le-a preluat s-a oprit) sunt
+        marcate `uncertain`: trebuie verificate manual la MAIB, nu refăcute.
+        """
+        now = datetime.utcnow()
+        query: Dict[str, Any] = {"status": "in_progress", "lockedUntil": {"$lt": now}}
+        if job_id is not None:
+            query["jobId"] = job_id
+        result = await self.items.update_many(
+            query,
+            {"$set": {"status": "uncertain", "finishedAt": now,
+                      "error": "interrupted during refund (process restarted)"},
+             "$unset": {"lockedBy": "", "lockedUntil": ""}},
+        )
+        if result.modified_count:
+            logger.warning(f"{result.modified_count} MAIB refund job items marked uncertain after lock expiry")
+        return result.modified_count
+
+    async def resume(self) -> int:
+        """
+        Reia job-urile neterminate (la startup). Elementele preluate de procesul oprit sunt
+        marcate `uncertain` de runner, imediat sau după ce le expiră lock-ul.
+        """
+        await self._expire_locks()
+
+        resumed = 0
+        async for job in self.jobs.find({"status": "running"}, {"concurrency": 1}):
+            self._start_runner(job["_id"], job.get("concurrency") or self.concurrency)
+            resumed += 1
+        return resumed
+
+    async def get_job(self, job_id: str, include_items: bool = False) -> Optional[Dict[str, Any]]:
+        job = await self.jobs.find_one({"_id": job_id})
+        if job is None:
+            return None
+
+        counts = {status: 0 for status in ITEM_STATUSES}
+        async for row in self.items.aggregate([
+            {"$match": {"jobId": job_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["count"]
+
+        processed = counts["done"] + counts["failed"] + counts["uncertain"] + counts["skipped"]
+        end = job.get("finishedAt") or datetime.utcnow()
+        elapsed = max((end - job["startedAt"]).total_seconds(), 0.001)
+        response = {
+            "jobId": job_id,
+            "status": job["status"],
+            "total": job["total"],
+            "counts": counts,
+            "processed": processed,
+            "elapsedSeconds": round(elapsed, 3),
+            "throughputPerSecond": round(processed / elapsed, 3),
+            "createdAt": job["createdAt"],
+            "finishedAt": job.get("finishedAt"),
+        }
+        if include_items:
+            response["items"] = [
+                {k: v for k, v in item.items() if k not in ("_id", "jobId", "lockedBy", "lockedUntil")}
+                async for item in self.items.find({"jobId": job_id}).sort("_id", ASCENDING)
+            ]
+        return response
+
+    async def stop(self) -> None:
+        for task in list(self._runners.values()):
+            task.cancel()
+        for task in list(self._runners.values()):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._runners = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"runningJobs": len(self._runners), "inflight": len(self._inflight)}
@@ -0,0 +1,206 @@
+"""
+MAIB Resilience
+Circuit breaker și backoff cu jitter pentru apelurile către MAIB: când MAIB este clar căzut,
+request-urile eșuează imediat în loc să țină ocupate conexiunile și workerii.
+Controlul admisiei limitează apelurile simultane către MAIB: surplusul așteaptă într-o coadă
+mărginită, iar când coada e plină (sau așteptarea durează prea mult) apelul este refuzat imediat.
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Configurație reîncercări și circuit breaker
+MAIB_RETRY_CONFIG = {
+    # numărul maxim de încercări pentru apelurile idempotente (token, pay-info)
+    'max_attempts': int(os.getenv('MAIB_RETRY_MAX_ATTEMPTS', '3')),
+    # încercări pentru apelurile ne-idempotente (pay, refund) când conexiunea nu s-a stabilit
+    # (request-ul nu a plecat); 1 = fără reîncercare
+    'connect_max_attempts': int(os.getenv('MAIB_RETRY_CONNECT_MAX_ATTEMPTS', '2')),
+    'base_delay': float(os.getenv('MAIB_RETRY_BASE_DELAY', '0.2')),
+    'max_delay': float(os.getenv('MAIB_RETRY_MAX_DELAY', '2')),
+}
+
+MAIB_CIRCUIT_CONFIG = {
+    # după câte eșecuri consecutive se deschide circuitul
+    'failure_threshold': int(os.getenv('MAIB_CIRCUIT_FAILURE_THRESHOLD', '5')),
+    # cât timp rămâne deschis înainte de a permite un apel de probă
+    'open_seconds': float(os.getenv('MAIB_CIRCUIT_OPEN_SECONDS', '30')),
+}
+
+MAIB_ADMISSION_CONFIG = {
+    # apeluri simultane către MAIB (implicit cât pool-ul de conexiuni, ca să nu așteptăm în pool)
+    'max_in_flight': int(os.getenv('MAIB_MAX_IN_FLIGHT', os.getenv('MAIB_HTTP_MAX_CONNECTIONS', '100'))),
+    # câte apeluri pot aștepta un loc liber; peste atât sunt refuzate imediat
+    'max_queue': int(os.getenv('MAIB_ADMISSION_MAX_QUEUE', '200')),
+    'queue_timeout': float(os.getenv('MAIB_ADMISSION_QUEUE_TIMEOUT', '5')),
+}
+
+
+class MaibCircuitOpenError(Exception):
+    """MAIB este considerat indisponibil; apelul a fost refuzat fără a contacta MAIB."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"MAIB API indisponibil temporar, reîncercați peste {int(retry_after) + 1}s")
+
+
+class MaibUncertainResultError(Exception):
+    """
+    Request-ul a plecat spre MAIB, dar rezultatul nu se cunoaște (timeout la citire, conexiune
+    întreruptă, 5xx): operațiunea poate să fi fost executată și nu trebuie repetată orbește.
+    """
+
+
+class MaibOverloadedError(MaibCircuitOpenError):
+    """
+    Prea multe apeluri către MAIB în desfășurare; apelul a fost refuzat fără a contacta MAIB.
+    Este tratat ca un circuit deschis (503 + Retry-After, reîncercare ulterioară în worker-i).
+    """
+
+    def __init__(self, retry_after: float):
+        Exception.__init__(self, f"Prea multe plăți în procesare, reîncercați peste {int(retry_after) + 1}s")
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int, base_delay: float = MAIB_RETRY_CONFIG['base_delay'],
+                  max_delay: float = MAIB_RETRY_CONFIG['max_delay']) -> float:
+    """Backoff exponențial cu full jitter pentru încercarea `attempt` (de la 1)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clasic:
+    - closed: apelurile trec; eșecurile consecutive sunt numărate
+    - open: apelurile sunt refuzate imediat până trec `open_seconds`
+    - half_open: un singur apel de probă; succes -> closed, eșec -> open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = MAIB_CIRCUIT_CONFIG['failure_threshold'],
+        open_seconds: float = MAIB_CIRCUIT_CONFIG['open_seconds'],
+    ):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.opened_count = 0
+
+    def before_call(self) -> None:
+        """Aruncă MaibCircuitOpenError dacă apelul nu are voie să plece spre MAIB."""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.open_seconds:
+                self.rejected += 1
+                raise MaibCircuitOpenError(self.open_seconds - elapsed)
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        if self.probe_in_flight:
+            self.rejected += 1
+            raise MaibCircuitOpenError(1.0)
+        self.probe_in_flight = True
+
+    def release_probe(self) -> None:
+        """Eliberează apelul de probă dacă a fost întrerupt fără un rezultat (ex. anulare)."""
+        self.probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened_count += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.consecutive_failures,
+            "openedCount": self.opened_count,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionController:
+    """Limitează apelurile simultane către MAIB, cu o coadă de așteptare mărginită"""
+
+    def __init__(
+        self,
+        max_in_flight: int = MAIB_ADMISSION_CONFIG['max_in_flight'],
+        max_queue: int = MAIB_ADMISSION_CONFIG['max_queue'],
+        queue_timeout: float = MAIB_ADMISSION_CONFIG['queue_timeout'],
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # creat la prima utilizare, în event loop-ul aplicației
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Ocupă un loc pentru un apel către MAIB sau aruncă MaibOverloadedError."""
+        semaphore = self.semaphore
+        if semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.shed += 1
+                raise MaibOverloadedError(1.0)
+            self.queued += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                self.shed += 1
+                raise MaibOverloadedError(self.queue_timeout)
+            finally:
+                self.queued -= 1
+        else:
+            await semaphore.acquire()
+
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "maxInFlight": self.max_in_flight,
+            "maxQueue": self.max_queue,
+            "inFlight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timedOut": self.timed_out,
+        }
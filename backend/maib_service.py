@@ -3,20 +3,28 @@ MAIB eCommerce Payment Service
 Serviciu backend pentru integrarea cu MAIB eCommerce NEW API
 """
 import os
+import asyncio
 import hashlib
+import time
 import hmac
 import logging
 from datetime import datetime, timedelta
-import json
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Tuple
 from datetime import datetime
 import httpx
-from dotenv import load_dotenv
-from pathlib import Path
-
-# Load environment variables
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from settings import load_env
+from maib_token import MaibTokenManager, MongoTokenStore
+from maib_signature import MaibCallbackVerifier
+from maib_resilience import (
+    AdmissionController, CircuitBreaker, MaibCircuitOpenError, MaibUncertainResultError, MAIB_RETRY_CONFIG,
+    backoff_delay,
+)
+from metrics import REGISTRY
+from log_config import log_payload
+import fast_json
+
+# Load environment variables (.env citit o singură dată, vezi settings.py)
+load_env()
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -30,66 +38,306 @@ MAIB_CONFIG = {
     'api_endpoint': os.getenv('MAIB_API_ENDPOINT', '/v1/pay'),
     'test_mode': os.getenv('MAIB_TEST_MODE', 'true').lower() == 'true',
 }
+# enforce = respingem callback-urile cu semnătură invalidă, log = doar logăm, off = nu verificăm
+MAIB_CONFIG['callback_signature_mode'] = os.getenv(
+    'MAIB_CALLBACK_SIGNATURE_MODE', 'log' if MAIB_CONFIG['test_mode'] else 'enforce'
+).lower()
+
+# Configurație pentru clientul HTTP partajat (pool de conexiuni keep-alive către MAIB)
+MAIB_HTTP_CONFIG = {
+    'max_connections': int(os.getenv('MAIB_HTTP_MAX_CONNECTIONS', '100')),
+    'max_keepalive_connections': int(os.getenv('MAIB_HTTP_MAX_KEEPALIVE_CONNECTIONS', '20')),
+    'keepalive_expiry': float(os.getenv('MAIB_HTTP_KEEPALIVE_EXPIRY', '30')),
+    'connect_timeout': float(os.getenv('MAIB_HTTP_CONNECT_TIMEOUT', '5')),
+    'read_timeout': float(os.getenv('MAIB_HTTP_READ_TIMEOUT', '30')),
+    'write_timeout': float(os.getenv('MAIB_HTTP_WRITE_TIMEOUT', '10')),
+    'pool_timeout': float(os.getenv('MAIB_HTTP_POOL_TIMEOUT', '5')),
+    'http2': os.getenv('MAIB_HTTP2', 'true').lower() == 'true',
+}
 
-# Log configuration on startup (minimal)
-logger.info(f"MAIB Configuration: Project ID={MAIB_CONFIG['project_id']}, API={MAIB_CONFIG['api_url']}, Test Mode={MAIB_CONFIG['test_mode']}")
+# Timeout-uri de citire per endpoint MAIB (secunde); connect/write/pool vin din MAIB_HTTP_CONFIG
+MAIB_ENDPOINT_TIMEOUTS = {
+    'generate-token': float(os.getenv('MAIB_TIMEOUT_TOKEN', '10')),
+    'pay': float(os.getenv('MAIB_TIMEOUT_PAY', '20')),
+    'pay-info': float(os.getenv('MAIB_TIMEOUT_PAY_INFO', '10')),
+    'refund': float(os.getenv('MAIB_TIMEOUT_REFUND', '20')),
+}
+
+# HTTP/2 necesită pachetul opțional `h2` (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Statusuri MAIB finale: plata nu mai trece în altă stare după acestea
+MAIB_TERMINAL_STATUSES = frozenset({
+    'OK', 'SUCCESS', 'APPROVED', 'FAILED', 'FAIL', 'DECLINED',
+    'CANCELLED', 'CANCEL', 'REVERSED', 'REFUNDED', 'TIMEOUT', 'EXPIRED',
+})
+
+# Metrici per etapă pentru apelurile MAIB
+MAIB_TOKEN_SECONDS = REGISTRY.histogram(
+    'maib_token_acquire_seconds', 'Timpul de obținere a access token-ului înainte de apel', ('endpoint',)
+)
+MAIB_CONNECT_SECONDS = REGISTRY.histogram(
+    'maib_connect_seconds', 'Timpul de stabilire a unei conexiuni noi (TCP + TLS) către MAIB', ('endpoint',)
+)
+MAIB_UPSTREAM_SECONDS = REGISTRY.histogram(
+    'maib_upstream_request_seconds', 'Durata unui request HTTP către MAIB (per încercare)', ('endpoint',)
+)
+MAIB_UPSTREAM_RESPONSES = REGISTRY.counter(
+    'maib_upstream_responses_total', 'Răspunsuri MAIB după endpoint și status HTTP', ('endpoint', 'status')
+)
+MAIB_RETRIES = REGISTRY.counter(
+    'maib_upstream_retries_total', 'Reîncercări ale apelurilor MAIB după motiv', ('endpoint', 'reason')
+)
+
+
+def _connection_tracer(endpoint: str, scheme: str):
+    """Trace httpcore: măsoară stabilirea conexiunilor noi (lipsește când conexiunea e refolosită)."""
+    started: Dict[str, float] = {}
+
+    async def trace(event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.started":
+            started["tcp"] = time.perf_counter()
+        elif "tcp" in started and (
+            event_name == "connection.start_tls.complete"
+            or (event_name == "connection.connect_tcp.complete" and scheme != "https")
+        ):
+            MAIB_CONNECT_SECONDS.observe(time.perf_counter() - started.pop("tcp"), endpoint=endpoint)
+
+    return trace
 
 
 class MaibPaymentService:
     """Serviciu pentru gestionarea plăților MAIB"""
 
-    access_token: Optional[str] = None
-    access_token_expires_at: Optional[datetime] = None
+    http_client: Optional[httpx.AsyncClient] = None
+    token_manager: Optional[MaibTokenManager] = None
+    callback_verifier = MaibCallbackVerifier(MAIB_CONFIG['signature_key'])
+    circuit_breaker = CircuitBreaker()
+    admission = AdmissionController()
+
+    @staticmethod
+    def log_configuration() -> None:
+        # la pornirea aplicației (lifespan), nu la importul modulului
+        logger.info(f"MAIB Configuration: Project ID={MAIB_CONFIG['project_id']}, API={MAIB_CONFIG['api_url']}, Test Mode={MAIB_CONFIG['test_mode']}")
+
+    @staticmethod
+    def build_http_client() -> httpx.AsyncClient:
+        """
+        Construiește clientul HTTP partajat pentru MAIB (keep-alive, HTTP/2 dacă e disponibil).
+        """
+        timeout = httpx.Timeout(
+            connect=MAIB_HTTP_CONFIG['connect_timeout'],
+            read=MAIB_HTTP_CONFIG['read_timeout'],
+            write=MAIB_HTTP_CONFIG['write_timeout'],
+            pool=MAIB_HTTP_CONFIG['pool_timeout'],
+        )
+        limits = httpx.Limits(
+            max_connections=MAIB_HTTP_CONFIG['max_connections'],
+            max_keepalive_connections=MAIB_HTTP_CONFIG['max_keepalive_connections'],
+            keepalive_expiry=MAIB_HTTP_CONFIG['keepalive_expiry'],
+        )
+        return httpx.AsyncClient(
+            timeout=timeout,
+            limits=limits,
+            http2=MAIB_HTTP_CONFIG['http2'] and HTTP2_AVAILABLE,
+        )
+
+    @staticmethod
+    async def start_http_client() -> None:
+        """
+        Creează clientul HTTP partajat (apelat la startup-ul aplicației FastAPI).
+        """
+        if MaibPaymentService.http_client is None or MaibPaymentService.http_client.is_closed:
+            MaibPaymentService.http_client = MaibPaymentService.build_http_client()
+            logger.info(
+                f"MAIB HTTP client started: max_connections={MAIB_HTTP_CONFIG['max_connections']}, "
+                f"http2={MAIB_HTTP_CONFIG['http2'] and HTTP2_AVAILABLE}"
+            )
+
+    @staticmethod
+    async def close_http_client() -> None:
+        """
+        Închide clientul HTTP partajat (apelat la shutdown-ul aplicației FastAPI).
+        """
+        if MaibPaymentService.http_client is not None:
+            await MaibPaymentService.http_client.aclose()
+            MaibPaymentService.http_client = None
+
+    @staticmethod
+    def get_http_client() -> httpx.AsyncClient:
+        """
+        Returnează clientul HTTP partajat; îl creează leneș dacă serviciul e folosit în afara aplicației.
+        """
+        if MaibPaymentService.http_client is None or MaibPaymentService.http_client.is_closed:
+            MaibPaymentService.http_client = MaibPaymentService.build_http_client()
+        return MaibPaymentService.http_client
+
+    @staticmethod
+    async def _request(
+        endpoint: str,
+        method: str,
+        url: str,
+        *,
+        idempotent: bool,
+        authenticated: bool = True,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Trimite un request către MAIB prin clientul partajat, cu:
+        - timeout de citire specific endpoint-ului
+        - reîncercări cu backoff exponențial + jitter (doar pentru apelurile idempotente;
+          cele ne-idempotente sunt reîncercate doar dacă conexiunea nu s-a stabilit, de cel mult
+          MAIB_RETRY_CONFIG['connect_max_attempts'] ori)
+        - un singur refresh de token + reîncercare la 401
+        - circuit breaker care refuză imediat apelurile cât timp MAIB e căzut
+        - control al admisiei: un număr maxim de apeluri simultane către MAIB, restul așteaptă
+          într-o coadă mărginită sau sunt refuzate (MaibOverloadedError)
+        """
+        breaker = MaibPaymentService.circuit_breaker
+        client = MaibPaymentService.get_http_client()
+        timeout = httpx.Timeout(
+            connect=MAIB_HTTP_CONFIG['connect_timeout'],
+            read=MAIB_ENDPOINT_TIMEOUTS.get(endpoint, MAIB_HTTP_CONFIG['read_timeout']),
+            write=MAIB_HTTP_CONFIG['write_timeout'],
+            pool=MAIB_HTTP_CONFIG['pool_timeout'],
+        )
+        max_attempts = MAIB_RETRY_CONFIG['max_attempts'] if idempotent else 1
+        connect_max_attempts = max_attempts if idempotent else MAIB_RETRY_CONFIG['connect_max_attempts']
+        attempt = 0
+        token_refreshed = False
+
+        while True:
+            attempt += 1
+            request_headers = dict(headers or {})
+            if authenticated:
+                # token-ul se obține înainte de breaker: are propriul apel protejat de breaker
+                token_started = time.perf_counter()
+                request_headers['Authorization'] = f"Bearer {await MaibPaymentService.get_access_token()}"
+                MAIB_TOKEN_SECONDS.observe(time.perf_counter() - token_started, endpoint=endpoint)
+
+            breaker.before_call()
+            outcome_recorded = False
+            request_started = None
+            try:
+                try:
+                    async with MaibPaymentService.admission.slot():
+                        request_started = time.perf_counter()
+                        resp = await client.request(
+                            method, url, headers=request_headers, timeout=timeout,
+                            extensions={"trace": _connection_tracer(endpoint, httpx.URL(url).scheme)},
+                            **kwargs,
+                        )
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                    # request-ul nu a plecat: se poate reîncerca chiar și pentru apelurile ne-idempotente
+                    breaker.record_failure()
+                    outcome_recorded = True
+                    MAIB_UPSTREAM_RESPONSES.inc(endpoint=endpoint, status="connect_error")
+                    if attempt < connect_max_attempts:
+                        logger.warning(f"MAIB {endpoint} connect error (attempt {attempt}): {str(e)}")
+                        MAIB_RETRIES.inc(endpoint=endpoint, reason="connect_error")
+                        await asyncio.sleep(backoff_delay(attempt))
+                        continue
+                    raise
+                except httpx.TransportError as e:
+                    breaker.record_failure()
+                    outcome_recorded = True
+                    MAIB_UPSTREAM_RESPONSES.inc(endpoint=endpoint, status="transport_error")
+                    if attempt < max_attempts:
+                        logger.warning(f"MAIB {endpoint} transport error (attempt {attempt}): {str(e)}")
+                        MAIB_RETRIES.inc(endpoint=endpoint, reason="transport_error")
+                        await asyncio.sleep(backoff_delay(attempt))
+                        continue
+                    raise
+                finally:
+                    if request_started is not None:
+                        MAIB_UPSTREAM_SECONDS.observe(time.perf_counter() - request_started, endpoint=endpoint)
+
+                MAIB_UPSTREAM_RESPONSES.inc(endpoint=endpoint, status=str(resp.status_code))
+
+                if resp.status_code == 401 and authenticated and not token_refreshed:
+                    # token expirat/revocat: un singur refresh forțat și reîncercare
+                    breaker.record_success()
+                    outcome_recorded = True
+                    token_refreshed = True
+                    attempt -= 1
+                    MAIB_RETRIES.inc(endpoint=endpoint, reason="unauthorized")
+                    MaibPaymentService.token_manager.invalidate()
+                    await MaibPaymentService.token_manager.refresh(force=True)
+                    continue
+
+                if resp.status_code >= 500 or resp.status_code == 429:
+                    breaker.record_failure()
+                    outcome_recorded = True
+                    if attempt < max_attempts:
+                        logger.warning(f"MAIB {endpoint} returned {resp.status_code} (attempt {attempt}), retrying")
+                        MAIB_RETRIES.inc(endpoint=endpoint, reason=str(resp.status_code))
+                        await asyncio.sleep(backoff_delay(attempt))
+                        continue
+                    return resp
+
+                breaker.record_success()
+                outcome_recorded = True
+                return resp
+            finally:
+                if not outcome_recorded:
+                    breaker.release_probe()
 
     @staticmethod
     async def get_access_token() -> str:
         """
-        Obține și cache-uiește access token-ul MAIB.
+        Obține access token-ul MAIB din cache-ul partajat (vezi MaibTokenManager).
         """
-        # Refolosim token-ul dacă este încă valid
-        if (
-            MaibPaymentService.access_token
-            and MaibPaymentService.access_token_expires_at
-            and MaibPaymentService.access_token_expires_at > datetime.utcnow()
-        ):
-            return MaibPaymentService.access_token
+        return await MaibPaymentService.token_manager.get_token()
+
+    @staticmethod
+    def configure_token_store(collection) -> None:
+        """
+        Partajează token-ul între workeri printr-o colecție MongoDB.
+        """
+        MaibPaymentService.token_manager.store = MongoTokenStore(collection)
 
+    @staticmethod
+    async def generate_access_token() -> Tuple[str, int]:
+        """
+        Generează un access token nou prin POST /v1/generate-token.
+
+        Returns:
+            (accessToken, expiresIn în secunde)
+        """
         token_url = f"{MAIB_CONFIG['api_url'].rstrip('/')}/v1/generate-token"
         payload = {
             "projectId": MAIB_CONFIG["project_id"],
             "projectSecret": MAIB_CONFIG["project_secret"],
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(token_url, json=payload)
-            if not resp.is_success:
-                try:
-                    error_data = resp.json()
-                except:
-                    error_data = {'raw': resp.text, 'statusCode': resp.status_code}
-                logger.info("MAIB generate-token Response (Error):")
-                logger.info(json.dumps(error_data, indent=2, ensure_ascii=False))
-                raise Exception(f"Eroare la generarea token-ului MAIB: {resp.status_code}")
-
-            data = resp.json()
-            logger.info("MAIB generate-token Response:")
-            logger.info(json.dumps(data, indent=2, ensure_ascii=False))
-            
-            result = data.get("result") or {}
-            access_token = result.get("accessToken")
-            expires_in = result.get("expiresIn") or 300
+        resp = await MaibPaymentService._request(
+            'generate-token', 'POST', token_url, idempotent=True, authenticated=False, json=payload
+        )
+        if not resp.is_success:
+            try:
+                error_data = fast_json.loads(resp.content)
+            except:
+                error_data = {'raw': resp.text, 'statusCode': resp.status_code}
+            log_payload(logger, "MAIB generate-token Response (Error)", error_data, level=logging.WARNING, sampled=False)
+            raise Exception(f"Eroare la generarea token-ului MAIB: {resp.status_code}")
+
+        data = fast_json.loads(resp.content)
+        log_payload(logger, "MAIB generate-token Response", data)
+        
+        result = data.get("result") or {}
+        access_token = result.get("accessToken")
+        expires_in = result.get("expiresIn") or 300
 
-            if not access_token:
-                raise Exception("Token MAIB lipsă în răspuns")
+        if not access_token:
+            raise Exception("Token MAIB lipsă în răspuns")
 
-            MaibPaymentService.access_token = access_token
-            # expiră puțin mai devreme (buffer 30s)
-            MaibPaymentService.access_token_expires_at = datetime.utcnow() + timedelta(
-                seconds=max(30, expires_in - 30)
-            )
+        return access_token, int(expires_in)
 
-            return access_token
-    
     @staticmethod
     def generate_signature(data: Dict[str, Any]) -> str:
         """
@@ -103,35 +351,91 @@ class MaibPaymentService:
             Hash SHA256 în format hex (lowercase)
         """
         try:
-            # Sortăm cheile alfabetic (excludem signature dacă există)
-            filtered_data = {k: v for k, v in data.items() if k != 'signature'}
-            
-            sorted_keys = sorted(filtered_data.keys())
-            
-            # Construim string-ul pentru semnătură
-            signature_parts = []
-            for key in sorted_keys:
-                value = filtered_data[key]
-                # Tratăm valorile null/undefined ca string gol
-                if value is None:
-                    value = ''
-                signature_parts.append(f"{key}={value}")
-            
-            signature_string = '&'.join(signature_parts)
-            
-            # Adăugăm signature key
-            full_string = f"{signature_string}&key={MAIB_CONFIG['signature_key']}"
-            
-            # Generăm hash SHA256
-            hash_obj = hashlib.sha256(full_string.encode('utf-8'))
-            hash_hex = hash_obj.hexdigest()
-            
-            return hash_hex
-            
+            # Cheile sortate alfabetic, fără signature; hash incremental cu cheia pre-codificată
+            return MaibPaymentService.callback_verifier.legacy_signature(data)
         except Exception as e:
             logger.error(f"❌ Error generating signature: {str(e)}", exc_info=True)
             raise Exception(f"Eroare la generarea semnăturii: {str(e)}")
     
+    @staticmethod
+    def build_pay_payload(request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Construiește body-ul pentru POST /v1/pay din datele primite de la frontend.
+        """
+        # Pregătim datele pentru request (API nou: /v1/pay cu Access Token)
+        items = request_data.get("items") or []
+        mapped_items = []
+        for it in items:
+            try:
+                # Validăm că toate câmpurile necesare există și nu sunt goale
+                item_id = it.get("id")
+                item_name = it.get("name")
+                item_price = it.get("price")
+                item_quantity = it.get("quantity")
+                
+                # Skip items invalide (fără id, name sau price)
+                if not item_id or not item_name or item_price is None:
+                    continue
+                
+                mapped_items.append(
+                    {
+                        "id": str(item_id),
+                        "name": str(item_name),
+                        "price": float(item_price),
+                        "quantity": int(item_quantity or 1),
+                    }
+                )
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Skipping invalid item: {e}")
+                continue
+
+        amount_value = float(request_data.get("amount", 0))
+        currency_value = request_data.get("currency", "MDL")
+        # API MAIB test suportă de regulă MDL; dacă primim altă valută, o forțăm pe MDL
+        if currency_value not in ("MDL", "MDL "):
+            currency_value = "MDL"
+        description_value = request_data.get("orderDescription", "")[:255]
+
+        order_data = {
+            "amount": amount_value,
+            "currency": currency_value,
+            "description": description_value,
+            "language": request_data.get("language", "ro"),
+            "orderId": request_data.get("orderId"),
+            "clientName": request_data.get("customerName"),
+            "email": request_data.get("customerEmail"),
+            "clientIp": request_data.get("clientIp") or "127.0.0.1",
+        }
+        
+        # Adăugăm câmpuri opționale doar dacă există și nu sunt goale
+        # Conform Postman collection: callBackUrl (cu C majusculă), nu callbackUrl
+        if request_data.get("customerPhone"):
+            order_data["phone"] = request_data.get("customerPhone")
+        
+        # MAIB folosește callBackUrl (cu C majusculă) conform documentației
+        callback_url = request_data.get("callbackUrl") or request_data.get("callBackUrl")
+        if callback_url:
+            order_data["callBackUrl"] = callback_url
+        
+        ok_url = request_data.get("redirectUrl") or request_data.get("successUrl") or request_data.get("okUrl")
+        if ok_url:
+            order_data["okUrl"] = ok_url
+        
+        # failUrl este obligatoriu conform MAIB API
+        fail_url = request_data.get("failUrl")
+        if not fail_url:
+            # Dacă nu este setat, folosim același URL ca okUrl sau un URL default
+            fail_url = ok_url or "http://localhost:3000/plata-esuata"
+        order_data["failUrl"] = fail_url
+        
+        # Adăugăm items doar dacă există și nu sunt goale
+        if mapped_items and len(mapped_items) > 0:
+            order_data["items"] = mapped_items
+
+        # Eliminăm orice câmp de semnătură transmis din frontend
+        order_data.pop("signature", None)
+        return order_data
+
     @staticmethod
     async def create_payment_session(request_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -144,78 +448,7 @@ class MaibPaymentService:
             Dicționar cu răspunsul de la MAIB (payId, formUrl, etc.)
         """
         try:
-            # Pregătim datele pentru request (API nou: /v1/pay cu Access Token)
-            items = request_data.get("items") or []
-            mapped_items = []
-            for it in items:
-                try:
-                    # Validăm că toate câmpurile necesare există și nu sunt goale
-                    item_id = it.get("id")
-                    item_name = it.get("name")
-                    item_price = it.get("price")
-                    item_quantity = it.get("quantity")
-                    
-                    # Skip items invalide (fără id, name sau price)
-                    if not item_id or not item_name or item_price is None:
-                        continue
-                    
-                    mapped_items.append(
-                        {
-                            "id": str(item_id),
-                            "name": str(item_name),
-                            "price": float(item_price),
-                            "quantity": int(item_quantity or 1),
-                        }
-                    )
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Skipping invalid item: {e}")
-                    continue
-
-            amount_value = float(request_data.get("amount", 0))
-            currency_value = request_data.get("currency", "MDL")
-            # API MAIB test suportă de regulă MDL; dacă primim altă valută, o forțăm pe MDL
-            if currency_value not in ("MDL", "MDL "):
-                currency_value = "MDL"
-            description_value = request_data.get("orderDescription", "")[:255]
-
-            order_data = {
-                "amount": amount_value,
-                "currency": currency_value,
-                "description": description_value,
-                "language": request_data.get("language", "ro"),
-                "orderId": request_data.get("orderId"),
-                "clientName": request_data.get("customerName"),
-                "email": request_data.get("customerEmail"),
-                "clientIp": request_data.get("clientIp") or "127.0.0.1",
-            }
-            
-            # Adăugăm câmpuri opționale doar dacă există și nu sunt goale
-            # Conform Postman collection: callBackUrl (cu C majusculă), nu callbackUrl
-            if request_data.get("customerPhone"):
-                order_data["phone"] = request_data.get("customerPhone")
-            
-            # MAIB folosește callBackUrl (cu C majusculă) conform documentației
-            callback_url = request_data.get("callbackUrl") or request_data.get("callBackUrl")
-            if callback_url:
-                order_data["callBackUrl"] = callback_url
-            
-            ok_url = request_data.get("redirectUrl") or request_data.get("successUrl") or request_data.get("okUrl")
-            if ok_url:
-                order_data["okUrl"] = ok_url
-            
-            # failUrl este obligatoriu conform MAIB API
-            fail_url = request_data.get("failUrl")
-            if not fail_url:
-                # Dacă nu este setat, folosim același URL ca okUrl sau un URL default
-                fail_url = ok_url or "http://localhost:3000/plata-esuata"
-            order_data["failUrl"] = fail_url
-            
-            # Adăugăm items doar dacă există și nu sunt goale
-            if mapped_items and len(mapped_items) > 0:
-                order_data["items"] = mapped_items
-
-            # Eliminăm orice câmp de semnătură transmis din frontend
-            order_data.pop("signature", None)
+            order_data = MaibPaymentService.build_pay_payload(request_data)
             
             # Construim URL-ul (forțăm /v1/pay dacă a rămas vechiul path)
             endpoint_path = MAIB_CONFIG['api_endpoint']
@@ -232,56 +465,49 @@ class MaibPaymentService:
             
             full_url = f"{api_url}{endpoint_path}"
             
-            # Obținem access token
-            access_token = await MaibPaymentService.get_access_token()
-
-            # Pregătim headers (Bearer token) și X-Project-Id (unele integrări îl cer)
+            # Pregătim headers; Bearer token-ul e adăugat de _request
             headers = {
                 'Content-Type': 'application/json',
-                'Authorization': f"Bearer {access_token}",
                 'X-Project-Id': MAIB_CONFIG['project_id'],
             }
             
-            # Facem request către MAIB API
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    full_url,
-                    json=order_data,
-                    headers=headers
-                )
-                
-                if not response.is_success:
-                    try:
-                        error_data = response.json()
-                    except:
-                        error_data = {'raw': response.text, 'statusCode': response.status_code}
-                    logger.info("MAIB pay Response (Error):")
-                    logger.info(json.dumps(error_data, indent=2, ensure_ascii=False))
-                    error_message = error_data.get('message') or error_data.get('error') or error_data.get('raw') or f"HTTP error! status: {response.status_code}"
-                    raise Exception(f"MAIB API Error ({response.status_code}): {error_message}")
-                
-                data = response.json()
-                logger.info("MAIB pay Response:")
-                logger.info(json.dumps(data, indent=2, ensure_ascii=False))
-                
-                result_obj = data.get("result") if isinstance(data, dict) else None
-                pay_id = None
-                form_url = None
-                if result_obj:
-                    pay_id = result_obj.get("payId")
-                    form_url = result_obj.get("payUrl") or result_obj.get("paymentUrl")
-                else:
-                    pay_id = data.get("payId") if isinstance(data, dict) else None
-                    form_url = data.get("payUrl") if isinstance(data, dict) else None
-                
-                return {
-                    'orderId': (result_obj.get('orderId') if result_obj else None) or request_data.get('orderId'),
-                    'payId': pay_id,
-                    'formUrl': form_url,
-                    'redirectUrl': request_data.get('redirectUrl'),
-                    'expiresAt': data.get('expiresAt'),
-                }
-                
+            # Facem request către MAIB API (/v1/pay nu e idempotent: fără reîncercări după trimitere)
+            response = await MaibPaymentService._request(
+                'pay', 'POST', full_url, idempotent=False, json=order_data, headers=headers
+            )
+            
+            if not response.is_success:
+                try:
+                    error_data = fast_json.loads(response.content)
+                except:
+                    error_data = {'raw': response.text, 'statusCode': response.status_code}
+                log_payload(logger, "MAIB pay Response (Error)", error_data, level=logging.WARNING, sampled=False)
+                error_message = error_data.get('message') or error_data.get('error') or error_data.get('raw') or f"HTTP error! status: {response.status_code}"
+                raise Exception(f"MAIB API Error ({response.status_code}): {error_message}")
+            
+            data = fast_json.loads(response.content)
+            log_payload(logger, "MAIB pay Response", data)
+            
+            result_obj = data.get("result") if isinstance(data, dict) else None
+            pay_id = None
+            form_url = None
+            if result_obj:
+                pay_id = result_obj.get("payId")
+                form_url = result_obj.get("payUrl") or result_obj.get("paymentUrl")
+            else:
+                pay_id = data.get("payId") if isinstance(data, dict) else None
+                form_url = data.get("payUrl") if isinstance(data, dict) else None
+            
+            return {
+                'orderId': (result_obj.get('orderId') if result_obj else None) or request_data.get('orderId'),
+                'payId': pay_id,
+                'formUrl': form_url,
+                'redirectUrl': request_data.get('redirectUrl'),
+                'expiresAt': data.get('expiresAt'),
+            }
+            
+        except MaibCircuitOpenError:
+            raise
         except httpx.TimeoutException:
             raise Exception("Timeout la comunicarea cu MAIB API")
         except httpx.RequestError as e:
@@ -298,67 +524,63 @@ class MaibPaymentService:
         Conform documentației MAIB: GET {{apiurl}}/v1/pay-info/{id}
         """
         try:
-            # Obținem access token
-            access_token = await MaibPaymentService.get_access_token()
-
             headers = {
-                "Authorization": f"Bearer {access_token}",
                 "X-Project-Id": MAIB_CONFIG["project_id"],
             }
 
             # Conform Postman collection: GET /v1/pay-info/{payId}
             status_url = f"{MAIB_CONFIG['api_url'].rstrip('/')}/v1/pay-info/{pay_id}"
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.get(status_url, headers=headers)
-
-                # Logăm răspunsul de la MAIB
-                if resp.status_code == 404:
-                    logger.info("MAIB pay-info Response (404):")
-                    logger.info(json.dumps({"statusCode": 404, "message": "Not found (normal in sandbox)"}, indent=2))
-                    return {
-                        "ok": True,
-                        "payId": pay_id,
-                        "status": "unknown_sandbox",
-                        "orderId": order_id,
-                        "raw": {
-                            "warning": "pay-info returned 404 in sandbox. Using redirect/callback as source of truth.",
-                            "statusCode": resp.status_code,
-                        },
-                    }
-
-                if not resp.is_success:
-                    try:
-                        err = resp.json()
-                    except Exception:
-                        err = {"raw": resp.text, "statusCode": resp.status_code}
-                    logger.info("MAIB pay-info Error Response:")
-                    logger.info(json.dumps(err, indent=2, ensure_ascii=False))
-                    msg = err.get("message") or err.get("error") or err.get("raw") or f"HTTP error! status: {resp.status_code}"
-                    raise Exception(f"MAIB Status Error ({resp.status_code}): {msg}")
-
-                data = resp.json()
-                logger.info("MAIB pay-info Response:")
-                logger.info(json.dumps(data, indent=2, ensure_ascii=False))
-
-                result_obj = data.get("result") if isinstance(data, dict) else None
-                status_value = None
-                order_id_value = None
-                if result_obj:
-                    status_value = result_obj.get("status") or result_obj.get("transactionStatus")
-                    order_id_value = result_obj.get("orderId")
-                else:
-                    status_value = data.get("status") if isinstance(data, dict) else None
-                    order_id_value = data.get("orderId") if isinstance(data, dict) else None
+            resp = await MaibPaymentService._request(
+                'pay-info', 'GET', status_url, idempotent=True, headers=headers
+            )
 
+            # Logăm răspunsul de la MAIB
+            if resp.status_code == 404:
+                log_payload(logger, "MAIB pay-info Response (404)", {"statusCode": 404, "message": "Not found (normal in sandbox)"}, sampled=False)
                 return {
-                    "ok": data.get("ok", True),
+                    "ok": True,
                     "payId": pay_id,
-                    "status": status_value,
-                    "orderId": order_id_value,
-                    "raw": data,
+                    "status": "unknown_sandbox",
+                    "orderId": order_id,
+                    "raw": {
+                        "warning": "pay-info returned 404 in sandbox. Using redirect/callback as source of truth.",
+                        "statusCode": resp.status_code,
+                    },
                 }
 
+            if not resp.is_success:
+                try:
+                    err = fast_json.loads(resp.content)
+                except Exception:
+                    err = {"raw": resp.text, "statusCode": resp.status_code}
+                log_payload(logger, "MAIB pay-info Error Response", err, level=logging.WARNING, sampled=False)
+                msg = err.get("message") or err.get("error") or err.get("raw") or f"HTTP error! status: {resp.status_code}"
+                raise Exception(f"MAIB Status Error ({resp.status_code}): {msg}")
+
+            data = fast_json.loads(resp.content)
+            log_payload(logger, "MAIB pay-info Response", data)
+
+            result_obj = data.get("result") if isinstance(data, dict) else None
+            status_value = None
+            order_id_value = None
+            if result_obj:
+                status_value = result_obj.get("status") or result_obj.get("transactionStatus")
+                order_id_value = result_obj.get("orderId")
+            else:
+                status_value = data.get("status") if isinstance(data, dict) else None
+                order_id_value = data.get("orderId") if isinstance(data, dict) else None
+
+            return {
+                "ok": data.get("ok", True),
+                "payId": pay_id,
+                "status": status_value,
+                "orderId": order_id_value,
+                "raw": data,
+            }
+
+        except MaibCircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error checking MAIB payment status: {str(e)}", exc_info=True)
             raise Exception(f"Eroare la verificarea statusului plății MAIB: {str(e)}")
@@ -377,12 +599,8 @@ class MaibPaymentService:
             Dicționar cu răspunsul de la MAIB
         """
         try:
-            # Obținem access token
-            access_token = await MaibPaymentService.get_access_token()
-
             headers = {
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
                 "X-Project-Id": MAIB_CONFIG["project_id"],
             }
 
@@ -397,36 +615,54 @@ class MaibPaymentService:
 
             refund_url = f"{MAIB_CONFIG['api_url'].rstrip('/')}/v1/refund"
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(refund_url, json=payload, headers=headers)
-
-                if not resp.is_success:
-                    try:
-                        error_data = resp.json()
-                    except:
-                        error_data = {"raw": resp.text, "statusCode": resp.status_code}
-                    logger.info("MAIB refund Response (Error):")
-                    logger.info(json.dumps(error_data, indent=2, ensure_ascii=False))
-                    msg = error_data.get("message") or error_data.get("error") or error_data.get("raw") or f"HTTP error! status: {resp.status_code}"
-                    raise Exception(f"MAIB Refund Error ({resp.status_code}): {msg}")
-
-                data = resp.json()
-                logger.info("MAIB refund Response:")
-                logger.info(json.dumps(data, indent=2, ensure_ascii=False))
+            resp = await MaibPaymentService._request(
+                'refund', 'POST', refund_url, idempotent=False, json=payload, headers=headers
+            )
 
-                result_obj = data.get("result") if isinstance(data, dict) else None
-                
-                return {
-                    "ok": data.get("ok", True),
-                    "payId": result_obj.get("payId") if result_obj else pay_id,
-                    "orderId": result_obj.get("orderId") if result_obj else None,
-                    "status": result_obj.get("status") if result_obj else None,
-                    "statusCode": result_obj.get("statusCode") if result_obj else None,
-                    "statusMessage": result_obj.get("statusMessage") if result_obj else None,
-                    "refundAmount": result_obj.get("refundAmount") if result_obj else refund_amount,
-                    "raw": data,
-                }
+            if not resp.is_success:
+                try:
+                    error_data = fast_json.loads(resp.content)
+                except:
+                    error_data = {"raw": resp.text, "statusCode": resp.status_code}
+                log_payload(logger, "MAIB refund Response (Error)", error_data, level=logging.WARNING, sampled=False)
+                msg = error_data.get("message") or error_data.get("error") or error_data.get("raw") or f"HTTP error! status: {resp.status_code}"
+                if resp.status_code >= 500:
+                    # eroare pe partea MAIB: refund-ul poate să fi fost totuși executat
+                    raise MaibUncertainResultError(f"MAIB Refund Error ({resp.status_code}): {msg}")
+                raise Exception(f"MAIB Refund Error ({resp.status_code}): {msg}")
+
+            try:
+                data = fast_json.loads(resp.content)
+            except ValueError:
+                raise MaibUncertainResultError(f"MAIB refund returned an unreadable response ({resp.status_code})")
+            log_payload(logger, "MAIB refund Response", data)
+
+            result_obj = data.get("result") if isinstance(data, dict) else None
+            
+            return {
+                "ok": data.get("ok", True),
+                "payId": result_obj.get("payId") if result_obj else pay_id,
+                "orderId": result_obj.get("orderId") if result_obj else None,
+                "status": result_obj.get("status") if result_obj else None,
+                "statusCode": result_obj.get("statusCode") if result_obj else None,
+                "statusMessage": result_obj.get("statusMessage") if result_obj else None,
+                "refundAmount": result_obj.get("refundAmount") if result_obj else refund_amount,
+                "raw": data,
+            }
 
+        except (MaibCircuitOpenError, MaibUncertainResultError):
+            raise
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # request-ul nu a plecat spre MAIB: refund-ul sigur nu a fost executat
+            logger.error(f"Error processing MAIB refund: {str(e)}", exc_info=True)
+            raise Exception(f"Eroare la procesarea refund-ului MAIB: {str(e)}")
+        except httpx.TransportError as e:
+            # timeout la citire / conexiune întreruptă după trimitere: rezultat necunoscut
+            logger.error(f"MAIB refund outcome unknown for {pay_id}: {str(e)}", exc_info=True)
+            raise MaibUncertainResultError(f"Rezultatul refund-ului MAIB este necunoscut: {str(e) or type(e).__name__}")
         except Exception as e:
             logger.error(f"Error processing MAIB refund: {str(e)}", exc_info=True)
             raise Exception(f"Eroare la procesarea refund-ului MAIB: {str(e)}")
+
+
+MaibPaymentService.token_manager = MaibTokenManager(MaibPaymentService.generate_access_token)
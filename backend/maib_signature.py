@@ -0,0 +1,105 @@
+"""
+MAIB Callback Signature Verification
+Verificarea semnăturii callback-urilor MAIB cu comparație în timp constant.
+
+Formatul MAIB (callback cu "result"):
+    base64(SHA256(valorile din result sortate după cheie, unite cu ':' + ':' + signatureKey))
+Formatul vechi (plat), folosit de generate_signature:
+    hex(SHA256("k1=v1&k2=v2...&key=" + signatureKey))
+
+Cheia este codificată o singură dată; la fiecare apel se face un singur join + un singur
+hashlib.sha256 (fără dicționare filtrate intermediare).
+"""
+import base64
+import hashlib
+import hmac
+from typing import Any, Dict, Optional
+
+_str = str
+
+
+def _value_str(value: Any) -> str:
+    # Conversie compatibilă cu exemplul PHP din documentația MAIB
+    if value is None or value is False:
+        return ""
+    if value is True:
+        return "1"
+    if isinstance(value, float) and value.is_integer():
+        return _str(int(value))
+    return _str(value)
+
+
+def _flatten(value: Any, out: list) -> None:
+    # Valorile imbricate sunt aplatizate recursiv, cu cheile sortate
+    if isinstance(value, dict):
+        for key in sorted(value):
+            _flatten(value[key], out)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _flatten(item, out)
+    else:
+        out.append(value if type(value) is _str else _value_str(value))
+
+
+class MaibCallbackVerifier:
+    """Verificator de semnături MAIB cu cheia pre-codificată"""
+
+    def __init__(self, signature_key: str):
+        key = signature_key.encode("utf-8")
+        self._key_suffix = b":" + key
+        self._legacy_key_suffix = b"&key=" + key
+        self.verified = 0
+        self.rejected = 0
+        self.missing = 0
+
+    def result_signature(self, result: Dict[str, Any]) -> bytes:
+        """Semnătura MAIB (base64, ca bytes) pentru obiectul "result" al unui callback."""
+        values = [result[key] for key in sorted(result)]
+        for i, value in enumerate(values):
+            if type(value) is _str:
+                continue
+            if isinstance(value, (dict, list, tuple)):
+                flat: list = []
+                _flatten(result, flat)
+                values = flat
+                break
+            values[i] = _value_str(value)
+        if not values:
+            return base64.b64encode(hashlib.sha256(self._key_suffix[1:]).digest())
+        message = ":".join(values).encode("utf-8") + self._key_suffix
+        return base64.b64encode(hashlib.sha256(message).digest())
+
+    def legacy_signature(self, data: Dict[str, Any]) -> str:
+        """Semnătura în formatul vechi (hex), fără câmpul `signature`."""
+        parts = [
+            f"{key}={'' if data[key] is None else data[key]}"
+            for key in sorted(data)
+            if key != "signature"
+        ]
+        message = "&".join(parts).encode("utf-8") + self._legacy_key_suffix
+        return hashlib.sha256(message).hexdigest()
+
+    def verify(self, payload: Dict[str, Any]) -> bool:
+        """
+        Verifică semnătura unui callback MAIB (format cu "result" sau format plat).
+        """
+        signature: Optional[str] = payload.get("signature")
+        if not signature:
+            self.missing += 1
+            return False
+        received = str(signature).encode("utf-8")
+
+        result = payload.get("result")
+        if isinstance(result, dict):
+            valid = hmac.compare_digest(self.result_signature(result), received)
+        else:
+            valid = hmac.compare_digest(self.legacy_signature(payload).encode("ascii"), received.lower())
+
+        if valid:
+            self.verified += 1
+        else:
+            self.rejected += 1
+        return valid
+
+    def stats(self) -> Dict[str, int]:
+        return {"verified": self.verified, "rejected": self.rejected, "missing": self.missing}
@@ -0,0 +1,254 @@
+"""
+MAIB Simulator
+Server local care imită MAIB eCommerce API (/v1/generate-token, /v1/pay, /v1/pay-info/{id},
+/v1/refund) pentru teste de încărcare fără a contacta api.maibmerchants.md.
+
+Pornire (din directorul backend):
+    uvicorn maib_simulator:app --port 8100
+iar backend-ul se pornește cu MAIB_API_URL=http://localhost:8100.
+
+Latența, rata de erori, durata token-ului și livrarea callback-urilor se configurează
+prin variabilele MAIB_SIM_*. Callback-urile sunt semnate cu MAIB_SIGNATURE_KEY, în formatul
+verificat de MaibCallbackVerifier.
+"""
+import asyncio
+import logging
+import os
+import random
+import secrets
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from maib_signature import MaibCallbackVerifier
+
+logger = logging.getLogger(__name__)
+
+# Configurație simulator
+MAIB_SIM_CONFIG = {
+    # latența fiecărui răspuns: medie + jitter uniform (milisecunde)
+    'latency_ms': float(os.getenv('MAIB_SIM_LATENCY_MS', '50')),
+    'latency_jitter_ms': float(os.getenv('MAIB_SIM_LATENCY_JITTER_MS', '25')),
+    # probabilitatea unui răspuns 500 / 429
+    'error_rate': float(os.getenv('MAIB_SIM_ERROR_RATE', '0')),
+    'throttle_rate': float(os.getenv('MAIB_SIM_THROTTLE_RATE', '0')),
+    'token_ttl': int(os.getenv('MAIB_SIM_TOKEN_TTL', '300')),
+    # probabilitatea ca plata să fie refuzată
+    'decline_rate': float(os.getenv('MAIB_SIM_DECLINE_RATE', '0.1')),
+    # după cât timp "plătește" clientul și pleacă callback-ul (0 = fără callback)
+    'callback_delay': float(os.getenv('MAIB_SIM_CALLBACK_DELAY', '1')),
+    # callback-ul merge la callBackUrl din /v1/pay sau, dacă lipsește, aici
+    'callback_url': os.getenv('MAIB_SIM_CALLBACK_URL', 'http://localhost:8000/api/payment/maib/callback'),
+    'signature_key': os.getenv('MAIB_SIGNATURE_KEY', '4fa8f893-7f39-4f13-b5c2-34e6629b84dc'),
+}
+
+app = FastAPI(title="MAIB simulator")
+
+signer = MaibCallbackVerifier(MAIB_SIM_CONFIG['signature_key'])
+
+# token -> momentul expirării (time.monotonic())
+tokens: Dict[str, float] = {}
+# payId -> starea plății
+payments: Dict[str, Dict[str, Any]] = {}
+callback_tasks: set = set()
+callback_client: Optional[httpx.AsyncClient] = None
+
+stats = {
+    "tokens": 0,
+    "pay": 0,
+    "payInfo": 0,
+    "refund": 0,
+    "errors": 0,
+    "throttled": 0,
+    "unauthorized": 0,
+    "callbacksSent": 0,
+    "callbacksFailed": 0,
+}
+
+
+async def _simulate_latency() -> None:
+    delay = MAIB_SIM_CONFIG['latency_ms'] + random.uniform(0, MAIB_SIM_CONFIG['latency_jitter_ms'])
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+
+def _injected_failure() -> Optional[JSONResponse]:
+    if random.random() < MAIB_SIM_CONFIG['error_rate']:
+        stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"ok": False, "errors": [{"errorMessage": "Simulated failure"}]})
+    if random.random() < MAIB_SIM_CONFIG['throttle_rate']:
+        stats["throttled"] += 1
+        return JSONResponse(status_code=429, content={"ok": False, "errors": [{"errorMessage": "Too many requests"}]},
+                            headers={"Retry-After": "1"})
+    return None
+
+
+def _authorized(request: Request) -> bool:
+    token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    expires_at = tokens.get(token)
+    if expires_at is None or expires_at <= time.monotonic():
+        tokens.pop(token, None)
+        stats["unauthorized"] += 1
+        return False
+    return True
+
+
+def _unauthorized() -> JSONResponse:
+    return JSONResponse(status_code=401, content={"ok": False, "errors": [{"errorMessage": "Invalid access token"}]})
+
+
+@app.post("/v1/generate-token")
+async def generate_token(request: Request):
+    await _simulate_latency()
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    body = await request.json()
+    if not body.get("projectId") or not body.get("projectSecret"):
+        return JSONResponse(status_code=400, content={"ok": False, "errors": [{"errorMessage": "Missing credentials"}]})
+    token = secrets.token_urlsafe(32)
+    tokens[token] = time.monotonic() + MAIB_SIM_CONFIG['token_ttl']
+    stats["tokens"] += 1
+    return {
+        "ok": True,
+        "result": {
+            "accessToken": token,
+            "expiresIn": MAIB_SIM_CONFIG['token_ttl'],
+            "refreshToken": secrets.token_urlsafe(32),
+            "refreshExpiresIn": MAIB_SIM_CONFIG['token_ttl'] * 2,
+            "tokenType": "Bearer",
+        },
+    }
+
+
+@app.post("/v1/pay")
+async def pay(request: Request):
+    await _simulate_latency()
+    if not _authorized(request):
+        return _unauthorized()
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    body = await request.json()
+    pay_id = str(uuid.uuid4())
+    payments[pay_id] = {
+        "payId": pay_id,
+        "orderId": body.get("orderId"),
+        "amount": body.get("amount"),
+        "currency": body.get("currency", "MDL"),
+        "status": "PENDING",
+        "statusCode": None,
+        "statusMessage": None,
+        "createdAt": time.time(),
+    }
+    stats["pay"] += 1
+    if MAIB_SIM_CONFIG['callback_delay'] > 0:
+        task = asyncio.ensure_future(
+            _complete_payment(pay_id, body.get("callBackUrl") or MAIB_SIM_CONFIG['callback_url'])
+        )
+        callback_tasks.add(task)
+        task.add_done_callback(callback_tasks.discard)
+    return {
+        "ok": True,
+        "result": {
+            "payId": pay_id,
+            "orderId": body.get("orderId"),
+            "payUrl": f"{str(request.base_url).rstrip('/')}/checkout/{pay_id}",
+        },
+    }
+
+
+@app.get("/v1/pay-info/{pay_id}")
+async def pay_info(pay_id: str, request: Request):
+    await _simulate_latency()
+    if not _authorized(request):
+        return _unauthorized()
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    stats["payInfo"] += 1
+    payment = payments.get(pay_id)
+    if payment is None:
+        return JSONResponse(status_code=404, content={"ok": False, "errors": [{"errorMessage": "Payment not found"}]})
+    return {"ok": True, "result": {k: v for k, v in payment.items() if k != "createdAt"}}
+
+
+@app.post("/v1/refund")
+async def refund(request: Request):
+    await _simulate_latency()
+    if not _authorized(request):
+        return _unauthorized()
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    body = await request.json()
+    payment = payments.get(body.get("payId"))
+    if payment is None:
+        return JSONResponse(status_code=404, content={"ok": False, "errors": [{"errorMessage": "Payment not found"}]})
+    if payment["status"] != "OK":
+        return JSONResponse(status_code=400, content={"ok": False, "errors": [{"errorMessage": "Payment is not refundable"}]})
+    stats["refund"] += 1
+    refund_amount = body.get("refundAmount") or payment["amount"]
+    payment["status"] = "REVERSED"
+    return {
+        "ok": True,
+        "result": {
+            "payId": payment["payId"],
+            "orderId": payment["orderId"],
+            "status": "REVERSED",
+            "statusCode": "400",
+            "statusMessage": "Accepted",
+            "refundAmount": refund_amount,
+        },
+    }
+
+
+@app.get("/sim/stats")
+async def get_stats():
+    return {**stats, "payments": len(payments), "pendingCallbacks": len(callback_tasks)}
+
+
+async def _complete_payment(pay_id: str, callback_url: str) -> None:
+    """Finalizează plata după `callback_delay` și trimite callback-ul semnat către backend."""
+    await asyncio.sleep(MAIB_SIM_CONFIG['callback_delay'])
+    payment = payments.get(pay_id)
+    if payment is None:
+        return
+    if random.random() < MAIB_SIM_CONFIG['decline_rate']:
+        payment.update(status="FAILED", statusCode="116", statusMessage="Insufficient funds")
+    else:
+        payment.update(status="OK", statusCode="000", statusMessage="Approved")
+
+    result = {
+        "payId": payment["payId"],
+        "orderId": payment["orderId"],
+        "status": payment["status"],
+        "statusCode": payment["statusCode"],
+        "statusMessage": payment["statusMessage"],
+        "amount": payment["amount"],
+        "currency": payment["currency"],
+    }
+    callback = {"result": result, "signature": signer.result_signature(result).decode("ascii")}
+
+    global callback_client
+    if callback_client is None:
+        callback_client = httpx.AsyncClient(timeout=10)
+    try:
+        response = await callback_client.post(callback_url, json=callback)
+        response.raise_for_status()
+        stats["callbacksSent"] += 1
+    except Exception as e:
+        stats["callbacksFailed"] += 1
+        logger.warning(f"MAIB simulator callback for {pay_id} failed: {str(e)}")
+
+
+@app.on_event("shutdown")
+async def shutdown_callbacks():
+    for task in list(callback_tasks):
+        task.cancel()
+    if callback_client is not None:
+        await callback_client.aclose()
@@ -0,0 +1,37 @@
+"""
+MAIB Payment Status Cache
+Cache in-process pentru rezultatele /v1/pay-info, cu TTL în funcție de status,
+evacuare LRU și coalescing (request-urile simultane pentru același payId fac un singur apel).
+"""
+import os
+from typing import Any, Dict
+
+from maib_service import MAIB_TERMINAL_STATUSES
+from ttl_cache import TTLCache
+
+# Configurație cache status
+MAIB_STATUS_CACHE_CONFIG = {
+    'max_entries': int(os.getenv('MAIB_STATUS_CACHE_MAX_ENTRIES', '10000')),
+    # statusurile finale (OK, FAILED, REVERSED...) nu se mai schimbă
+    'terminal_ttl': float(os.getenv('MAIB_STATUS_CACHE_TERMINAL_TTL', '3600')),
+    # plățile în curs se re-verifică des
+    'pending_ttl': float(os.getenv('MAIB_STATUS_CACHE_PENDING_TTL', '2')),
+}
+
+
+class PaymentStatusCache(TTLCache):
+    """Cache LRU cu TTL per intrare pentru statusurile plăților MAIB, indexat după payId"""
+
+    def __init__(
+        self,
+        max_entries: int = MAIB_STATUS_CACHE_CONFIG['max_entries'],
+        terminal_ttl: float = MAIB_STATUS_CACHE_CONFIG['terminal_ttl'],
+        pending_ttl: float = MAIB_STATUS_CACHE_CONFIG['pending_ttl'],
+    ):
+        super().__init__(max_entries, pending_ttl)
+        self.terminal_ttl = terminal_ttl
+        self.pending_ttl = pending_ttl
+
+    def ttl_for(self, result: Dict[str, Any]) -> float:
+        status = (result.get("status") or "").upper()
+        return self.terminal_ttl if status in MAIB_TERMINAL_STATUSES else self.pending_ttl
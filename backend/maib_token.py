@@ -0,0 +1,247 @@
+"""
+MAIB Access Token Manager
+Cache pentru access token-ul MAIB: o singură cerere de refresh în zbor (single-flight),
+refresh proactiv în background înainte de expirare și partajare între workerii uvicorn
+printr-un store comun (MongoDB).
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Configurație token manager
+MAIB_TOKEN_CONFIG = {
+    # cu câte secunde înainte de expirare reîmprospătăm token-ul în background
+    'refresh_margin': float(os.getenv('MAIB_TOKEN_REFRESH_MARGIN', '60')),
+    # cât timp deține un worker dreptul exclusiv de a genera token (lease în store)
+    'lease_seconds': float(os.getenv('MAIB_TOKEN_LEASE_SECONDS', '15')),
+    # partajăm token-ul între workeri prin MongoDB (colecția maib_tokens)
+    'shared_store': os.getenv('MAIB_TOKEN_SHARED_STORE', 'true').lower() == 'true',
+    # generăm token-ul imediat la startup, înainte de primul request
+    'prefetch': os.getenv('MAIB_TOKEN_PREFETCH', 'true').lower() == 'true',
+}
+
+# Fetcher-ul întoarce (access_token, expires_in_seconds)
+TokenFetcher = Callable[[], Awaitable[Tuple[str, int]]]
+
+
+class MongoTokenStore:
+    """Store partajat între workeri pentru token-ul MAIB (un singur document în MongoDB)"""
+
+    DOC_ID = "maib_access_token"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def load(self) -> Optional[Tuple[str, datetime]]:
+        doc = await self.collection.find_one({"_id": self.DOC_ID})
+        if not doc or not doc.get("accessToken") or not doc.get("expiresAt"):
+            return None
+        return doc["accessToken"], doc["expiresAt"]
+
+    async def save(self, access_token: str, expires_at: datetime) -> None:
+        await self.collection.update_one(
+            {"_id": self.DOC_ID},
+            {"$set": {"accessToken": access_token, "expiresAt": expires_at, "updatedAt": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def acquire_lease(self, owner: str, seconds: float) -> bool:
+        """
+        Încearcă să obțină dreptul exclusiv de a genera un token nou.
+        Reușește dacă nu există lease sau dacă lease-ul existent a expirat.
+        """
+        now = datetime.utcnow()
+        try:
+            doc = await self.collection.find_one_and_update(
+                {
+                    "_id": self.DOC_ID,
+                    "$or": [
+                        {"leaseUntil": {"$exists": False}},
+                        {"leaseUntil": {"$lt": now}},
+                        {"leaseOwner": owner},
+                    ],
+                },
+                {"$set": {"leaseOwner": owner, "leaseUntil": now + timedelta(seconds=seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # documentul există și lease-ul este deținut de alt worker
+            return False
+        return bool(doc and doc.get("leaseOwner") == owner)
+
+    async def release_lease(self, owner: str) -> None:
+        await self.collection.update_one(
+            {"_id": self.DOC_ID, "leaseOwner": owner},
+            {"$unset": {"leaseOwner": "", "leaseUntil": ""}},
+        )
+
+
+class MaibTokenManager:
+    """
+    Gestionează access token-ul MAIB:
+    - request-urile concurente care găsesc token-ul expirat așteaptă același refresh (single-flight)
+    - un task de background reîmprospătează token-ul cu `refresh_margin` secunde înainte de expirare
+    - cu un store configurat, workerii își împart token-ul și doar unul îl generează (lease)
+    """
+
+    def __init__(
+        self,
+        fetcher: TokenFetcher,
+        store: Optional[MongoTokenStore] = None,
+        refresh_margin: float = MAIB_TOKEN_CONFIG['refresh_margin'],
+        lease_seconds: float = MAIB_TOKEN_CONFIG['lease_seconds'],
+    ):
+        self.fetcher = fetcher
+        self.store = store
+        self.refresh_margin = refresh_margin
+        self.lease_seconds = lease_seconds
+        self.owner = str(uuid.uuid4())
+        self.access_token: Optional[str] = None
+        self.expires_at: Optional[datetime] = None
+        self.lifetime: Optional[float] = None
+        self.refresh_count = 0
+        self._inflight: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def effective_margin(self) -> float:
+        """Marja de refresh, limitată la jumătate din durata de viață a token-ului."""
+        if self.lifetime:
+            return min(self.refresh_margin, self.lifetime / 2)
+        return self.refresh_margin
+
+    def is_valid(self, margin: float = 0) -> bool:
+        return bool(
+            self.access_token
+            and self.expires_at
+            and self.expires_at - timedelta(seconds=margin) > datetime.utcnow()
+        )
+
+    async def get_token(self) -> str:
+        """
+        Returnează token-ul curent; blochează doar dacă nu există un token valid.
+        """
+        if self.is_valid():
+            return self.access_token
+        return await self.refresh()
+
+    def invalidate(self) -> None:
+        """Marchează token-ul curent ca invalid (ex. după un 401 de la MAIB)."""
+        self.access_token = None
+        self.expires_at = None
+
+    async def refresh(self, force: bool = False) -> str:
+        """
+        Reîmprospătează token-ul; apelurile concurente împart aceeași cerere în zbor.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._do_refresh(force))
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future: asyncio.Future) -> None:
+        if self._inflight is future:
+            self._inflight = None
+        # evităm "Future exception was never retrieved" când nimeni nu mai așteaptă
+        if not future.cancelled():
+            future.exception()
+
+    async def _do_refresh(self, force: bool) -> str:
+        if self.store is None:
+            return await self._fetch_and_set()
+
+        # Poate alt worker a generat deja un token proaspăt
+        if not force and await self._adopt_from_store():
+            return self.access_token
+
+        if await self.store.acquire_lease(self.owner, self.lease_seconds):
+            try:
+                if not force and await self._adopt_from_store():
+                    return self.access_token
+                access_token = await self._fetch_and_set()
+                await self.store.save(access_token, self.expires_at)
+                return access_token
+            finally:
+                await self.store.release_lease(self.owner)
+
+        # Alt worker generează token-ul: așteptăm să apară în store
+        deadline = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        while datetime.utcnow() < deadline:
+            await asyncio.sleep(0.2)
+            if await self._adopt_from_store():
+                return self.access_token
+
+        logger.warning("MAIB token lease holder did not publish a token in time, fetching locally")
+        access_token = await self._fetch_and_set()
+        await self.store.save(access_token, self.expires_at)
+        return access_token
+
+    async def _adopt_from_store(self) -> bool:
+        stored = await self.store.load()
+        if not stored:
+            return False
+        access_token, expires_at = stored
+        if expires_at - timedelta(seconds=self.effective_margin()) <= datetime.utcnow():
+            return False
+        if access_token != self.access_token:
+            self.access_token = access_token
+            self.expires_at = expires_at
+        return True
+
+    async def _fetch_and_set(self) -> str:
+        access_token, expires_in = await self.fetcher()
+        self.refresh_count += 1
+        self.access_token = access_token
+        # expiră puțin mai devreme (buffer 30s)
+        self.lifetime = max(30, expires_in - 30)
+        self.expires_at = datetime.utcnow() + timedelta(seconds=self.lifetime)
+        return access_token
+
+    def start(self) -> None:
+        """Pornește task-ul de refresh proactiv (apelat la startup-ul aplicației)."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """Oprește task-ul de refresh proactiv (apelat la shutdown)."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def _seconds_until_refresh(self) -> float:
+        if not self.expires_at:
+            return 0
+        remaining = (self.expires_at - datetime.utcnow()).total_seconds() - self.effective_margin()
+        # jitter ca workerii să nu se trezească toți în aceeași secundă
+        return max(0.0, remaining) + random.uniform(0, 2)
+
+    async def _refresh_loop(self) -> None:
+        backoff = 1.0
+        if not MAIB_TOKEN_CONFIG['prefetch'] and not self.is_valid():
+            # fără prefetch, așteptăm primul token obținut pe calea de request
+            while not self.is_valid():
+                await asyncio.sleep(1)
+        while True:
+            try:
+                await asyncio.sleep(self._seconds_until_refresh())
+                await self.refresh()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MAIB background token refresh failed: {str(e)}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
@@ -0,0 +1,72 @@
+"""
+Lazy MongoDB
+Clientul Motor este construit abia la prima operație pe o colecție, nu la importul aplicației:
+pornirea la rece nu mai plătește importul motor, rezolvarea DNS pentru mongodb+srv și thread-urile
+de monitorizare, iar modulele se pot importa fără MONGO_URL (ex. în teste sau benchmark-uri).
+"""
+from typing import Any, Callable, Dict
+
+from settings import Settings, get_settings
+
+
+class LazyCollection:
+    """Colecție Motor rezolvată la primul acces la un atribut (find_one, insert_one, ...)"""
+
+    def __init__(self, mongo: "LazyMongo", name: str):
+        self._mongo = mongo
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        # numele colecției fără să creeze clientul (ex. etichetele de metrici ale InsertBatcher)
+        return self._name
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._mongo.database[self._name], attribute)
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self._name!r})"
+
+
+class LazyMongo:
+    """Înlocuitor pentru `client[DB_NAME]`: db.<colecție> întoarce o LazyCollection"""
+
+    def __init__(self, settings_loader: Callable[[], Settings] = get_settings):
+        self._settings_loader = settings_loader
+        self._client = None
+        self._collections: Dict[str, LazyCollection] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            settings = self._settings_loader()
+            if not settings.mongo_url or not settings.db_name:
+                raise RuntimeError("MongoDB is not configured: set MONGO_URL and DB_NAME")
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            self._client = AsyncIOMotorClient(settings.mongo_url)
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self._settings_loader().db_name]
+
+    def __getattr__(self, name: str) -> LazyCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> LazyCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = LazyCollection(self, name)
+        return collection
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
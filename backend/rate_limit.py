@@ -0,0 +1,96 @@
+"""
+Rate Limit
+Limitare per client (IP) și rută pentru endpoint-urile de plată, cu token bucket: fiecare cheie
+(ip, rută) primește `rate` request-uri pe secundă, cu rafale de până la `burst`. O buclă de
+polling defectă sau un bot primesc 429 înainte să consume pool-ul de conexiuni și cota MAIB.
+
+Cheia de limitare trebuie să fie adresa reală a clientului, deci limitarea pornește doar după
+ce topologia este declarată prin TRUSTED_PROXY_HOPS: numărul de proxy-uri de încredere din fața
+backend-ului (Vercel / CDN / nginx = de obicei 1; 0 = backend expus direct). Fără această setare,
+în spatele unui proxy toți clienții ar împărți un singur bucket (adresa proxy-ului).
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Configurație rate limiting
+RATE_LIMIT_CONFIG = {
+    # activă doar împreună cu TRUSTED_PROXY_HOPS (vezi rate_limit_enabled)
+    'enabled': os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    # request-uri pe secundă per (ip, rută), în regim constant
+    'rate': float(os.getenv('RATE_LIMIT_RATE', '2')),
+    # câte request-uri pot veni deodată (ex. polling-ul de status după redirect)
+    'burst': float(os.getenv('RATE_LIMIT_BURST', '10')),
+    # câte chei sunt ținute în memorie (cele mai vechi sunt uitate = bucket plin)
+    'max_keys': int(os.getenv('RATE_LIMIT_MAX_KEYS', '10000')),
+    # câte proxy-uri de încredere (load balancer, CDN) adaugă adresa clientului în X-Forwarded-For;
+    # 0 = backend expus direct, se folosește adresa conexiunii; nesetat = limitarea este oprită
+    'trusted_proxy_hops': int(os.environ['TRUSTED_PROXY_HOPS']) if os.getenv('TRUSTED_PROXY_HOPS') else None,
+}
+
+
+def rate_limit_enabled(config: Dict[str, Any] = RATE_LIMIT_CONFIG) -> bool:
+    """Limitarea rulează doar dacă este activată și numărul de proxy-uri de încredere este declarat."""
+    return config['enabled'] and config['trusted_proxy_hops'] is not None
+
+
+def client_address(forwarded_for: Optional[str], peer: Optional[str],
+                   trusted_proxy_hops: Optional[int] = RATE_LIMIT_CONFIG['trusted_proxy_hops']) -> str:
+    """
+    Adresa clientului pentru limitare. Intrările din stânga ale X-Forwarded-For sunt trimise de
+    client și pot fi falsificate; luăm doar adresa adăugată de ultimul proxy de încredere
+    (a `trusted_proxy_hops`-a din dreapta), altfel adresa conexiunii.
+    """
+    if trusted_proxy_hops and forwarded_for:
+        hops = [part.strip() for part in forwarded_for.split(',') if part.strip()]
+        # mai puține intrări decât proxy-uri: request-ul nu a trecut prin tot lanțul de încredere
+        if len(hops) >= trusted_proxy_hops:
+            return hops[-trusted_proxy_hops]
+    return peer or "127.0.0.1"
+
+
+class TokenBucketLimiter:
+    """Token bucket per cheie, în memoria procesului (fiecare worker uvicorn are limitele lui)"""
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_CONFIG['rate'],
+        burst: float = RATE_LIMIT_CONFIG['burst'],
+        max_keys: int = RATE_LIMIT_CONFIG['max_keys'],
+    ):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key: Hashable) -> float:
+        """Consumă un token; întoarce 0 dacă request-ul e permis, altfel secundele până la următorul token."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+            self.allowed += 1
+        else:
+            retry_after = (1 - tokens) / self.rate if self.rate > 0 else 60.0
+            self.limited += 1
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
@@ -1,40 +1,93 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
 import os
+import base64
+import hashlib
+import json
+import math
+import asyncio
+import time
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any, Union
 import uuid
 from datetime import datetime
-from maib_service import MaibPaymentService
+from settings import get_settings
+from mongo import LazyMongo
+from maib_service import MaibPaymentService, MAIB_CONFIG, MAIB_TERMINAL_STATUSES
+from maib_resilience import MaibCircuitOpenError
+from maib_token import MAIB_TOKEN_CONFIG
+from maib_status_cache import PaymentStatusCache
+from maib_ledger import PaymentLedger
+from maib_idempotency import SessionIdempotency
+from maib_callback_queue import CallbackQueue
+from maib_refund_jobs import RefundJobs, RefundConflictError, MAIB_REFUND_JOB_CONFIG
+from maib_reconciler import PaymentReconciler
+from supabase_rest import SupabaseRest
+from rate_limit import TokenBucketLimiter, RATE_LIMIT_CONFIG, client_address, rate_limit_enabled
+from catalog_cache import CatalogCache
+from stock_availability import StockAvailability, STOCK_CACHE_CONFIG
+from stock_reservations import StockReservations, InsufficientStockError, ReservationConflictError, requested_quantities
+from metrics import REGISTRY, CONTENT_TYPE_LATEST
+from insert_batcher import InsertBatcher
+from log_config import configure_logging, log_payload
+import fast_json
+from fast_json import FastJSONResponse, model_response
 
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# Configure logging FIRST (before using logger)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Configurația de bază (.env citit o singură dată)
+settings = get_settings()
 
-# Create the main app without a prefix
-app = FastAPI()
+# MongoDB: clientul Motor este creat la prima operație, nu la import (vezi mongo.py)
+db = LazyMongo()
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Cache pentru statusurile plăților MAIB (frontend-ul face polling după redirect)
+maib_status_cache = PaymentStatusCache()
+
+# Registrul plăților MAIB (alimentat de callback-uri, sesiuni și refund-uri)
+maib_ledger = PaymentLedger(db.maib_payments)
+
+# Dublu-click / retry pe "Plătește" nu creează sesiuni MAIB duplicate pentru același orderId
+maib_session_idempotency = SessionIdempotency(maib_ledger)
+
+# Limite pentru verificarea în lot a statusurilor (reconciliere back-office)
+MAIB_STATUS_BATCH_CONFIG = {
+    'concurrency': int(os.getenv('MAIB_STATUS_BATCH_CONCURRENCY', '10')),
+    'max_items': int(os.getenv('MAIB_STATUS_BATCH_MAX_ITEMS', '1000')),
+}
+
+# Paginare pentru GET /api/status
+STATUS_CHECKS_CONFIG = {
+    'default_limit': int(os.getenv('STATUS_CHECKS_DEFAULT_LIMIT', '100')),
+    'max_limit': int(os.getenv('STATUS_CHECKS_MAX_LIMIT', '1000')),
+    'stream_batch_size': int(os.getenv('STATUS_CHECKS_STREAM_BATCH_SIZE', '500')),
+    # POST /api/status/bulk
+    'bulk_max_items': int(os.getenv('STATUS_CHECKS_BULK_MAX_ITEMS', '10000')),
+    'bulk_chunk_size': int(os.getenv('STATUS_CHECKS_BULK_CHUNK_SIZE', '1000')),
+    # micro-batching opțional pentru POST /api/status (agenți / health probes)
+    'batch_writes': os.getenv('STATUS_CHECKS_BATCH_WRITES', 'false').lower() == 'true',
+    'batch_max_size': int(os.getenv('STATUS_CHECKS_BATCH_MAX_SIZE', '500')),
+    'batch_max_delay_ms': float(os.getenv('STATUS_CHECKS_BATCH_MAX_DELAY_MS', '5')),
+}
+
+STATUS_CHECK_FIELDS = ("id", "client_name", "timestamp")
+
+status_check_batcher = InsertBatcher(
+    db.status_checks,
+    max_batch=STATUS_CHECKS_CONFIG['batch_max_size'],
+    max_delay=STATUS_CHECKS_CONFIG['batch_max_delay_ms'] / 1000,
+) if STATUS_CHECKS_CONFIG['batch_writes'] else None
+
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -52,15 +105,153 @@ async def root():
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+    status_obj = StatusCheck(client_name=input.client_name)
+    status_doc = status_obj.model_dump()
+    if status_check_batcher is not None:
+        await status_check_batcher.insert(status_doc)
+    else:
+        _ = await db.status_checks.insert_one(status_doc)
+    return model_response(status_obj)
+
+def _parse_bulk_body(body: bytes, content_type: str) -> List[Any]:
+    # acceptă un array JSON sau NDJSON (un obiect pe linie)
+    try:
+        if "ndjson" in content_type:
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON body")
+    return items
+
+@api_router.post("/status/bulk")
+async def create_status_checks_bulk(request: Request):
+    """
+    Inserează mai multe status check-uri dintr-un singur request (array JSON sau NDJSON).
+    Toate elementele sunt validate înainte de scriere; scrierea se face cu insert_many
+    neordonat, în bucăți de `bulk_chunk_size`.
+    """
+    items = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > STATUS_CHECKS_CONFIG['bulk_max_items']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items: max {STATUS_CHECKS_CONFIG['bulk_max_items']} per request",
+        )
+
+    docs: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "errors": "Expected an object"})
+            continue
+        try:
+            docs.append(StatusCheck(client_name=StatusCheckCreate(**item).client_name).model_dump())
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors(include_url=False)})
+    if errors:
+        return JSONResponse(status_code=422, content=jsonable_encoder({"detail": errors}))
+
+    inserted = 0
+    write_errors: List[Dict[str, Any]] = []
+    chunk_size = max(1, STATUS_CHECKS_CONFIG['bulk_chunk_size'])
+    for start in range(0, len(docs), chunk_size):
+        chunk = docs[start:start + chunk_size]
+        try:
+            result = await db.status_checks.insert_many(chunk, ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            write_errors.extend(
+                {"index": start + err["index"], "error": err.get("errmsg")}
+                for err in e.details.get("writeErrors", [])
+            )
+
+    failed_indexes = {err["index"] for err in write_errors}
+    return {
+        "inserted": inserted,
+        "ids": [doc["id"] for i, doc in enumerate(docs) if i not in failed_indexes],
+        "errors": write_errors,
+    }
+
+def _encode_status_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps([doc["timestamp"].isoformat(), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_status_cursor(cursor: str) -> Dict[str, Any]:
+    # filtrul keyset: tot ce vine strict după (timestamp, id) din cursor
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, last_id = json.loads(raw)
+        timestamp = datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+    return {"$or": [
+        {"timestamp": {"$gt": timestamp}},
+        {"timestamp": timestamp, "id": {"$gt": str(last_id)}},
+    ]}
+
+def _status_projection(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(STATUS_CHECK_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in STATUS_CHECK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+@api_router.get("/status", response_model=List[Dict[str, Any]])
+async def get_status_checks(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    Listează status check-urile ordonate după (timestamp, id), paginat keyset.
+    Următoarea pagină se cere cu `cursor` din header-ul X-Next-Cursor; `fields` limitează
+    câmpurile returnate (ex. fields=id,timestamp), iar format=ndjson trimite documentele
+    pe măsură ce sunt citite din cursorul MongoDB.
+    """
+    output_fields = _status_projection(fields)
+    query = _decode_status_cursor(cursor) if cursor else {}
+    # id și timestamp sunt citite mereu, pentru cursorul paginii următoare
+    projection = {"_id": 0, "id": 1, "timestamp": 1}
+    projection.update({f: 1 for f in output_fields})
+    sort = [("timestamp", ASCENDING), ("id", ASCENDING)]
+
+    if format == "ndjson":
+        # fără limită implicită: clientul citește fluxul cât are nevoie
+        mongo_cursor = db.status_checks.find(query, projection).sort(sort).batch_size(
+            STATUS_CHECKS_CONFIG['stream_batch_size']
+        )
+        if limit is not None:
+            mongo_cursor = mongo_cursor.limit(limit)
+
+        async def stream_docs():
+            try:
+                async for doc in mongo_cursor:
+                    item = {f: doc.get(f) for f in output_fields}
+                    yield fast_json.dumps(item) + b"\n"
+            finally:
+                await mongo_cursor.close()
+
+        return StreamingResponse(stream_docs(), media_type="application/x-ndjson")
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    limit = min(limit or STATUS_CHECKS_CONFIG['default_limit'], STATUS_CHECKS_CONFIG['max_limit'])
+    # un document în plus ne spune dacă mai există o pagină
+    docs = await db.status_checks.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = _encode_status_cursor(docs[-1])
+    rows = [{f: doc.get(f) for f in output_fields} for doc in docs]
+    if fast_json.FAST_JSON_CONFIG['enabled']:
+        # rândurile vin din propria bază de date: le serializăm direct, fără jsonable_encoder
+        return FastJSONResponse(rows, headers=headers)
+    response.headers.update(headers)
+    return rows
 
 # MAIB Payment Models
 class BillingAddress(BaseModel):
@@ -111,6 +302,11 @@ class MaibPaymentStatusResponse(BaseModel):
     orderId: Optional[str] = None
     raw: Optional[Dict[str, Any]] = None
 
+class MaibPaymentStatusBatchRequest(BaseModel):
+    payIds: List[str]
+    concurrency: Optional[int] = None
+
+
 class MaibCallbackRequest(BaseModel):
     """Model pentru callback-ul MAIB - toate câmpurile sunt opționale pentru flexibilitate"""
     payId: Optional[str] = None
@@ -127,6 +323,8 @@ class MaibCallbackRequest(BaseModel):
 class MaibRefundRequest(BaseModel):
     payId: str
     refundAmount: Optional[float] = None
+    # cheie de idempotență: același refundId nu este trimis la MAIB de două ori
+    refundId: Optional[str] = None
 
 
 class MaibRefundResponse(BaseModel):
@@ -139,61 +337,416 @@ class MaibRefundResponse(BaseModel):
     refundAmount: Optional[float] = None
     raw: Optional[Dict[str, Any]] = None
 
+class MaibRefundJobRequest(BaseModel):
+    items: List[MaibRefundRequest]
+    concurrency: Optional[int] = None
+
+def _client_ip(http_request: Request) -> str:
+    # clientIp trimis la MAIB: prima intrare din x-forwarded-for sau client.host
+    forwarded = http_request.headers.get("x-forwarded-for")
+    if http_request.client is None:
+        return "127.0.0.1"
+    return forwarded.split(",")[0].strip() if forwarded else http_request.client.host
+
+
+def _rate_limit_key(http_request: Request) -> str:
+    # adresa adăugată de proxy-ul de încredere (TRUSTED_PROXY_HOPS) sau client.host; nu poate fi
+    # falsificată de client, spre deosebire de prima intrare din x-forwarded-for
+    return client_address(
+        http_request.headers.get("x-forwarded-for"),
+        http_request.client.host if http_request.client else None,
+        RATE_LIMIT_CONFIG['trusted_proxy_hops'],
+    )
+
+
+# Limită per (IP client, rută) pentru endpoint-urile care ajung la MAIB
+payment_rate_limiter = TokenBucketLimiter()
+
+PAYMENT_REQUESTS = REGISTRY.counter(
+    'payment_requests_total', 'Request-uri pe endpoint-urile de plată după rezultatul limitării',
+    ('route', 'outcome'),
+)
+
+
+async def limit_payment_requests(http_request: Request) -> None:
+    if not rate_limit_enabled():
+        return
+    route = getattr(http_request.scope.get("route"), "path", http_request.url.path)
+    retry_after = payment_rate_limiter.acquire((_rate_limit_key(http_request), route))
+    if retry_after:
+        PAYMENT_REQUESTS.inc(route=route, outcome="rate_limited")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    PAYMENT_REQUESTS.inc(route=route, outcome="admitted")
+
+
 # MAIB Payment Routes
-@api_router.post("/payment/maib/session", response_model=MaibPaymentSessionResponse)
+@api_router.post("/payment/maib/session", response_model=MaibPaymentSessionResponse,
+                 dependencies=[Depends(limit_payment_requests)])
 async def create_maib_payment_session(request: MaibPaymentSessionRequest, http_request: Request):
     """
     Creează o sesiune de plată MAIB
     """
     try:
-        request_data = request.dict()
+        request_data = request.model_dump()
         # completează clientIp dacă nu a fost trimis
         if not request_data.get("clientIp"):
-            # încearcă să extragi din x-forwarded-for sau din client.host
-            forwarded = http_request.headers.get("x-forwarded-for")
-            client_ip = (forwarded.split(",")[0].strip() if forwarded else http_request.client.host) if http_request.client else "127.0.0.1"
-            request_data["clientIp"] = client_ip
-        result = await MaibPaymentService.create_payment_session(request_data)
-        return MaibPaymentSessionResponse(**result)
+            request_data["clientIp"] = _client_ip(http_request)
+
+        async def create_and_record() -> Dict[str, Any]:
+            # stocul coșului este rezervat înainte de sesiune și eliberat dacă sesiunea nu se creează
+            reservation = None
+            if stock_reservations.enabled:
+                reservation = await stock_reservations.reserve(request_data["orderId"], request_data.get("items") or [])
+            try:
+                session = await MaibPaymentService.create_payment_session(request_data)
+            except Exception:
+                if reservation is not None:
+                    await stock_reservations.release(order_id=request_data["orderId"])
+                raise
+            if reservation is not None:
+                await stock_reservations.attach_payment(request_data["orderId"], session.get("payId"))
+                stock_availability.invalidate(requested_quantities(request_data.get("items") or []))
+            await _record_in_ledger(maib_ledger.record_session(request_data, session))
+            return session
+
+        result = await maib_session_idempotency.create_once(request_data, create_and_record)
+        return model_response(MaibPaymentSessionResponse(**result))
+    except MaibCircuitOpenError as e:
+        raise _maib_unavailable(e)
+    except InsufficientStockError as e:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "Insufficient stock",
+                "productId": e.product_id,
+                "requested": e.requested,
+                "available": e.available,
+            },
+        )
+    except ReservationConflictError as e:
+        raise HTTPException(status_code=409, detail={"error": "Order cart changed", "orderId": e.order_id})
     except Exception as e:
         logger.error(f"Error creating MAIB payment session: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@api_router.post("/payment/maib/status", response_model=MaibPaymentStatusResponse)
+def _maib_unavailable(e: MaibCircuitOpenError) -> HTTPException:
+    # MAIB e căzut (circuit deschis) sau avem prea multe apeluri în curs (MaibOverloadedError):
+    # răspundem imediat cu 503 + Retry-After
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(int(e.retry_after) + 1)},
+    )
+
+
+async def _record_in_ledger(coro) -> None:
+    # registrul nu trebuie să strice fluxul de plată dacă MongoDB are probleme
+    try:
+        await coro
+    except Exception as e:
+        logger.error(f"Error writing MAIB payment ledger: {str(e)}", exc_info=True)
+
+
+async def _load_payment_status(pay_id: str, order_id: Optional[str] = None) -> Dict[str, Any]:
+    # Citire locală indexată: MAIB e interogat doar dacă nu avem deja un status final
+    try:
+        entry = await maib_ledger.get(pay_id)
+    except Exception as e:
+        logger.error(f"Error reading MAIB payment ledger: {str(e)}")
+        entry = None
+    if entry and entry.get("terminal"):
+        return PaymentLedger.to_status_response(entry)
+
+    result = await MaibPaymentService.check_payment_status(pay_id, order_id)
+    await _record_in_ledger(maib_ledger.record_status(result))
+    return result
+
+
+async def _check_payment_status_cached(pay_id: str, order_id: Optional[str] = None) -> Dict[str, Any]:
+    return await maib_status_cache.get_or_load(
+        pay_id,
+        lambda: _load_payment_status(pay_id, order_id),
+    )
+
+
+@api_router.post("/payment/maib/status", response_model=MaibPaymentStatusResponse,
+                 dependencies=[Depends(limit_payment_requests)])
 async def get_maib_payment_status(request: MaibPaymentStatusRequest):
     """
     Verifică statusul unei plăți MAIB prin payId (folosește /v1/pay-info)
     """
     try:
-        result = await MaibPaymentService.check_payment_status(request.payId, request.orderId)
-        return MaibPaymentStatusResponse(**result)
+        result = await _check_payment_status_cached(request.payId, request.orderId)
+        return model_response(MaibPaymentStatusResponse(**result))
+    except MaibCircuitOpenError as e:
+        raise _maib_unavailable(e)
     except Exception as e:
         logger.error(f"Error checking MAIB payment status: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@api_router.post("/payment/maib/refund", response_model=MaibRefundResponse)
+@api_router.post("/payment/maib/status/batch", dependencies=[Depends(limit_payment_requests)])
+async def get_maib_payment_status_batch(request: MaibPaymentStatusBatchRequest):
+    """
+    Verifică statusul mai multor plăți MAIB în paralel (concurență limitată).
+    Rezultatele sunt trimise ca NDJSON pe măsură ce sosesc; erorile sunt raportate per payId.
+    """
+    pay_ids = list(dict.fromkeys(p for p in request.payIds if p))
+    if len(pay_ids) > MAIB_STATUS_BATCH_CONFIG['max_items']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many payIds: max {MAIB_STATUS_BATCH_CONFIG['max_items']} per batch",
+        )
+
+    concurrency = request.concurrency or MAIB_STATUS_BATCH_CONFIG['concurrency']
+    concurrency = max(1, min(concurrency, MAIB_STATUS_BATCH_CONFIG['concurrency']))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check_one(pay_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await _check_payment_status_cached(pay_id)
+                return {"payId": pay_id, "ok": True, "result": MaibPaymentStatusResponse(**result).model_dump()}
+            except Exception as e:
+                logger.error(f"Error checking MAIB payment status for {pay_id}: {str(e)}")
+                return {"payId": pay_id, "ok": False, "error": str(e)}
+
+    async def stream_results():
+        tasks = [asyncio.ensure_future(check_one(pay_id)) for pay_id in pay_ids]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                yield fast_json.dumps(item) + b"\n"
+        finally:
+            # clientul s-a deconectat: nu mai continuăm apelurile către MAIB
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@api_router.get("/payment/maib/status/cache")
+async def get_maib_status_cache_stats():
+    """
+    Statistici pentru cache-ul de statusuri MAIB (hit/miss/coalesced)
+    """
+    return maib_status_cache.stats()
+
+
+@api_router.post("/payment/maib/refund", response_model=MaibRefundResponse,
+                 dependencies=[Depends(limit_payment_requests)])
 async def refund_maib_payment(request: MaibRefundRequest):
     """
-    Efectuează refund (parțial sau complet) pentru o plată MAIB
+    Efectuează refund (parțial sau complet) pentru o plată MAIB.
+    Cu refundId, o repetare a aceluiași refund întoarce rezultatul inițial fără un nou apel.
     """
     try:
-        result = await MaibPaymentService.refund_payment(request.payId, request.refundAmount)
-        return MaibRefundResponse(**result)
+        result = await maib_refund_jobs.refund(request.payId, request.refundAmount, request.refundId)
+        await _record_in_ledger(maib_ledger.record_refund(result))
+        # statusul plății s-a schimbat, nu mai servim varianta din cache
+        maib_status_cache.invalidate(request.payId)
+        return model_response(MaibRefundResponse(**result))
+    except MaibCircuitOpenError as e:
+        raise _maib_unavailable(e)
+    except RefundConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing MAIB refund: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _after_bulk_refund(result: Dict[str, Any]) -> None:
+    await _record_in_ledger(maib_ledger.record_refund(result))
+    maib_status_cache.invalidate(result.get("payId"))
+
+
+# Refund-uri în lot, procesate în background cu progres salvat în MongoDB
+maib_refund_jobs = RefundJobs(
+    db.maib_refund_jobs, db.maib_refund_job_items, db.maib_refund_claims,
+    MaibPaymentService.refund_payment, _after_bulk_refund
+)
+
+
+@api_router.post("/payment/maib/refund/jobs", status_code=202, dependencies=[Depends(limit_payment_requests)])
+async def create_maib_refund_job(request: MaibRefundJobRequest):
+    """
+    Pornește un job de refund pentru o listă de plăți (payId, refundAmount și refundId opționale).
+    Răspunde imediat cu jobId; progresul se urmărește prin GET /payment/maib/refund/jobs/{jobId}.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items to refund")
+    if len(request.items) > MAIB_REFUND_JOB_CONFIG['max_items']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items: max {MAIB_REFUND_JOB_CONFIG['max_items']} per job",
+        )
+    try:
+        return await maib_refund_jobs.create_job(
+            [item.model_dump() for item in request.items], request.concurrency
+        )
+    except Exception as e:
+        logger.error(f"Error creating MAIB refund job: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/payment/maib/refund/jobs/{job_id}")
+async def get_maib_refund_job(job_id: str, items: bool = False):
+    """
+    Statusul unui job de refund: numărători per status, throughput și (opțional) elementele.
+    """
+    job = await maib_refund_jobs.get_job(job_id, include_items=items)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refund job not found")
+    return job
+
+
+MAIB_SUCCESS_STATUSES = ('SUCCESS', 'OK', 'APPROVED')
+MAIB_FAILED_STATUSES = ('FAILED', 'FAIL', 'CANCELLED', 'CANCEL', 'DECLINED')
+
+
+def _extract_callback_fields(callback_data: Dict[str, Any]):
+    result = callback_data.get('result') if isinstance(callback_data.get('result'), dict) else callback_data
+    pay_id = result.get('payId') or result.get('pay_id')
+    order_id = result.get('orderId') or result.get('order_id')
+    status = result.get('status') or result.get('Status')
+    return pay_id, order_id, status
+
+
+def _order_payment_status(status: Optional[str]) -> Optional[str]:
+    # valorile permise de coloana orders.maib_payment_status (database/maib_payment_fields.sql)
+    status = (status or "").upper()
+    if not status or status == "UNKNOWN_SANDBOX":
+        return None
+    if status in MAIB_SUCCESS_STATUSES:
+        return "SUCCESS"
+    if status in ("CANCELLED", "CANCEL", "REVERSED", "REFUNDED"):
+        return "CANCELLED"
+    if status in MAIB_FAILED_STATUSES or status in MAIB_TERMINAL_STATUSES:
+        return "FAILED"
+    return "PENDING"
+
+
+async def _sync_order_payment_status(pay_id: Optional[str], status: Optional[str],
+                                     transaction_id: Optional[str] = None) -> None:
+    """
+    Scrie statusul plății în tabela Supabase `orders` (dacă Supabase este configurat).
+    O eroare este propagată: coada de callback-uri sau reconcilierea reîncearcă tranziția.
+    """
+    order_status = _order_payment_status(status)
+    if not pay_id or order_status is None or not SupabaseRest.enabled():
+        return
+    values = {"maib_payment_status": order_status}
+    if transaction_id:
+        values["maib_transaction_id"] = transaction_id
+    try:
+        await SupabaseRest.update("orders", {"maib_pay_id": f"eq.{pay_id}"}, values)
+    except Exception as e:
+        logger.error(f"Error updating order payment status for {pay_id}: {str(e)}")
+        raise
+
+
+async def _settle_stock_reservation(pay_id: Optional[str], status: Optional[str]) -> None:
+    """Plată reușită: rezervarea devine scădere reală de stoc; plată eșuată: rezervarea este eliberată."""
+    status = (status or "").upper()
+    if not pay_id or not stock_reservations.enabled:
+        return
+    if status in MAIB_SUCCESS_STATUSES:
+        await stock_reservations.convert(pay_id)
+    elif status in MAIB_FAILED_STATUSES or status in MAIB_TERMINAL_STATUSES:
+        await stock_reservations.release(pay_id=pay_id)
+
+
+async def process_maib_callback(callback_data: Dict[str, Any]) -> None:
+    """
+    Procesează un callback MAIB din coadă (rulează în background, cu reîncercări).
+    """
+    pay_id, order_id, status = _extract_callback_fields(callback_data)
+
+    # Verificăm semnătura MAIB înainte de a modifica ceva
+    signature_mode = MAIB_CONFIG['callback_signature_mode']
+    if signature_mode != 'off' and not MaibPaymentService.callback_verifier.verify(callback_data):
+        if signature_mode == 'enforce':
+            logger.warning(f"MAIB callback rejected, invalid signature: payId={pay_id}, orderId={order_id}")
+            return
+        logger.warning(f"MAIB callback with invalid or missing signature accepted (mode={signature_mode}): payId={pay_id}")
+
+    # Comanda și stocul sunt actualizate înaintea registrului: statusul final din registru
+    # înseamnă „aplicat”, iar o plată rămasă fără status final este preluată de reconciliere
+    # dacă reîncercările cozii se epuizează. O eroare propagă excepția ca să fie reîncercat.
+    result = callback_data.get('result') if isinstance(callback_data.get('result'), dict) else callback_data
+    await _sync_order_payment_status(pay_id, status, result.get('transactionId') or result.get('rrn'))
+    await _settle_stock_reservation(pay_id, status)
+
+    # Salvăm callback-ul în registrul plăților (upsert idempotent după payId)
+    await maib_ledger.record_callback(callback_data)
+    maib_status_cache.invalidate(pay_id)
+
+    if status and status.upper() in MAIB_FAILED_STATUSES:
+        # o nouă încercare de plată pentru comandă trebuie să creeze o sesiune nouă
+        maib_session_idempotency.forget(order_id)
+
+
+# Callback-urile MAIB sunt confirmate imediat și procesate de consumatori din background
+maib_callback_queue = CallbackQueue(db.maib_callback_inbox, process_maib_callback)
+
+
+async def _apply_reconciled_status(entry: Dict[str, Any], result: Dict[str, Any]) -> None:
+    # registrul este scris ultimul: dacă actualizarea comenzii eșuează, plata rămâne fără status
+    # final și este reverificată la o rulare următoare
+    await _sync_order_payment_status(entry["payId"], result.get("status"))
+    await _settle_stock_reservation(entry["payId"], result.get("status"))
+    await maib_ledger.record_status(result)
+    maib_status_cache.invalidate(entry["payId"])
+
+
+# Reverificarea periodică a plăților rămase fără status final
+maib_reconciler = PaymentReconciler(
+    db.maib_payments, db.maib_leases, MaibPaymentService.check_payment_status, _apply_reconciled_status
+)
+
+
+@api_router.get("/payment/maib/admission/stats")
+async def get_maib_admission_stats():
+    """
+    Statistici pentru limitarea per client (429) și controlul admisiei spre MAIB (503)
+    """
+    return {
+        "rateLimit": {
+            "enabled": rate_limit_enabled(),
+            "trustedProxyHops": RATE_LIMIT_CONFIG['trusted_proxy_hops'],
+            **payment_rate_limiter.stats(),
+        },
+        "admission": MaibPaymentService.admission.stats(),
+    }
+
+
+@api_router.get("/payment/maib/reconcile/stats")
+async def get_maib_reconcile_stats():
+    """
+    Statistici pentru worker-ul de reconciliere (rulări, plăți verificate / schimbate, erori)
+    """
+    return maib_reconciler.stats()
+
+
+@api_router.get("/payment/maib/callback/stats")
+async def get_maib_callback_queue_stats():
+    """
+    Statistici pentru coada de callback-uri MAIB (adâncime, lag, latență procesare)
+    """
+    return maib_callback_queue.stats()
+
+
 @api_router.post("/payment/maib/callback")
 async def maib_callback(request: Request):
     """
     Endpoint pentru callback-ul server-to-server de la MAIB
     MAIB trimite datele ca query parameters sau în body (JSON/form)
     """
-    import json
-    
     try:
         # Încercăm să extragem datele din query parameters (MAIB trimite de obicei așa)
         callback_data = dict(request.query_params)
@@ -201,7 +754,7 @@ async def maib_callback(request: Request):
         # Dacă nu avem date în query, încercăm din body
         if not callback_data:
             try:
-                body_data = await request.json()
+                body_data = fast_json.loads(await request.body())
                 callback_data = body_data if isinstance(body_data, dict) else {}
             except:
                 # Dacă nu e JSON, încercăm form data
@@ -211,14 +764,9 @@ async def maib_callback(request: Request):
                 except:
                     pass
         
-        # Logăm răspunsul de la MAIB
-        logger.info("MAIB Callback Received:")
-        logger.info(json.dumps(callback_data, indent=2, ensure_ascii=False))
-        
-        # Validăm că avem cel puțin payId și orderId
-        pay_id = callback_data.get('payId') or callback_data.get('pay_id')
-        order_id = callback_data.get('orderId') or callback_data.get('order_id')
-        status = callback_data.get('status') or callback_data.get('Status')
+        # Validăm că avem cel puțin payId și orderId (MAIB poate trimite datele în "result")
+        pay_id, order_id, status = _extract_callback_fields(callback_data)
+        logger.info(f"MAIB Callback Received: payId={pay_id}, orderId={order_id}, status={status}")
         
         if not pay_id or not order_id:
             return JSONResponse(
@@ -226,16 +774,19 @@ async def maib_callback(request: Request):
                 content={"error": "Missing required fields: payId or orderId"}
             )
         
-        # Determinăm dacă plata a reușit
-        is_success = status and status.upper() in ['SUCCESS', 'OK', 'APPROVED']
-        is_failed = status and status.upper() in ['FAILED', 'FAIL', 'CANCELLED', 'CANCEL', 'DECLINED']
+        # Punem callback-ul în coadă; semnătura, registrul și statusul comenzii
+        # sunt procesate în background ca MAIB să primească 200 imediat
+        await maib_callback_queue.submit(callback_data)
+        
+        is_success = bool(status) and status.upper() in MAIB_SUCCESS_STATUSES
+        is_failed = bool(status) and status.upper() in MAIB_FAILED_STATUSES
         
         # Returnăm 200 OK pentru a confirma că am primit callback-ul
         return JSONResponse(
             status_code=200,
             content={
                 "ok": True,
-                "message": "Callback received",
+                "message": "Callback queued",
                 "payId": pay_id,
                 "orderId": order_id,
                 "status": status,
@@ -252,29 +803,354 @@ async def maib_callback(request: Request):
             content={"ok": False, "error": str(e)}
         )
 
-# Include the router in the main app
-app.include_router(api_router)
+# =====================================================
+# CATALOG PRODUSE (Supabase, cu cache in-process)
+# =====================================================
+
+GENE_VARIANT_OPTION_KEYS = ("curburi", "grosimi", "lungimi", "culori")
+GENE_GROUP_FIELDS = "slug,name,image_url,from_price,total_stock,variant_count,descriere"
+# PostgREST limitează numărul de rânduri per răspuns (max-rows), deci listarea se citește pe pagini
+SUPABASE_PAGE_SIZE = 1000
+
+
+async def _load_catalog_version(table: str) -> Optional[int]:
+    rows = await SupabaseRest.select("catalog_versions", {"table_name": f"eq.{table}", "select": "version"})
+    return rows[0]["version"] if rows else None
+
+
+async def _load_gene_version() -> Optional[int]:
+    return await _load_catalog_version("gene")
+
+
+# Catalogul gene (grupuri și opțiunile variantelor), invalidat la orice modificare
+# pe tabela gene prin catalog_versions (database/gene_slug.sql)
+gene_catalog_cache = CatalogCache(_load_gene_version)
+
+
+def _require_supabase() -> None:
+    if not SupabaseRest.enabled():
+        raise HTTPException(status_code=503, detail="Supabase is not configured")
+
+
+@api_router.get("/products/gene/cache/stats")
+async def get_gene_catalog_cache_stats():
+    """
+    Statistici pentru cache-ul de catalog gene (hit/miss, versiune, invalidări)
+    """
+    return gene_catalog_cache.stats()
+
+
+@api_router.get("/products/gene/{slug}/variant-options")
+async def get_gene_variant_options(slug: str):
+    """
+    Opțiunile disponibile (curburi, grosimi, lungimi, culori) pentru un produs gene
+    """
+    _require_supabase()
+
+    async def load() -> Dict[str, List[Any]]:
+        data = await SupabaseRest.rpc("get_gene_variant_options", {"product_slug": slug}) or {}
+        # array_agg pe un set gol întoarce null
+        return {key: data.get(key) or [] for key in GENE_VARIANT_OPTION_KEYS}
+
+    try:
+        return await gene_catalog_cache.get_or_load(f"variant-options:{slug}", load)
+    except Exception as e:
+        logger.error(f"Error loading gene variant options for {slug}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Catalog unavailable")
+
+
+async def _load_gene_groups() -> Dict[str, Any]:
+    """Citește tot catalogul gene_groups și îl serializează o singură dată, cu ETag-ul lui."""
+    groups: List[Dict[str, Any]] = []
+    while True:
+        page = await SupabaseRest.select("gene_groups", {
+            "select": GENE_GROUP_FIELDS,
+            "order": "name.asc,slug.asc",
+            "limit": str(SUPABASE_PAGE_SIZE),
+            "offset": str(len(groups)),
+        })
+        groups.extend(page)
+        if len(page) < SUPABASE_PAGE_SIZE:
+            break
+    body = fast_json.dumps(groups)
+    return {"body": body, "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"'}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # comparație slabă (RFC 9110): W/"x" corespunde cu "x"
+    return "*" in candidates or etag in (value[2:] if value.startswith("W/") else value for value in candidates)
+
+
+@api_router.get("/products/gene/groups")
+async def list_gene_groups(request: Request):
+    """
+    Catalogul grupurilor gene (database/gene_groups_view.sql), servit din cache cu ETag;
+    cu If-None-Match corespunzător răspunde 304 fără corp
+    """
+    _require_supabase()
+    try:
+        listing = await gene_catalog_cache.get_or_load("groups", _load_gene_groups)
+    except Exception as e:
+        logger.error(f"Error loading gene groups: {str(e)}")
+        raise HTTPException(status_code=502, detail="Catalog unavailable")
+
+    # no-cache: browser-ul poate păstra răspunsul, dar îl revalidează (ieftin, prin 304)
+    headers = {"ETag": listing["etag"], "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), listing["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(listing["body"], media_type="application/json", headers=headers)
+
+
+# =====================================================
+# STOC (registrul unificat product_locations din Supabase)
+# =====================================================
+
+class StockItem(BaseModel):
+    productId: int
+    quantity: int = Field(default=1, ge=1)
+
+
+class StockAvailabilityRequest(BaseModel):
+    items: List[StockItem]
+
+
+async def _load_stock(product_ids: List[int]) -> List[Dict[str, Any]]:
+    return await SupabaseRest.rpc("get_stock_availability", {"product_ids": product_ids}) or []
+
+
+# Stocul produselor căutate des (coș, pagini de produs), păstrat câteva secunde
+stock_availability = StockAvailability(_load_stock)
+
+
+@api_router.post("/stock/availability")
+async def check_stock_availability(request: StockAvailabilityRequest):
+    """
+    Verifică disponibilitatea întregului coș într-un singur apel
+    """
+    if len(request.items) > STOCK_CACHE_CONFIG['max_items']:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items: max {STOCK_CACHE_CONFIG['max_items']} per request",
+        )
+    _require_supabase()
+    try:
+        return await stock_availability.check([item.model_dump() for item in request.items])
+    except Exception as e:
+        logger.error(f"Error checking stock availability: {str(e)}")
+        raise HTTPException(status_code=502, detail="Stock unavailable")
+
+
+@api_router.get("/stock/low")
+async def get_low_stock_report(minimum: int = Query(default=5, ge=0)):
+    """
+    Produsele cu stoc redus (store_stock sau total_stock <= minimum), din raportul indexat
+    """
+    _require_supabase()
+    try:
+        return await SupabaseRest.rpc("get_low_stock_products", {"minimum_stock": minimum}) or []
+    except Exception as e:
+        logger.error(f"Error loading low stock report: {str(e)}")
+        raise HTTPException(status_code=502, detail="Stock unavailable")
+
+
+async def _load_stock_levels(product_ids: List[int]) -> Dict[int, int]:
+    rows = await _load_stock(product_ids)
+    return {row["product_id"]: row.get("store_stock") for row in rows if row.get("store_stock") is not None}
+
+
+async def _commit_reserved_stock(pay_id: str, items: List[Dict[str, int]]) -> None:
+    # idempotent după payId: trigger-ul comenzii nu mai scade încă o dată același stoc
+    await SupabaseRest.rpc("commit_stock_reservation", {"p_pay_id": pay_id, "order_items": items})
+    stock_availability.invalidate(line["productId"] for line in items)
+
+
+# Rezervările de stoc pentru checkout-ul MAIB (STOCK_RESERVATIONS_ENABLED, necesită Supabase)
+stock_reservations = StockReservations(
+    db.stock_holds, db.stock_reservations, _load_stock_levels, _commit_reserved_stock
+)
+stock_reservations.enabled = stock_reservations.enabled and SupabaseRest.enabled()
+
+
+@api_router.get("/stock/reservations/stats")
+async def get_stock_reservation_stats():
+    """
+    Statistici pentru rezervările de stoc (rezervate, refuzate, expirate, convertite)
+    """
+    return stock_reservations.stats()
+
+
+@api_router.get("/stock/cache/stats")
+async def get_stock_cache_stats():
+    """
+    Statistici pentru cache-ul de stoc (hit/miss, încărcări în lot)
+    """
+    return stock_availability.stats()
+
+
+# Metrici HTTP per rută (șablonul rutei, nu path-ul concret, ca să nu explodeze cardinalitatea)
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total', 'Request-uri HTTP după metodă, rută și status', ('method', 'route', 'status')
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Latența request-urilor HTTP (până la trimiterea header-elor)', ('method', 'route')
+)
+
+REGISTRY.counter_func('maib_token_refreshes_total', 'Token-uri MAIB generate de acest worker',
+                      lambda: MaibPaymentService.token_manager.refresh_count)
+REGISTRY.gauge('maib_circuit_open', 'Circuit breaker MAIB deschis (1) sau nu (0)',
+               lambda: 0 if MaibPaymentService.circuit_breaker.state == 'closed' else 1)
+REGISTRY.counter_func('maib_circuit_rejected_total', 'Apeluri MAIB refuzate de circuit breaker',
+                      lambda: MaibPaymentService.circuit_breaker.rejected)
+REGISTRY.counter_func('maib_status_cache_lookups_total', 'Căutări în cache-ul de statusuri MAIB după rezultat',
+                      lambda: {(k,): maib_status_cache.stats()[k] for k in ('hits', 'misses', 'coalesced')}, ('result',))
+REGISTRY.gauge('maib_status_cache_hit_ratio', 'Hit ratio pentru cache-ul de statusuri MAIB',
+               lambda: maib_status_cache.stats()['hitRatio'])
+REGISTRY.gauge('maib_in_flight', 'Apeluri către MAIB în desfășurare',
+               lambda: MaibPaymentService.admission.in_flight)
+REGISTRY.gauge('maib_admission_queue_depth', 'Apeluri către MAIB care așteaptă un loc liber',
+               lambda: MaibPaymentService.admission.queued)
+REGISTRY.counter_func('maib_admission_calls_total', 'Apeluri către MAIB admise / refuzate de controlul admisiei',
+                      lambda: {(k,): MaibPaymentService.admission.stats()[k] for k in ('admitted', 'shed')}, ('outcome',))
+REGISTRY.counter_func('catalog_cache_lookups_total', 'Căutări în cache-ul de catalog gene după rezultat',
+                      lambda: {(k,): gene_catalog_cache.stats()[k] for k in ('hits', 'misses', 'coalesced')}, ('result',))
+REGISTRY.gauge('maib_callback_queue_depth', 'Callback-uri MAIB în așteptare în coada din memorie',
+               lambda: maib_callback_queue.stats()['depth'])
+REGISTRY.gauge('maib_callback_lag_avg_seconds', 'Timpul mediu petrecut de un callback în coadă',
+               lambda: maib_callback_queue.lag.total / maib_callback_queue.lag.count if maib_callback_queue.lag.count else 0)
+REGISTRY.gauge('maib_callback_processing_avg_seconds', 'Durata medie de procesare a unui callback',
+               lambda: maib_callback_queue.processing.total / maib_callback_queue.processing.count
+               if maib_callback_queue.processing.count else 0)
+
+
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, route=route_path, status=str(status_code))
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route_path)
+
+
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
 
 # Validation error handler to log 422 bodies
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     body = await request.body()
-    logger.error("Validation error on %s %s", request.method, request.url.path)
-    logger.error("Request body: %s", body.decode("utf-8") if body else "<empty>")
-    logger.error("Errors: %s", exc.errors())
+    try:
+        body_data = json.loads(body) if body else "<empty>"
+    except ValueError:
+        body_data = body.decode("utf-8", errors="replace")
+    # o singură linie, cu email-urile / telefoanele clientului redactate
+    log_payload(
+        logger, f"Validation error on {request.method} {request.url.path}",
+        {"body": body_data, "errors": exc.errors()}, level=logging.ERROR, sampled=False,
+    )
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors()},
     )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def startup() -> None:
+    # LOG_FORMAT=json pentru log-uri structurate
+    configure_logging()
+    MaibPaymentService.log_configuration()
+    await MaibPaymentService.start_http_client()
+    if RATE_LIMIT_CONFIG['enabled'] and not rate_limit_enabled():
+        logger.warning("Payment rate limiting is off: set TRUSTED_PROXY_HOPS (proxies in front of the backend, 0 = none)")
+
+    try:
+        await db.status_checks.create_index(
+            [("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"
+        )
+    except Exception as e:
+        logger.error(f"Error creating status_checks indexes: {str(e)}")
+
+    try:
+        await maib_ledger.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating MAIB ledger indexes: {str(e)}")
+
+    try:
+        await maib_callback_queue.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating MAIB callback inbox indexes: {str(e)}")
+    maib_callback_queue.start()
+
+    try:
+        await maib_refund_jobs.ensure_indexes()
+        resumed = await maib_refund_jobs.resume()
+        if resumed:
+            logger.info(f"Resumed {resumed} MAIB refund jobs")
+    except Exception as e:
+        logger.error(f"Error resuming MAIB refund jobs: {str(e)}")
+
+    maib_reconciler.start()
+
+    if stock_reservations.enabled:
+        try:
+            await stock_reservations.ensure_indexes()
+        except Exception as e:
+            logger.error(f"Error creating stock reservation indexes: {str(e)}")
+        stock_reservations.start()
+
+    # token-ul MAIB este partajat între workerii uvicorn prin MongoDB
+    if MAIB_TOKEN_CONFIG['shared_store']:
+        MaibPaymentService.configure_token_store(db.maib_tokens)
+    MaibPaymentService.token_manager.start()
+
+
+async def shutdown() -> None:
+    await maib_callback_queue.stop()
+    await maib_refund_jobs.stop()
+    await maib_reconciler.stop()
+    await stock_reservations.stop()
+    await MaibPaymentService.token_manager.stop()
+    if status_check_batcher is not None:
+        await status_check_batcher.stop()
+    db.close()
+    await MaibPaymentService.close_http_client()
+    await SupabaseRest.close_http_client()
+
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+
+def create_app() -> FastAPI:
+    """
+    Construiește aplicația FastAPI. Nu deschide conexiuni: clienții (MongoDB, MAIB, Supabase)
+    și worker-ii din background pornesc în lifespan sau la prima utilizare.
+    """
+    # FAST_JSON=true: răspunsurile sunt randate cu orjson (vezi fast_json.py)
+    application = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+    application.include_router(api_router)
+    application.middleware("http")(record_request_metrics)
+    application.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    application.add_exception_handler(RequestValidationError, validation_exception_handler)
+    application.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=list(settings.cors_origins),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return application
+
+
+# uvicorn server:app (sau uvicorn --factory server:create_app)
+app = create_app()
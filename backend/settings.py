@@ -0,0 +1,57 @@
+"""
+Settings
+Configurația aplicației: fișierul .env este citit o singură dată (load_env), iar setările
+de bază ale backend-ului sunt expuse printr-un obiect tipat, imutabil (get_settings).
+Configurațiile specifice (MAIB_CONFIG, SUPABASE_CONFIG etc.) rămân în modulele lor.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+_env_loaded = False
+
+
+def load_env() -> None:
+    """Încarcă backend/.env în os.environ (o singură dată per proces)."""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv(ROOT_DIR / '.env')
+        _env_loaded = True
+
+
+def _split(value: str) -> Tuple[str, ...]:
+    return tuple(part.strip() for part in value.split(',') if part.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    # MongoDB (clientul este creat la prima utilizare, vezi mongo.py)
+    mongo_url: Optional[str]
+    db_name: Optional[str]
+    # CORS_ORIGINS=https://a.md,https://b.md (implicit toate originile)
+    cors_origins: Tuple[str, ...]
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_env()
+        return cls(
+            mongo_url=os.getenv('MONGO_URL') or None,
+            db_name=os.getenv('DB_NAME') or None,
+            cors_origins=_split(os.getenv('CORS_ORIGINS', '*')) or ('*',),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings.from_env()
+
+
+# .env este încărcat la importul modulului, deci înaintea configurațiilor *_CONFIG din modulele
+# importate după settings (server.py îl importă primul)
+load_env()
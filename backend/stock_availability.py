@@ -0,0 +1,102 @@
+"""
+Stock Availability
+Verificarea disponibilității unui coș întreg într-un singur apel către Supabase
+(RPC get_stock_availability peste registrul unificat product_locations), cu un cache scurt
+per produs pentru produsele căutate des: doar produsele lipsă din cache ajung în RPC.
+"""
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from ttl_cache import TTLCache
+
+# Configurație cache stoc
+STOCK_CACHE_CONFIG = {
+    # stocul se schimbă cu fiecare comandă, deci TTL-ul rămâne de ordinul secundelor
+    'ttl': float(os.getenv('STOCK_CACHE_TTL', '2')),
+    'max_entries': int(os.getenv('STOCK_CACHE_MAX_ENTRIES', '5000')),
+    'max_items': int(os.getenv('STOCK_AVAILABILITY_MAX_ITEMS', '200')),
+}
+
+StockLoader = Callable[[List[int]], Awaitable[List[Dict[str, Any]]]]
+
+
+class StockAvailability(TTLCache):
+    """Stocul curent per produs, citit în lot și păstrat scurt timp în memorie"""
+
+    def __init__(
+        self,
+        loader: StockLoader,
+        ttl: float = STOCK_CACHE_CONFIG['ttl'],
+        max_entries: int = STOCK_CACHE_CONFIG['max_entries'],
+    ):
+        # None = produs inexistent (cache-uit și el, ca să nu fie recăutat la fiecare request)
+        super().__init__(max_entries, ttl)
+        self.loader = loader
+        self.loads = 0
+
+    def invalidate(self, product_ids: Optional[Iterable[int]] = None) -> None:
+        if product_ids is None:
+            super().invalidate()
+            return
+        for product_id in product_ids:
+            super().invalidate(product_id)
+
+    async def get_stock(self, product_ids: Iterable[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+        """Stocul pentru fiecare produs (None dacă produsul nu există)."""
+        result: Dict[int, Optional[Dict[str, Any]]] = {}
+        missing: List[int] = []
+        for product_id in dict.fromkeys(product_ids):
+            found, value = self.lookup(product_id)
+            if found:
+                self.hits += 1
+                result[product_id] = value
+            else:
+                self.misses += 1
+                missing.append(product_id)
+
+        if missing:
+            self.loads += 1
+            # o comandă care invalidează produsul în timpul citirii împiedică păstrarea valorii citite
+            load = object()
+            for product_id in missing:
+                self.begin_load(product_id, load)
+            try:
+                rows = {row["product_id"]: row for row in await self.loader(missing)}
+            except BaseException:
+                for product_id in missing:
+                    self.finish_load(product_id, load)
+                raise
+            for product_id in missing:
+                value = rows.get(product_id)
+                self.finish_load(product_id, load, value)
+                result[product_id] = value
+        return result
+
+    async def check(self, items: List[Dict[str, int]]) -> Dict[str, Any]:
+        """
+        Verifică un coș: items = [{"productId": ..., "quantity": ...}]. Cantitățile aceluiași
+        produs se însumează, ca la scăderea stocului din trigger-ul comenzilor.
+        """
+        requested: Dict[int, int] = {}
+        for item in items:
+            requested[item["productId"]] = requested.get(item["productId"], 0) + item["quantity"]
+
+        stock = await self.get_stock(requested)
+        lines = []
+        for product_id, quantity in requested.items():
+            row = stock.get(product_id)
+            store_stock = row.get("store_stock") if row else None
+            lines.append({
+                "productId": product_id,
+                "quantity": quantity,
+                "found": row is not None,
+                "table": row.get("table_name") if row else None,
+                "name": row.get("product_name") if row else None,
+                "storeStock": store_stock,
+                "totalStock": row.get("total_stock") if row else None,
+                "available": store_stock is not None and store_stock >= quantity,
+            })
+        return {"available": all(line["available"] for line in lines), "items": lines}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "ttl": self.ttl, "loads": self.loads}
@@ -0,0 +1,365 @@
+"""
+Stock Reservations
+Rezervări de stoc cu expirare pentru checkout-ul MAIB: la crearea sesiunii de plată cantitățile
+din coș sunt rezervate atomic (find_one_and_update condiționat pe stocul disponibil, fără
+citire-apoi-scriere), la callback-ul de succes rezervarea este convertită în scăderea reală din
+Supabase, iar rezervările plăților abandonate expiră și sunt eliberate de un worker din background.
+
+Contoarele per produs (stock_holds) păstrează stocul citit din Supabase, cantitatea rezervată
+și disponibilul (stock - reserved); stocul este resincronizat după `stock_sync_seconds`.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Configurație rezervări stoc (necesită funcțiile SQL din database/stock_management_functions.sql)
+STOCK_RESERVATION_CONFIG = {
+    'enabled': os.getenv('STOCK_RESERVATIONS_ENABLED', 'false').lower() == 'true',
+    # cât timp ține o rezervare (sesiunea MAIB expiră în aproximativ același interval)
+    'ttl_minutes': float(os.getenv('STOCK_RESERVATION_TTL_MINUTES', '20')),
+    'sweep_interval': float(os.getenv('STOCK_RESERVATION_SWEEP_INTERVAL', '30')),
+    'sweep_batch_size': int(os.getenv('STOCK_RESERVATION_SWEEP_BATCH_SIZE', '200')),
+    # după cât timp recitim stocul unui produs din Supabase
+    'stock_sync_seconds': float(os.getenv('STOCK_RESERVATION_SYNC_SECONDS', '60')),
+}
+
+ACTIVE = "active"
+CONVERTING = "converting"
+CONVERTED = "converted"
+
+# productIds -> {productId: store_stock}; produsele lipsă nu sunt urmărite
+StockLoader = Callable[[List[int]], Awaitable[Dict[int, int]]]
+# (payId, items) -> scăderea reală a stocului, idempotentă după payId
+StockCommitter = Callable[[str, List[Dict[str, int]]], Awaitable[None]]
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, product_id: int, requested: int, available: int):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Insufficient stock for product {product_id}: requested {requested}, available {available}"
+        )
+
+
+class ReservationConflictError(Exception):
+    """Comanda are deja o rezervare (în curs de creare sau plătită) pentru alt coș"""
+
+    def __init__(self, order_id: str):
+        self.order_id = order_id
+        super().__init__(f"Order {order_id} already has a stock reservation for a different cart")
+
+
+def _reserved_quantities(reservation: Dict[str, Any]) -> Dict[int, int]:
+    return {line["productId"]: line["quantity"] for line in reservation.get("items", [])}
+
+
+def _product_id(value: Any) -> Optional[int]:
+    # id-urile din coș pot fi numere sau string-uri numerice; restul (ex. cursuri) nu au stoc
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+def requested_quantities(items: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+    """Cantitățile per produs din items-urile sesiunii MAIB ({"id", "quantity", ...})."""
+    requested: Dict[int, int] = {}
+    for item in items or []:
+        product_id = _product_id(item.get("id", item.get("productId")))
+        quantity = int(item.get("quantity") or 0)
+        if product_id is not None and quantity > 0:
+            requested[product_id] = requested.get(product_id, 0) + quantity
+    return requested
+
+
+class StockReservations:
+    """Rezervări de stoc per comandă (orderId), cu contoare atomice per produs"""
+
+    def __init__(
+        self,
+        holds_collection,
+        reservations_collection,
+        stock_loader: StockLoader,
+        committer: StockCommitter,
+        config: Dict[str, Any] = STOCK_RESERVATION_CONFIG,
+    ):
+        self.holds = holds_collection
+        self.reservations = reservations_collection
+        self.stock_loader = stock_loader
+        self.committer = committer
+        self.config = config
+        self.enabled = config['enabled']
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.reserved = 0
+        self.rejected = 0
+        self.released = 0
+        self.expired = 0
+        self.converted = 0
+        self.late_conversions = 0
+
+    @property
+    def _sync_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def ensure_indexes(self) -> None:
+        await self.reservations.create_index([("status", ASCENDING), ("expiresAt", ASCENDING)], name="status_expiresAt")
+        await self.reservations.create_index([("payId", ASCENDING)], name="payId")
+
+    async def _sync_holds(self, product_ids: List[int]) -> None:
+        """Creează / resincronizează contoarele pentru produsele fără stoc recent."""
+        # un singur sync simultan: la o rafală de checkout-uri pe același produs,
+        # doar primul request citește stocul din Supabase
+        async with self._sync_lock:
+            fresh_after = datetime.utcnow() - timedelta(seconds=self.config['stock_sync_seconds'])
+            holds = {
+                doc["_id"]: doc
+                async for doc in self.holds.find({"_id": {"$in": product_ids}}, {"syncedAt": 1, "commits": 1})
+            }
+            stale = [
+                product_id for product_id in product_ids
+                if product_id not in holds or holds[product_id]["syncedAt"] < fresh_after
+            ]
+            if not stale:
+                return
+
+            stock = await self.stock_loader(stale)
+            now = datetime.utcnow()
+            for product_id, store_stock in stock.items():
+                store_stock = max(0, int(store_stock or 0))
+                if product_id not in holds:
+                    try:
+                        await self.holds.insert_one({
+                            "_id": product_id, "stock": store_stock, "reserved": 0,
+                            "available": store_stock, "commits": 0, "syncedAt": now,
+                        })
+                        continue
+                    except DuplicateKeyError:
+                        holds[product_id] = await self.holds.find_one({"_id": product_id}) or {}
+                commits = holds[product_id].get("commits", 0)
+                # disponibilul se recalculează față de rezervările curente; dacă între citire și
+                # scriere s-a rezervat ceva reîncercăm, iar dacă între timp s-a convertit o rezervare
+                # stocul citit poate fi dinainte de scădere, deci renunțăm până la următorul sync
+                for _ in range(5):
+                    hold = await self.holds.find_one({"_id": product_id})
+                    if hold is None or hold.get("commits", 0) != commits:
+                        break
+                    result = await self.holds.update_one(
+                        {"_id": product_id, "reserved": hold["reserved"], "commits": commits},
+                        {"$set": {"stock": store_stock, "available": store_stock - hold["reserved"], "syncedAt": now}},
+                    )
+                    if result.matched_count:
+                        break
+
+    async def reserve(self, order_id: str, items: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Rezervă toate produsele comenzii sau niciunul (InsufficientStockError).
+        Pentru același orderId, o rezervare cu aceleași cantități este refolosită; o rezervare
+        activă pentru alt coș este înlocuită, iar una plătită sau creată simultan de alt request
+        pentru alt coș ridică ReservationConflictError.
+        """
+        requested = requested_quantities(items)
+        if not requested:
+            return None
+
+        existing = await self.reservations.find_one({"_id": order_id})
+        if existing is not None:
+            if existing["status"] in (CONVERTING, CONVERTED):
+                if _reserved_quantities(existing) != requested:
+                    raise ReservationConflictError(order_id)
+                return existing
+            if existing["status"] == ACTIVE:
+                if _reserved_quantities(existing) == requested:
+                    return existing
+                # coșul s-a schimbat între două încercări de plată
+                await self.release(order_id=order_id, status="replaced")
+            await self.reservations.delete_one({"_id": order_id, "status": {"$nin": [ACTIVE, CONVERTING, CONVERTED]}})
+
+        await self._sync_holds(sorted(requested))
+        tracked = {
+            doc["_id"] async for doc in self.holds.find({"_id": {"$in": list(requested)}}, {"_id": 1})
+        }
+
+        now = datetime.utcnow()
+        reservation = {
+            "_id": order_id,
+            "status": ACTIVE,
+            "items": [{"productId": pid, "quantity": qty} for pid, qty in sorted(requested.items())],
+            "held": [],
+            "payId": None,
+            "createdAt": now,
+            "expiresAt": now + timedelta(minutes=self.config['ttl_minutes']),
+        }
+        try:
+            await self.reservations.insert_one(reservation)
+        except DuplicateKeyError:
+            # aceeași comandă rezervată simultan de alt request: refolosim rezervarea doar pentru
+            # același coș (cealaltă nu poate fi înlocuită cât timp încă își rezervă produsele)
+            concurrent = await self.reservations.find_one({"_id": order_id})
+            if concurrent is None or _reserved_quantities(concurrent) != requested:
+                raise ReservationConflictError(order_id)
+            return concurrent
+
+        # ordinea fixă a produselor evită ca două coșuri să se blocheze reciproc pe jumătate
+        for product_id in sorted(tracked):
+            quantity = requested[product_id]
+            hold = await self.holds.find_one_and_update(
+                {"_id": product_id, "available": {"$gte": quantity}},
+                {"$inc": {"available": -quantity, "reserved": quantity}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if hold is None:
+                await self.release(order_id=order_id, status="rejected")
+                self.rejected += 1
+                current = await self.holds.find_one({"_id": product_id}) or {}
+                raise InsufficientStockError(product_id, quantity, max(0, current.get("available", 0)))
+            await self.reservations.update_one(
+                {"_id": order_id}, {"$push": {"held": {"productId": product_id, "quantity": quantity}}}
+            )
+            reservation["held"].append({"productId": product_id, "quantity": quantity})
+
+        self.reserved += 1
+        return reservation
+
+    async def attach_payment(self, order_id: str, pay_id: Optional[str]) -> None:
+        if pay_id:
+            await self.reservations.update_one({"_id": order_id}, {"$set": {"payId": pay_id}})
+
+    async def release(self, order_id: Optional[str] = None, pay_id: Optional[str] = None,
+                      status: str = "released") -> bool:
+        """Eliberează o rezervare activă (plată eșuată, anulată, expirată); idempotent."""
+        query: Dict[str, Any] = {"status": ACTIVE}
+        if order_id is not None:
+            query["_id"] = order_id
+        elif pay_id is not None:
+            query["payId"] = pay_id
+        else:
+            return False
+
+        reservation = await self.reservations.find_one_and_update(
+            query,
+            {"$set": {"status": status, "releasedAt": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if reservation is None:
+            return False
+        for line in reservation.get("held", []):
+            await self.holds.update_one(
+                {"_id": line["productId"]},
+                {"$inc": {"available": line["quantity"], "reserved": -line["quantity"]}},
+            )
+        if status == "expired":
+            self.expired += 1
+        elif status == "released":
+            self.released += 1
+        return True
+
+    async def convert(self, pay_id: str) -> bool:
+        """
+        Plata a reușit: scade stocul real (committer, idempotent după payId) și consumă rezervarea.
+        O rezervare deja expirată este convertită oricum: plata nu mai poate fi refuzată.
+        """
+        reservation = await self.reservations.find_one_and_update(
+            {"payId": pay_id, "status": {"$in": [ACTIVE, CONVERTING]}},
+            {"$set": {"status": CONVERTING}},
+            return_document=ReturnDocument.AFTER,
+        )
+        late = False
+        if reservation is None:
+            reservation = await self.reservations.find_one_and_update(
+                {"payId": pay_id, "status": {"$in": ["expired", "released", "converting_late"]}},
+                {"$set": {"status": "converting_late"}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if reservation is None:
+                return False
+            late = True
+            logger.warning(f"Stock reservation for payId {pay_id} converted after release; stock may be oversold")
+
+        # o eroare aici lasă rezervarea în `converting`, iar callback-ul reîncercat o reia
+        await self.committer(pay_id, reservation["items"])
+
+        done = await self.reservations.find_one_and_update(
+            {"_id": reservation["_id"], "status": "converting_late" if late else CONVERTING},
+            {"$set": {"status": CONVERTED, "convertedAt": datetime.utcnow()}},
+        )
+        if done is None:
+            return True
+        if late:
+            # rezervarea fusese deja eliberată: scădem doar stocul
+            for line in reservation["items"]:
+                await self.holds.update_one(
+                    {"_id": line["productId"]},
+                    {"$inc": {"stock": -line["quantity"], "available": -line["quantity"], "commits": 1}},
+                )
+            self.late_conversions += 1
+        else:
+            # stocul real a scăzut cu cât era rezervat: disponibilul rămâne neschimbat
+            for line in reservation.get("held", []):
+                await self.holds.update_one(
+                    {"_id": line["productId"]},
+                    {"$inc": {"stock": -line["quantity"], "reserved": -line["quantity"], "commits": 1}},
+                )
+        self.converted += 1
+        return True
+
+    async def sweep(self) -> int:
+        """Eliberează rezervările active expirate; returnează câte au fost eliberate."""
+        expired = 0
+        cursor = self.reservations.find(
+            {"status": ACTIVE, "expiresAt": {"$lte": datetime.utcnow()}}, {"_id": 1}
+        ).limit(self.config['sweep_batch_size'])
+        async for reservation in cursor:
+            if await self.release(order_id=reservation["_id"], status="expired"):
+                expired += 1
+        if expired:
+            logger.info(f"Released {expired} expired stock reservations")
+        return expired
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stock reservation sweeper error: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.config['sweep_interval'])
+
+    def start(self) -> None:
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "reserved": self.reserved,
+            "rejected": self.rejected,
+            "released": self.released,
+            "expired": self.expired,
+            "converted": self.converted,
+            "lateConversions": self.late_conversions,
+        }
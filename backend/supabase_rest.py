@@ -0,0 +1,102 @@
+"""
+Supabase REST
+Client minimal pentru PostgREST-ul Supabase (tabelele și funcțiile RPC din database/*.sql),
+folosit de backend pentru scrieri server-side (ex. statusul plății în `orders`).
+Este activ doar dacă SUPABASE_URL și SUPABASE_SERVICE_ROLE_KEY sunt setate.
+"""
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import fast_json
+from settings import load_env
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Configurație Supabase (cheia service role ocolește RLS; nu ajunge niciodată în frontend)
+SUPABASE_CONFIG = {
+    'url': os.getenv('SUPABASE_URL', '').rstrip('/'),
+    'service_key': os.getenv('SUPABASE_SERVICE_ROLE_KEY', ''),
+    'timeout': float(os.getenv('SUPABASE_TIMEOUT', '10')),
+    'max_connections': int(os.getenv('SUPABASE_MAX_CONNECTIONS', '20')),
+}
+
+
+class SupabaseError(Exception):
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        super().__init__(f"Supabase error ({status_code}): {message}")
+
+
+class SupabaseRest:
+    """Apeluri PostgREST peste un httpx.AsyncClient partajat (keep-alive)"""
+
+    http_client: Optional[httpx.AsyncClient] = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(SUPABASE_CONFIG['url'] and SUPABASE_CONFIG['service_key'])
+
+    @staticmethod
+    def get_http_client() -> httpx.AsyncClient:
+        if SupabaseRest.http_client is None or SupabaseRest.http_client.is_closed:
+            key = SUPABASE_CONFIG['service_key']
+            SupabaseRest.http_client = httpx.AsyncClient(
+                base_url=f"{SUPABASE_CONFIG['url']}/rest/v1",
+                headers={"apikey": key, "Authorization": f"Bearer {key}"},
+                timeout=SUPABASE_CONFIG['timeout'],
+                limits=httpx.Limits(max_connections=SUPABASE_CONFIG['max_connections']),
+            )
+        return SupabaseRest.http_client
+
+    @staticmethod
+    async def close_http_client() -> None:
+        if SupabaseRest.http_client is not None:
+            await SupabaseRest.http_client.aclose()
+            SupabaseRest.http_client = None
+
+    @staticmethod
+    def _check(resp: httpx.Response) -> None:
+        if not resp.is_success:
+            try:
+                message = fast_json.loads(resp.content).get("message") or resp.text
+            except Exception:
+                message = resp.text
+            raise SupabaseError(resp.status_code, message)
+
+    @staticmethod
+    async def select(table: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """GET /rest/v1/{table} cu filtre PostgREST (ex. {"id": "eq.123", "select": "id,stock"})."""
+        resp = await SupabaseRest.get_http_client().get(f"/{table}", params=params)
+        SupabaseRest._check(resp)
+        return fast_json.loads(resp.content)
+
+    @staticmethod
+    async def update(table: str, filters: Dict[str, str], values: Dict[str, Any]) -> int:
+        """PATCH pe rândurile care corespund filtrelor; returnează numărul de rânduri actualizate."""
+        resp = await SupabaseRest.get_http_client().patch(
+            f"/{table}",
+            params=filters,
+            content=fast_json.dumps(values),
+            headers={"Content-Type": "application/json", "Prefer": "return=minimal,count=exact"},
+        )
+        SupabaseRest._check(resp)
+        # Content-Range: */N
+        content_range = resp.headers.get("content-range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    @staticmethod
+    async def rpc(function: str, params: Dict[str, Any]) -> Any:
+        """POST /rest/v1/rpc/{function}"""
+        resp = await SupabaseRest.get_http_client().post(
+            f"/rpc/{function}",
+            content=fast_json.dumps(params),
+            headers={"Content-Type": "application/json"},
+        )
+        SupabaseRest._check(resp)
+        return fast_json.loads(resp.content) if resp.content else None
@@ -0,0 +1,125 @@
+"""
+TTL Cache
+Cache LRU in-process cu TTL per intrare și încărcare single-flight: request-urile simultane
+pentru aceeași cheie așteaptă aceeași încărcare. Baza comună pentru cache-ul de statusuri MAIB,
+cache-ul de catalog și cache-ul de stoc.
+
+invalidate() scoate și încărcarea în curs pentru cheie: o încărcare pornită înainte de
+schimbare nu mai este cea curentă și rezultatul ei nu ajunge în cache.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+ValueLoader = Callable[[], Awaitable[Any]]
+
+_NO_VALUE = object()
+
+
+class TTLCache:
+    """Cache LRU cu TTL per intrare și coalescing al încărcărilor simultane"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # încărcarea curentă per cheie: Future-ul din get_or_load sau token-ul unei încărcări în lot
+        self._inflight: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def ttl_for(self, value: Any) -> float:
+        return self.ttl
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """(găsit, valoare); valoarea poate fi None dacă None a fost cache-uit explicit."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self.lookup(key)[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_for(value), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Scoate cheia (sau tot cache-ul) împreună cu încărcările în curs."""
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def begin_load(self, key: Hashable, token: Any) -> None:
+        self._inflight[key] = token
+
+    def finish_load(self, key: Hashable, token: Any, value: Any = _NO_VALUE) -> bool:
+        """
+        Încheie încărcarea `token`; valoarea este păstrată doar dacă încărcarea este încă cea
+        curentă (cheia nu a fost invalidată între timp). Fără valoare (eroare) doar o încheie.
+        """
+        if self._inflight.get(key) is not token:
+            return False
+        del self._inflight[key]
+        if value is not _NO_VALUE:
+            self.set(key, value)
+        return True
+
+    async def get_or_load(self, key: Hashable, loader: ValueLoader) -> Any:
+        """
+        Returnează valoarea din cache sau o încarcă prin `loader`;
+        apelurile concurente pentru aceeași cheie așteaptă aceeași încărcare.
+        """
+        found, cached = self.lookup(key)
+        if found:
+            self.hits += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if isinstance(inflight, asyncio.Future):
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.ensure_future(self._load(key, loader))
+        self.begin_load(key, future)
+        return await asyncio.shield(future)
+
+    async def _load(self, key: Hashable, loader: ValueLoader) -> Any:
+        load = asyncio.current_task()
+        try:
+            value = await loader()
+        except BaseException:
+            # erorile nu se cache-uiesc
+            self.finish_load(key, load)
+            raise
+        self.finish_load(key, load, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hitRatio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
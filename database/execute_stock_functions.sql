@@ -12,6 +12,9 @@ SELECT EXISTS (
     AND table_name = 'orders'
 ) as orders_table_exists;
 
+-- Verifică dacă registrul product_locations există (creat de product_locations.sql)
+SELECT to_regclass('public.product_locations') IS NOT NULL as product_locations_exists;
+
 -- Verifică dacă există tabelele de produse
 SELECT table_name 
 FROM information_schema.tables 
@@ -78,46 +81,68 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Funcție pentru actualizarea stocului bazată pe items dintr-o comandă
+-- Produsele sunt localizate prin registrul product_locations (vezi product_locations.sql),
+-- iar stocul se scade cu un singur UPDATE ... RETURNING per tabelă, pentru toate produsele comenzii.
 CREATE OR REPLACE FUNCTION update_stock_from_order_items(order_items JSONB)
 RETURNS TEXT AS $$
 DECLARE
-    item JSONB;
-    product_id INTEGER;
-    quantity INTEGER;
-    table_name TEXT;
+    target RECORD;
+    updated_count INTEGER;
     success_count INTEGER := 0;
     total_items INTEGER := 0;
     result_message TEXT := '';
-    product_tables TEXT[] := ARRAY[
-        'gene', 'adezive', 'preparate', 'ingrijire-personala',
-        'accesorii', 'consumabile', 'ustensile', 'tehnologie_led',
-        'hena_sprancene', 'vopsele_profesionale', 'pensule_instrumente_speciale',
-        'solutii_laminare', 'adezive_laminare', 'accesorii_specifice'
-    ];
 BEGIN
-    -- Iterăm prin fiecare item din comandă
-    FOR item IN SELECT * FROM jsonb_array_elements(order_items)
+    SELECT COUNT(DISTINCT item->>'productId') INTO total_items
+    FROM jsonb_array_elements(order_items) AS item;
+
+    -- Cantitățile se însumează per produs, iar produsele se grupează pe tabela lor
+    FOR target IN
+        WITH order_lines AS (
+            SELECT (item->>'productId')::INTEGER AS product_id,
+                   SUM(COALESCE((item->>'quantity')::INTEGER, 0)) AS quantity
+            FROM jsonb_array_elements(order_items) AS item
+            WHERE item->>'productId' IS NOT NULL
+            GROUP BY 1
+        ),
+        located AS (
+            SELECT DISTINCT ON (l.product_id) l.product_id, l.quantity, pl.table_name, pl.priority
+            FROM order_lines l
+            JOIN product_locations pl ON pl.product_id = l.product_id
+            ORDER BY l.product_id, pl.priority
+        )
+        SELECT table_name,
+               array_agg(product_id ORDER BY product_id) AS product_ids,
+               array_agg(quantity ORDER BY product_id) AS quantities
+        FROM located
+        GROUP BY table_name
+        ORDER BY MIN(priority)
     LOOP
-        total_items := total_items + 1;
-        
-        -- Extragem productId și quantity din JSON
-        product_id := (item->>'productId')::INTEGER;
-        quantity := (item->>'quantity')::INTEGER;
-        
-        -- Căutăm produsul în toate tabelele
-        FOREACH table_name IN ARRAY product_tables
-        LOOP
-            -- Încercăm să actualizăm stocul în această tabelă
-            IF update_product_stock(table_name, product_id, quantity) THEN
-                success_count := success_count + 1;
-                EXIT; -- Produsul a fost găsit și actualizat, ieșim din bucla tabelelor
-            END IF;
-        END LOOP;
+        -- Scădere atomică (nu permitem stoc negativ); RETURNING numără produsele actualizate
+        EXECUTE format(
+            'WITH updated AS (
+                UPDATE %I AS p
+                SET store_stock = GREATEST(0, p.store_stock - l.quantity),
+                    total_stock = GREATEST(0, p.total_stock - l.quantity)
+                FROM unnest($1::INTEGER[], $2::INTEGER[]) AS l(product_id, quantity)
+                WHERE p.id = l.product_id AND p.store_stock IS NOT NULL
+                RETURNING p.id
+            )
+            SELECT COUNT(*) FROM updated',
+            target.table_name
+        )
+        INTO updated_count
+        USING target.product_ids, target.quantities;
+
+        success_count := success_count + updated_count;
     END LOOP;
-    
+
+    IF success_count < total_items THEN
+        RAISE NOTICE 'Stocul nu a fost găsit pentru % din % produse', total_items - success_count, total_items;
+    END IF;
+
     -- Construim mesajul de rezultat
     result_message := format('Actualizat stocul pentru %s din %s produse', success_count, total_items);
-    
+
     RETURN result_message;
 EXCEPTION
     WHEN OTHERS THEN
@@ -125,12 +150,48 @@ EXCEPTION
 END;
 $$ LANGUAGE plpgsql;
 
+-- Stocul unei plăți MAIB este scăzut o singură dată: fie de backend la callback-ul de succes
+-- (conversia rezervării de stoc), fie de trigger-ul comenzii, oricare ajunge primul
+CREATE TABLE IF NOT EXISTS stock_commits (
+    pay_id TEXT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE stock_commits ENABLE ROW LEVEL SECURITY;
+
+-- Revendică scăderea stocului pentru un payId; TRUE doar pentru primul apelant
+CREATE OR REPLACE FUNCTION claim_stock_commit(p_pay_id TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    INSERT INTO stock_commits (pay_id) VALUES (p_pay_id)
+    ON CONFLICT (pay_id) DO NOTHING;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Apelată de backend (RPC) când plata MAIB reușește
+CREATE OR REPLACE FUNCTION commit_stock_reservation(p_pay_id TEXT, order_items JSONB)
+RETURNS TEXT AS $$
+BEGIN
+    IF NOT claim_stock_commit(p_pay_id) THEN
+        RETURN format('Stocul pentru plata %s a fost deja scăzut', p_pay_id);
+    END IF;
+    RETURN update_stock_from_order_items(order_items);
+END;
+$$ LANGUAGE plpgsql;
+
 -- Funcție trigger pentru actualizarea automată a stocului când se inserează o comandă
 CREATE OR REPLACE FUNCTION trigger_update_stock_on_order_insert()
 RETURNS TRIGGER AS $$
 DECLARE
     stock_update_result TEXT;
 BEGIN
+    -- Comenzile plătite cu MAIB: stocul poate fi deja scăzut la confirmarea plății
+    IF NEW.maib_pay_id IS NOT NULL AND NOT claim_stock_commit(NEW.maib_pay_id) THEN
+        RAISE NOTICE 'Stocul pentru comanda % (plata %) a fost deja scăzut', NEW.id, NEW.maib_pay_id;
+        RETURN NEW;
+    END IF;
+
     -- Actualizăm stocul pentru toate produsele din comandă
     stock_update_result := update_stock_from_order_items(NEW.items);
     
@@ -194,6 +255,8 @@ FROM information_schema.routines
 WHERE routine_name IN (
     'update_product_stock',
     'update_stock_from_order_items', 
+    'claim_stock_commit',
+    'commit_stock_reservation',
     'trigger_update_stock_on_order_insert'
 )
 ORDER BY routine_name;
@@ -1,65 +1,163 @@
--- Creează VIEW pentru gruparea produselor gene după nume
--- Acest VIEW grupează variantele după un slug derivat din name
-
-CREATE OR REPLACE VIEW public.gene_groups AS
-SELECT 
-    -- Creează slug normalizat din name pentru routing stabil
-    LOWER(
-        TRIM(
-            REGEXP_REPLACE(
-                REGEXP_REPLACE(
-                    REGEXP_REPLACE(
-                        REGEXP_REPLACE(
-                            REGEXP_REPLACE(
-                                REGEXP_REPLACE(
-                                    REGEXP_REPLACE(name, '[ăâ]', 'a', 'g'),
-                                '[șş]', 's', 'g'),
-                            '[țţ]', 't', 'g'),
-                        '[îì]', 'i', 'g'),
-                    '[^a-zA-Z0-9\s-]', '', 'g'),
-                '\s+', '-', 'g'),
-            '-+', '-', 'g')
-        )
-    ) AS slug,
-    
+-- Catalogul grupurilor de produse gene (variantele grupate după slug)
+-- Grupurile sunt păstrate în tabela gene_group_summary, actualizată incremental de trigger-e
+-- pe tabela gene: la fiecare modificare se recalculează doar grupurile (slug-urile) atinse.
+-- VIEW-ul gene_groups rămâne interfața folosită de frontend și de backend.
+-- Necesită coloana gene.slug (rulează întâi gene_slug.sql)
+
+-- =====================================================
+-- TABELA SUMAR
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS public.gene_group_summary (
+    -- Slug normalizat din name (public.gene_slug), pentru routing stabil
+    slug TEXT PRIMARY KEY,
     -- Nume reprezentativ (primul din grup alfabetic)
-    MIN(name) AS name,
-    
+    name TEXT NOT NULL,
     -- Imagine reprezentativă (prima disponibilă)
-    (ARRAY_AGG(image_url ORDER BY CASE WHEN image_url IS NOT NULL THEN 0 ELSE 1 END, id))[1] AS image_url,
-    
+    image_url TEXT,
     -- Preț minim din toate variantele
-    MIN(sale_price) AS from_price,
-    
+    from_price NUMERIC,
     -- Stoc total din toate variantele
-    COALESCE(SUM(store_stock), 0) AS total_stock,
-    
+    total_stock BIGINT NOT NULL DEFAULT 0,
     -- Numărul de variante pentru acest produs
-    COUNT(*) AS variant_count
-    
-FROM public.gene
-WHERE name IS NOT NULL AND TRIM(name) != ''
-GROUP BY LOWER(
-    TRIM(
-        REGEXP_REPLACE(
-            REGEXP_REPLACE(
-                REGEXP_REPLACE(
-                    REGEXP_REPLACE(
-                        REGEXP_REPLACE(
-                            REGEXP_REPLACE(
-                                REGEXP_REPLACE(name, '[ăâ]', 'a', 'g'),
-                            '[șş]', 's', 'g'),
-                        '[țţ]', 't', 'g'),
-                    '[îì]', 'i', 'g'),
-                '[^a-zA-Z0-9\s-]', '', 'g'),
-            '\s+', '-', 'g'),
-        '-+', '-', 'g')
-    )
+    variant_count BIGINT NOT NULL DEFAULT 0,
+    -- Descriere reprezentativă (prima disponibilă)
+    descriere TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Comentariu: Acest VIEW creează un slug prin:
--- 1. Înlocuirea diacriticelor românești cu echivalentele ASCII
--- 2. Eliminarea caracterelor speciale
--- 3. Înlocuirea spațiilor cu cratimă
--- 4. Normalizarea la lowercase
--- Apoi grupează variantele și calculează statistici agregrate
+-- Listarea catalogului este ordonată după nume
+CREATE INDEX IF NOT EXISTS idx_gene_group_summary_name ON public.gene_group_summary(name, slug);
+
+ALTER TABLE public.gene_group_summary ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "gene_group_summary_read" ON public.gene_group_summary;
+CREATE POLICY "gene_group_summary_read" ON public.gene_group_summary
+    FOR SELECT USING (true);
+
+-- =====================================================
+-- RECALCULAREA INCREMENTALĂ
+-- =====================================================
+
+-- Recalculează grupurile date (căutare prin idx_gene_slug, nu scanare completă a tabelei gene)
+CREATE OR REPLACE FUNCTION public.refresh_gene_groups(slugs TEXT[])
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    -- Grupurile care nu mai au nicio variantă
+    DELETE FROM public.gene_group_summary s
+    WHERE s.slug = ANY(slugs)
+      AND NOT EXISTS (
+          SELECT 1 FROM public.gene g
+          WHERE g.slug = s.slug AND g.name IS NOT NULL AND TRIM(g.name) != ''
+      );
+
+    INSERT INTO public.gene_group_summary AS s
+        (slug, name, image_url, from_price, total_stock, variant_count, descriere, updated_at)
+    SELECT
+        g.slug,
+        MIN(g.name),
+        (ARRAY_AGG(g.image_url ORDER BY CASE WHEN g.image_url IS NOT NULL THEN 0 ELSE 1 END, g.id))[1],
+        MIN(g.sale_price),
+        COALESCE(SUM(g.store_stock), 0),
+        COUNT(*),
+        (ARRAY_AGG(g.descriere ORDER BY CASE WHEN g.descriere IS NOT NULL THEN 0 ELSE 1 END, g.id))[1],
+        NOW()
+    FROM public.gene g
+    WHERE g.slug = ANY(slugs) AND g.name IS NOT NULL AND TRIM(g.name) != ''
+    GROUP BY g.slug
+    ON CONFLICT (slug) DO UPDATE
+    SET name = EXCLUDED.name,
+        image_url = EXCLUDED.image_url,
+        from_price = EXCLUDED.from_price,
+        total_stock = EXCLUDED.total_stock,
+        variant_count = EXCLUDED.variant_count,
+        descriere = EXCLUDED.descriere,
+        updated_at = EXCLUDED.updated_at
+    -- nu rescriem rândurile neschimbate (ex. UPDATE pe o coloană care nu intră în sumar)
+    WHERE (s.name, s.image_url, s.from_price, s.total_stock, s.variant_count, s.descriere)
+        IS DISTINCT FROM
+          (EXCLUDED.name, EXCLUDED.image_url, EXCLUDED.from_price, EXCLUDED.total_stock,
+           EXCLUDED.variant_count, EXCLUDED.descriere);
+END;
+$$;
+
+-- Trigger per instrucțiune: slug-urile atinse vin din tabelele de tranziție (old_rows/new_rows),
+-- deci un import în masă recalculează fiecare grup o singură dată
+CREATE OR REPLACE FUNCTION public.trigger_refresh_gene_groups()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed_slugs TEXT[];
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE public.gene_group_summary;
+        RETURN NULL;
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT ARRAY_AGG(DISTINCT slug) INTO changed_slugs FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT ARRAY_AGG(DISTINCT slug) INTO changed_slugs FROM old_rows;
+    ELSE
+        SELECT ARRAY_AGG(DISTINCT slug) INTO changed_slugs
+        FROM (SELECT slug FROM new_rows UNION SELECT slug FROM old_rows) AS touched;
+    END IF;
+
+    IF changed_slugs IS NOT NULL THEN
+        PERFORM public.refresh_gene_groups(changed_slugs);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS refresh_gene_groups_insert ON public.gene;
+CREATE TRIGGER refresh_gene_groups_insert
+    AFTER INSERT ON public.gene
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.trigger_refresh_gene_groups();
+
+DROP TRIGGER IF EXISTS refresh_gene_groups_update ON public.gene;
+CREATE TRIGGER refresh_gene_groups_update
+    AFTER UPDATE ON public.gene
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.trigger_refresh_gene_groups();
+
+DROP TRIGGER IF EXISTS refresh_gene_groups_delete ON public.gene;
+CREATE TRIGGER refresh_gene_groups_delete
+    AFTER DELETE ON public.gene
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.trigger_refresh_gene_groups();
+
+DROP TRIGGER IF EXISTS refresh_gene_groups_truncate ON public.gene;
+CREATE TRIGGER refresh_gene_groups_truncate
+    AFTER TRUNCATE ON public.gene
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.trigger_refresh_gene_groups();
+
+-- Populare inițială (idempotentă)
+SELECT public.refresh_gene_groups(ARRAY(SELECT DISTINCT slug FROM public.gene WHERE slug IS NOT NULL));
+
+-- =====================================================
+-- VIEW-UL gene_groups
+-- =====================================================
+
+-- Aceleași coloane ca VIEW-ul calculat anterior din gene, plus descriere
+DROP VIEW IF EXISTS public.gene_groups;
+CREATE VIEW public.gene_groups AS
+SELECT slug, name, image_url, from_price, total_stock, variant_count, descriere
+FROM public.gene_group_summary;
+
+-- =====================================================
+-- COMENTARII ȘI DOCUMENTAȚIE
+-- =====================================================
+
+COMMENT ON TABLE public.gene_group_summary IS 'Grupurile de produse gene, menținute incremental de trigger-ele refresh_gene_groups_*';
+COMMENT ON FUNCTION public.refresh_gene_groups(TEXT[]) IS 'Recalculează grupurile gene pentru slug-urile date';
+COMMENT ON VIEW public.gene_groups IS 'Grupurile de produse gene (citite din gene_group_summary)';
+
+GRANT SELECT ON public.gene_groups TO anon;
+GRANT SELECT ON public.gene_groups TO authenticated;
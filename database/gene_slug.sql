@@ -0,0 +1,99 @@
+-- Slug precalculat și indexat pentru produsele gene
+-- Înlocuiește evaluarea celor 7 REGEXP_REPLACE pe fiecare rând la fiecare căutare după slug.
+-- Rulează acest script înainte de gene_variant_options_rpc.sql și gene_groups_view.sql.
+
+-- =====================================================
+-- FUNCȚIA DE SLUG
+-- =====================================================
+
+-- Aceeași normalizare ca în VIEW-ul gene_groups:
+-- 1. Înlocuirea diacriticelor românești cu echivalentele ASCII
+-- 2. Eliminarea caracterelor speciale
+-- 3. Înlocuirea spațiilor cu cratimă
+-- 4. Normalizarea la lowercase
+-- IMMUTABLE, ca să poată fi folosită într-o coloană generată și în indexuri
+CREATE OR REPLACE FUNCTION public.gene_slug(value text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT LOWER(
+        TRIM(
+            REGEXP_REPLACE(
+                REGEXP_REPLACE(
+                    REGEXP_REPLACE(
+                        REGEXP_REPLACE(
+                            REGEXP_REPLACE(
+                                REGEXP_REPLACE(
+                                    REGEXP_REPLACE(value, '[ăâ]', 'a', 'g'),
+                                '[șş]', 's', 'g'),
+                            '[țţ]', 't', 'g'),
+                        '[îì]', 'i', 'g'),
+                    '[^a-zA-Z0-9\s-]', '', 'g'),
+                '\s+', '-', 'g'),
+            '-+', '-', 'g')
+        )
+    )
+$$;
+
+-- =====================================================
+-- COLOANA SLUG ȘI INDEXUL
+-- =====================================================
+
+-- Coloană generată: calculată o singură dată la INSERT/UPDATE pe name
+ALTER TABLE public.gene
+ADD COLUMN IF NOT EXISTS slug TEXT GENERATED ALWAYS AS (public.gene_slug(name)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_gene_slug ON public.gene(slug);
+
+-- =====================================================
+-- VERSIUNEA CATALOGULUI (INVALIDARE CACHE BACKEND)
+-- =====================================================
+
+-- Fiecare modificare pe o tabelă de catalog incrementează versiunea ei; backend-ul compară
+-- periodic versiunea și golește cache-ul când s-a schimbat
+CREATE TABLE IF NOT EXISTS public.catalog_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE public.catalog_versions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "catalog_versions_read" ON public.catalog_versions;
+CREATE POLICY "catalog_versions_read" ON public.catalog_versions
+    FOR SELECT USING (true);
+
+CREATE OR REPLACE FUNCTION public.bump_catalog_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.catalog_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, NOW())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = public.catalog_versions.version + 1,
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- O singură incrementare per instrucțiune (nu per rând), inclusiv la importuri în masă
+DROP TRIGGER IF EXISTS bump_gene_catalog_version ON public.gene;
+CREATE TRIGGER bump_gene_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.gene
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION public.bump_catalog_version();
+
+INSERT INTO public.catalog_versions (table_name) VALUES ('gene')
+ON CONFLICT (table_name) DO NOTHING;
+
+-- =====================================================
+-- COMENTARII ȘI DOCUMENTAȚIE
+-- =====================================================
+
+COMMENT ON FUNCTION public.gene_slug(text) IS 'Slug normalizat (fără diacritice, cu cratime) derivat din numele produsului';
+COMMENT ON COLUMN public.gene.slug IS 'Slug generat din name, indexat pentru căutările după produs';
+COMMENT ON TABLE public.catalog_versions IS 'Versiunea fiecărei tabele de catalog, incrementată la orice modificare';
+
+GRANT EXECUTE ON FUNCTION public.gene_slug(text) TO anon;
+GRANT EXECUTE ON FUNCTION public.gene_slug(text) TO authenticated;
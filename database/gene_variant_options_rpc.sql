@@ -1,34 +1,20 @@
 -- Funcție RPC pentru obținerea opțiunilor variantelor unui produs
 -- Această funcție optimizează query-ul pentru chip-uri
+-- Necesită coloana gene.slug (rulează întâi gene_slug.sql)
 
 CREATE OR REPLACE FUNCTION get_gene_variant_options(product_slug text)
 RETURNS json
 LANGUAGE plpgsql
+STABLE
 AS $$
 DECLARE
     result json;
 BEGIN
-    -- Denormalizează slug-ul pentru comparație cu name
+    -- Căutare după coloana slug generată (index idx_gene_slug, vezi gene_slug.sql)
     WITH product_variants AS (
         SELECT curbura, grosime, lungime, culoare
         FROM public.gene
-        WHERE LOWER(
-            TRIM(
-                REGEXP_REPLACE(
-                    REGEXP_REPLACE(
-                        REGEXP_REPLACE(
-                            REGEXP_REPLACE(
-                                REGEXP_REPLACE(
-                                    REGEXP_REPLACE(
-                                        REGEXP_REPLACE(name, '[ăâ]', 'a', 'g'),
-                                    '[șş]', 's', 'g'),
-                                '[țţ]', 't', 'g'),
-                            '[îì]', 'i', 'g'),
-                        '[^a-zA-Z0-9\s-]', '', 'g'),
-                    '\s+', '-', 'g'),
-                '-+', '-', 'g')
-            )
-        ) = product_slug
+        WHERE slug = product_slug
     )
     SELECT json_build_object(
         'curburi', (
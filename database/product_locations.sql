@@ -0,0 +1,174 @@
+-- Registrul locațiilor produselor: product id -> tabela de produse în care se află, cu stocul curent
+-- Înlocuiește căutarea prin cele 14 tabele de produse la fiecare item de comandă, la verificarea
+-- disponibilității coșului și la raportul de stoc redus.
+-- Rulează acest script o dată (Supabase SQL Editor), înainte de stock_management_functions.sql.
+
+-- =====================================================
+-- TABELA REGISTRU
+-- =====================================================
+
+-- Id-urile nu sunt unice între tabele (fiecare tabelă are secvența ei), deci cheia este
+-- (product_id, table_name). `priority` păstrează ordinea în care funcțiile de stoc căutau
+-- tabelele: la un id prezent în mai multe tabele câștigă tabela cu prioritatea cea mai mică.
+CREATE TABLE IF NOT EXISTS product_locations (
+    product_id INTEGER NOT NULL,
+    table_name TEXT NOT NULL,
+    priority SMALLINT NOT NULL,
+    PRIMARY KEY (product_id, table_name)
+);
+
+-- Copia stocului din tabela de produse (vederea unificată a stocului)
+ALTER TABLE product_locations
+ADD COLUMN IF NOT EXISTS name TEXT,
+ADD COLUMN IF NOT EXISTS store_stock INTEGER,
+ADD COLUMN IF NOT EXISTS total_stock INTEGER,
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Indexuri pentru raportul de stoc redus (BitmapOr pe cele două condiții)
+CREATE INDEX IF NOT EXISTS idx_product_locations_store_stock ON product_locations(store_stock);
+CREATE INDEX IF NOT EXISTS idx_product_locations_total_stock ON product_locations(total_stock);
+
+-- Registrul poate fi citit de oricine (funcțiile de stoc rulează și ca anon la inserarea comenzii),
+-- dar este scris doar de trigger-ele de mai jos (SECURITY DEFINER)
+ALTER TABLE product_locations ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "product_locations_read" ON product_locations;
+CREATE POLICY "product_locations_read" ON product_locations
+    FOR SELECT USING (true);
+
+-- =====================================================
+-- TRIGGER-E PENTRU MENȚINEREA REGISTRULUI
+-- =====================================================
+
+-- Funcție trigger comună pentru toate tabelele de produse (TG_ARGV[0] = prioritatea tabelei)
+CREATE OR REPLACE FUNCTION sync_product_location()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM product_locations WHERE table_name = TG_TABLE_NAME;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id IS DISTINCT FROM NEW.id) THEN
+        DELETE FROM product_locations
+        WHERE product_id = OLD.id AND table_name = TG_TABLE_NAME;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO product_locations (product_id, table_name, priority, name, store_stock, total_stock, updated_at)
+        VALUES (NEW.id, TG_TABLE_NAME, TG_ARGV[0]::SMALLINT, NEW.name, NEW.store_stock, NEW.total_stock, NOW())
+        ON CONFLICT (product_id, table_name) DO UPDATE
+        SET name = EXCLUDED.name,
+            store_stock = EXCLUDED.store_stock,
+            total_stock = EXCLUDED.total_stock,
+            updated_at = EXCLUDED.updated_at;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Creăm trigger-ele și populăm registrul cu produsele existente
+DO $$
+DECLARE
+    product_tables TEXT[] := ARRAY[
+        'gene', 'adezive', 'preparate', 'ingrijire-personala',
+        'accesorii', 'consumabile', 'ustensile', 'tehnologie_led',
+        'hena_sprancene', 'vopsele_profesionale', 'pensule_instrumente_speciale',
+        'solutii_laminare', 'adezive_laminare', 'accesorii_specifice'
+    ];
+    product_table TEXT;
+    table_priority INTEGER;
+BEGIN
+    FOR table_priority IN 1 .. array_length(product_tables, 1)
+    LOOP
+        product_table := product_tables[table_priority];
+
+        -- Tabelele care lipsesc din baza de date (schema din search_path) sunt ignorate
+        IF to_regclass(quote_ident(product_table)) IS NULL THEN
+            RAISE NOTICE 'Tabela % nu există, o ignorăm', product_table;
+            CONTINUE;
+        END IF;
+
+        EXECUTE format('DROP TRIGGER IF EXISTS sync_product_location ON %I', product_table);
+        EXECUTE format(
+            'CREATE TRIGGER sync_product_location
+                AFTER INSERT OR DELETE OR UPDATE OF id, name, store_stock, total_stock ON %I
+                FOR EACH ROW
+                EXECUTE FUNCTION sync_product_location(%L)',
+            product_table, table_priority
+        );
+
+        EXECUTE format('DROP TRIGGER IF EXISTS sync_product_location_truncate ON %I', product_table);
+        EXECUTE format(
+            'CREATE TRIGGER sync_product_location_truncate
+                AFTER TRUNCATE ON %I
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION sync_product_location(%L)',
+            product_table, table_priority
+        );
+
+        -- Backfill (idempotent; re-rularea resincronizează și stocul)
+        EXECUTE format(
+            'INSERT INTO product_locations (product_id, table_name, priority, name, store_stock, total_stock)
+             SELECT id, %L, %s, name, store_stock, total_stock FROM %I
+             ON CONFLICT (product_id, table_name) DO UPDATE
+             SET name = EXCLUDED.name,
+                 store_stock = EXCLUDED.store_stock,
+                 total_stock = EXCLUDED.total_stock,
+                 updated_at = NOW()',
+            product_table, table_priority, product_table
+        );
+    END LOOP;
+END;
+$$;
+
+-- =====================================================
+-- DISPONIBILITATEA STOCULUI (COȘ)
+-- =====================================================
+
+-- Stocul pentru o listă de produse, într-un singur apel (prima tabelă după prioritate, ca la comenzi)
+CREATE OR REPLACE FUNCTION get_stock_availability(product_ids INTEGER[])
+RETURNS TABLE(
+    product_id INTEGER,
+    table_name TEXT,
+    product_name TEXT,
+    store_stock INTEGER,
+    total_stock INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT ON (pl.product_id)
+        pl.product_id, pl.table_name, pl.name, pl.store_stock, pl.total_stock
+    FROM product_locations pl
+    WHERE pl.product_id = ANY(product_ids)
+    ORDER BY pl.product_id, pl.priority
+$$;
+
+GRANT EXECUTE ON FUNCTION get_stock_availability(INTEGER[]) TO anon;
+GRANT EXECUTE ON FUNCTION get_stock_availability(INTEGER[]) TO authenticated;
+
+-- =====================================================
+-- COMENTARII ȘI DOCUMENTAȚIE
+-- =====================================================
+
+COMMENT ON TABLE product_locations IS 'Registrul produs -> tabela de produse, menținut de trigger-ele sync_product_location';
+COMMENT ON COLUMN product_locations.priority IS 'Ordinea de căutare a tabelelor; la id-uri duplicate câștigă prioritatea minimă';
+COMMENT ON FUNCTION sync_product_location() IS 'Trigger care ține product_locations sincronizat cu tabelele de produse';
+COMMENT ON FUNCTION get_stock_availability(INTEGER[]) IS 'Stocul curent pentru o listă de produse (verificarea coșului)';
+
+-- =====================================================
+-- VERIFICARE
+-- =====================================================
+
+/*
+-- Numărul de produse înregistrate per tabelă
+SELECT table_name, COUNT(*) FROM product_locations GROUP BY table_name ORDER BY MIN(priority);
+
+-- Id-uri prezente în mai multe tabele (stocul se actualizează doar în prima)
+SELECT product_id, array_agg(table_name ORDER BY priority)
+FROM product_locations
+GROUP BY product_id
+HAVING COUNT(*) > 1;
+*/
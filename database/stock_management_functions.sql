@@ -1,5 +1,6 @@
 -- Funcții pentru gestionarea stocului produselor
 -- Acest fișier conține funcții SQL pentru actualizarea automată a stocului
+-- Necesită registrul product_locations (rulează întâi product_locations.sql)
 
 -- =====================================================
 -- FUNCȚII PENTRU ACTUALIZAREA STOCULUI
@@ -59,46 +60,68 @@ $$ LANGUAGE plpgsql;
 -- =====================================================
 
 -- Funcție pentru actualizarea stocului bazată pe items dintr-o comandă
+-- Produsele sunt localizate prin registrul product_locations (vezi product_locations.sql),
+-- iar stocul se scade cu un singur UPDATE ... RETURNING per tabelă, pentru toate produsele comenzii.
 CREATE OR REPLACE FUNCTION update_stock_from_order_items(order_items JSONB)
 RETURNS TEXT AS $$
 DECLARE
-    item JSONB;
-    product_id INTEGER;
-    quantity INTEGER;
-    table_name TEXT;
+    target RECORD;
+    updated_count INTEGER;
     success_count INTEGER := 0;
     total_items INTEGER := 0;
     result_message TEXT := '';
-    product_tables TEXT[] := ARRAY[
-        'gene', 'adezive', 'preparate', 'ingrijire-personala',
-        'accesorii', 'consumabile', 'ustensile', 'tehnologie_led',
-        'hena_sprancene', 'vopsele_profesionale', 'pensule_instrumente_speciale',
-        'solutii_laminare', 'adezive_laminare', 'accesorii_specifice'
-    ];
 BEGIN
-    -- Iterăm prin fiecare item din comandă
-    FOR item IN SELECT * FROM jsonb_array_elements(order_items)
+    SELECT COUNT(DISTINCT item->>'productId') INTO total_items
+    FROM jsonb_array_elements(order_items) AS item;
+
+    -- Cantitățile se însumează per produs, iar produsele se grupează pe tabela lor
+    FOR target IN
+        WITH order_lines AS (
+            SELECT (item->>'productId')::INTEGER AS product_id,
+                   SUM(COALESCE((item->>'quantity')::INTEGER, 0)) AS quantity
+            FROM jsonb_array_elements(order_items) AS item
+            WHERE item->>'productId' IS NOT NULL
+            GROUP BY 1
+        ),
+        located AS (
+            SELECT DISTINCT ON (l.product_id) l.product_id, l.quantity, pl.table_name, pl.priority
+            FROM order_lines l
+            JOIN product_locations pl ON pl.product_id = l.product_id
+            ORDER BY l.product_id, pl.priority
+        )
+        SELECT table_name,
+               array_agg(product_id ORDER BY product_id) AS product_ids,
+               array_agg(quantity ORDER BY product_id) AS quantities
+        FROM located
+        GROUP BY table_name
+        ORDER BY MIN(priority)
     LOOP
-        total_items := total_items + 1;
-        
-        -- Extragem productId și quantity din JSON
-        product_id := (item->>'productId')::INTEGER;
-        quantity := (item->>'quantity')::INTEGER;
-        
-        -- Căutăm produsul în toate tabelele
-        FOREACH table_name IN ARRAY product_tables
-        LOOP
-            -- Încercăm să actualizăm stocul în această tabelă
-            IF update_product_stock(table_name, product_id, quantity) THEN
-                success_count := success_count + 1;
-                EXIT; -- Produsul a fost găsit și actualizat, ieșim din bucla tabelelor
-            END IF;
-        END LOOP;
+        -- Scădere atomică (nu permitem stoc negativ); RETURNING numără produsele actualizate
+        EXECUTE format(
+            'WITH updated AS (
+                UPDATE %I AS p
+                SET store_stock = GREATEST(0, p.store_stock - l.quantity),
+                    total_stock = GREATEST(0, p.total_stock - l.quantity)
+                FROM unnest($1::INTEGER[], $2::INTEGER[]) AS l(product_id, quantity)
+                WHERE p.id = l.product_id AND p.store_stock IS NOT NULL
+                RETURNING p.id
+            )
+            SELECT COUNT(*) FROM updated',
+            target.table_name
+        )
+        INTO updated_count
+        USING target.product_ids, target.quantities;
+
+        success_count := success_count + updated_count;
     END LOOP;
-    
+
+    IF success_count < total_items THEN
+        RAISE NOTICE 'Stocul nu a fost găsit pentru % din % produse', total_items - success_count, total_items;
+    END IF;
+
     -- Construim mesajul de rezultat
     result_message := format('Actualizat stocul pentru %s din %s produse', success_count, total_items);
-    
+
     RETURN result_message;
 EXCEPTION
     WHEN OTHERS THEN
@@ -110,12 +133,52 @@ $$ LANGUAGE plpgsql;
 -- TRIGGER PENTRU ACTUALIZAREA AUTOMATĂ A STOCULUI
 -- =====================================================
 
+-- =====================================================
+-- SCĂDEREA IDEMPOTENTĂ PENTRU PLĂȚILE MAIB
+-- =====================================================
+
+-- Stocul unei plăți MAIB este scăzut o singură dată: fie de backend la callback-ul de succes
+-- (conversia rezervării de stoc), fie de trigger-ul comenzii, oricare ajunge primul
+CREATE TABLE IF NOT EXISTS stock_commits (
+    pay_id TEXT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE stock_commits ENABLE ROW LEVEL SECURITY;
+
+-- Revendică scăderea stocului pentru un payId; TRUE doar pentru primul apelant
+CREATE OR REPLACE FUNCTION claim_stock_commit(p_pay_id TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    INSERT INTO stock_commits (pay_id) VALUES (p_pay_id)
+    ON CONFLICT (pay_id) DO NOTHING;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Apelată de backend (RPC) când plata MAIB reușește
+CREATE OR REPLACE FUNCTION commit_stock_reservation(p_pay_id TEXT, order_items JSONB)
+RETURNS TEXT AS $$
+BEGIN
+    IF NOT claim_stock_commit(p_pay_id) THEN
+        RETURN format('Stocul pentru plata %s a fost deja scăzut', p_pay_id);
+    END IF;
+    RETURN update_stock_from_order_items(order_items);
+END;
+$$ LANGUAGE plpgsql;
+
 -- Funcție trigger pentru actualizarea automată a stocului când se inserează o comandă
 CREATE OR REPLACE FUNCTION trigger_update_stock_on_order_insert()
 RETURNS TRIGGER AS $$
 DECLARE
     stock_update_result TEXT;
 BEGIN
+    -- Comenzile plătite cu MAIB: stocul poate fi deja scăzut la confirmarea plății
+    IF NEW.maib_pay_id IS NOT NULL AND NOT claim_stock_commit(NEW.maib_pay_id) THEN
+        RAISE NOTICE 'Stocul pentru comanda % (plata %) a fost deja scăzut', NEW.id, NEW.maib_pay_id;
+        RETURN NEW;
+    END IF;
+
     -- Actualizăm stocul pentru toate produsele din comandă
     stock_update_result := update_stock_from_order_items(NEW.items);
     
@@ -143,75 +206,61 @@ CREATE TRIGGER update_stock_on_order_insert
 -- =====================================================
 
 -- Funcție pentru restaurarea stocului când o comandă este anulată
+-- (aceeași variantă set-based ca update_stock_from_order_items, cu cantitățile adăugate)
 CREATE OR REPLACE FUNCTION restore_stock_from_order_items(order_items JSONB)
 RETURNS TEXT AS $$
 DECLARE
-    item JSONB;
-    product_id INTEGER;
-    quantity INTEGER;
-    table_name TEXT;
+    target RECORD;
+    updated_count INTEGER;
     success_count INTEGER := 0;
     total_items INTEGER := 0;
     result_message TEXT := '';
-    product_tables TEXT[] := ARRAY[
-        'gene', 'adezive', 'preparate', 'ingrijire-personala',
-        'accesorii', 'consumabile', 'ustensile', 'tehnologie_led',
-        'hena_sprancene', 'vopsele_profesionale', 'pensule_instrumente_speciale',
-        'solutii_laminare', 'adezive_laminare', 'accesorii_specifice'
-    ];
-    current_store_stock INTEGER;
-    current_total_stock INTEGER;
-    new_store_stock INTEGER;
-    new_total_stock INTEGER;
-    update_query TEXT;
 BEGIN
-    -- Iterăm prin fiecare item din comandă
-    FOR item IN SELECT * FROM jsonb_array_elements(order_items)
+    SELECT COUNT(DISTINCT item->>'productId') INTO total_items
+    FROM jsonb_array_elements(order_items) AS item;
+
+    FOR target IN
+        WITH order_lines AS (
+            SELECT (item->>'productId')::INTEGER AS product_id,
+                   SUM(COALESCE((item->>'quantity')::INTEGER, 0)) AS quantity
+            FROM jsonb_array_elements(order_items) AS item
+            WHERE item->>'productId' IS NOT NULL
+            GROUP BY 1
+        ),
+        located AS (
+            SELECT DISTINCT ON (l.product_id) l.product_id, l.quantity, pl.table_name, pl.priority
+            FROM order_lines l
+            JOIN product_locations pl ON pl.product_id = l.product_id
+            ORDER BY l.product_id, pl.priority
+        )
+        SELECT table_name,
+               array_agg(product_id ORDER BY product_id) AS product_ids,
+               array_agg(quantity ORDER BY product_id) AS quantities
+        FROM located
+        GROUP BY table_name
+        ORDER BY MIN(priority)
     LOOP
-        total_items := total_items + 1;
-        
-        -- Extragem productId și quantity din JSON
-        product_id := (item->>'productId')::INTEGER;
-        quantity := (item->>'quantity')::INTEGER;
-        
-        -- Căutăm produsul în toate tabelele și restauram stocul
-        FOREACH table_name IN ARRAY product_tables
-        LOOP
-            BEGIN
-                -- Obținem stocul curent
-                update_query := format('SELECT store_stock, total_stock FROM %I WHERE id = %s', table_name, product_id);
-                EXECUTE update_query INTO current_store_stock, current_total_stock;
-                
-                -- Dacă produsul există, restauram stocul
-                IF current_store_stock IS NOT NULL THEN
-                    new_store_stock := current_store_stock + quantity;
-                    new_total_stock := current_total_stock + quantity;
-                    
-                    -- Actualizăm stocul
-                    update_query := format(
-                        'UPDATE %I SET store_stock = %s, total_stock = %s WHERE id = %s',
-                        table_name, new_store_stock, new_total_stock, product_id
-                    );
-                    
-                    EXECUTE update_query;
-                    
-                    RAISE NOTICE 'Stoc restaurat pentru produsul % din tabela %: store_stock % -> %, total_stock % -> %',
-                        product_id, table_name, current_store_stock, new_store_stock, current_total_stock, new_total_stock;
-                    
-                    success_count := success_count + 1;
-                    EXIT; -- Produsul a fost găsit și actualizat
-                END IF;
-            EXCEPTION
-                WHEN OTHERS THEN
-                    -- Continuăm cu următoarea tabelă
-                    CONTINUE;
-            END;
-        END LOOP;
+        EXECUTE format(
+            'WITH updated AS (
+                UPDATE %I AS p
+                SET store_stock = p.store_stock + l.quantity,
+                    total_stock = p.total_stock + l.quantity
+                FROM unnest($1::INTEGER[], $2::INTEGER[]) AS l(product_id, quantity)
+                WHERE p.id = l.product_id AND p.store_stock IS NOT NULL
+                RETURNING p.id
+            )
+            SELECT COUNT(*) FROM updated',
+            target.table_name
+        )
+        INTO updated_count
+        USING target.product_ids, target.quantities;
+
+        success_count := success_count + updated_count;
     END LOOP;
-    
+
     -- Construim mesajul de rezultat
     result_message := format('Restaurat stocul pentru %s din %s produse', success_count, total_items);
-    
+
     RETURN result_message;
 EXCEPTION
     WHEN OTHERS THEN
@@ -223,7 +272,8 @@ $$ LANGUAGE plpgsql;
 -- FUNCȚII PENTRU MONITORIZAREA STOCULUI
 -- =====================================================
 
--- Funcție pentru verificarea stocului unui produs
+-- Funcție pentru verificarea stocului unui produs (în toate tabelele în care apare id-ul)
+-- Citește vederea unificată product_locations, nu cele 14 tabele pe rând
 CREATE OR REPLACE FUNCTION check_product_stock(product_id INTEGER)
 RETURNS TABLE(
     table_name TEXT,
@@ -231,35 +281,14 @@ RETURNS TABLE(
     total_stock INTEGER,
     product_name TEXT
 ) AS $$
-DECLARE
-    table_name TEXT;
-    product_tables TEXT[] := ARRAY[
-        'gene', 'adezive', 'preparate', 'ingrijire-personala',
-        'accesorii', 'consumabile', 'ustensile', 'tehnologie_led',
-        'hena_sprancene', 'vopsele_profesionale', 'pensule_instrumente_speciale',
-        'solutii_laminare', 'adezive_laminare', 'accesorii_specifice'
-    ];
-    query_text TEXT;
-BEGIN
-    FOREACH table_name IN ARRAY product_tables
-    LOOP
-        query_text := format(
-            'SELECT %L, store_stock, total_stock, name FROM %I WHERE id = %s',
-            table_name, table_name, product_id
-        );
-        
-        BEGIN
-            RETURN QUERY EXECUTE query_text;
-        EXCEPTION
-            WHEN OTHERS THEN
-                -- Continuăm cu următoarea tabelă
-                CONTINUE;
-        END;
-    END LOOP;
-END;
-$$ LANGUAGE plpgsql;
+    SELECT pl.table_name, pl.store_stock, pl.total_stock, pl.name
+    FROM product_locations pl
+    WHERE pl.product_id = check_product_stock.product_id
+    ORDER BY pl.priority;
+$$ LANGUAGE sql STABLE;
 
 -- Funcție pentru obținerea produselor cu stoc redus
+-- Folosește indexurile idx_product_locations_store_stock / idx_product_locations_total_stock
 CREATE OR REPLACE FUNCTION get_low_stock_products(minimum_stock INTEGER DEFAULT 5)
 RETURNS TABLE(
     table_name TEXT,
@@ -268,33 +297,11 @@ RETURNS TABLE(
     store_stock INTEGER,
     total_stock INTEGER
 ) AS $$
-DECLARE
-    table_name TEXT;
-    product_tables TEXT[] := ARRAY[
-        'gene', 'adezive', 'preparate', 'ingrijire-personala',
-        'accesorii', 'consumabile', 'ustensile', 'tehnologie_led',
-        'hena_sprancene', 'vopsele_profesionale', 'pensule_instrumente_speciale',
-        'solutii_laminare', 'adezive_laminare', 'accesorii_specifice'
-    ];
-    query_text TEXT;
-BEGIN
-    FOREACH table_name IN ARRAY product_tables
-    LOOP
-        query_text := format(
-            'SELECT %L, id, name, store_stock, total_stock FROM %I WHERE store_stock <= %s OR total_stock <= %s',
-            table_name, table_name, minimum_stock, minimum_stock
-        );
-        
-        BEGIN
-            RETURN QUERY EXECUTE query_text;
-        EXCEPTION
-            WHEN OTHERS THEN
-                -- Continuăm cu următoarea tabelă
-                CONTINUE;
-        END;
-    END LOOP;
-END;
-$$ LANGUAGE plpgsql;
+    SELECT pl.table_name, pl.product_id, pl.name, pl.store_stock, pl.total_stock
+    FROM product_locations pl
+    WHERE pl.store_stock <= minimum_stock OR pl.total_stock <= minimum_stock
+    ORDER BY pl.priority, pl.product_id;
+$$ LANGUAGE sql STABLE;
 
 -- =====================================================
 -- COMENTARII ȘI DOCUMENTAȚIE
@@ -303,8 +310,9 @@ $$ LANGUAGE plpgsql;
 COMMENT ON FUNCTION update_product_stock(TEXT, INTEGER, INTEGER) IS 'Actualizează stocul unui produs dintr-o tabelă specifică';
 COMMENT ON FUNCTION update_stock_from_order_items(JSONB) IS 'Actualizează stocul pentru toate produsele dintr-o comandă';
 COMMENT ON FUNCTION trigger_update_stock_on_order_insert() IS 'Trigger pentru actualizarea automată a stocului la inserarea unei comenzi';
+COMMENT ON FUNCTION commit_stock_reservation(TEXT, JSONB) IS 'Scade stocul unei plăți MAIB reușite, o singură dată per payId';
 COMMENT ON FUNCTION restore_stock_from_order_items(JSONB) IS 'Restaurează stocul când o comandă este anulată';
-COMMENT ON FUNCTION check_product_stock(INTEGER) IS 'Verifică stocul unui produs în toate tabelele';
+COMMENT ON FUNCTION check_product_stock(INTEGER) IS 'Verifică stocul unui produs în toate tabelele (prin product_locations)';
 COMMENT ON FUNCTION get_low_stock_products(INTEGER) IS 'Obține produsele cu stoc redus';
 
 -- =====================================================
@@ -58,7 +58,7 @@ const MaibCallbackPage = () => {
               const { orderData } = JSON.parse(pendingOrderData);
               
               // Salvăm comanda în baza de date doar după confirmarea plății
-              const result = await orderService.createOrder(orderData);
+              const result = await orderService.createOrder(orderData, payId);
               
               if (result.success) {
                 // Ștergem datele temporare
@@ -62,7 +62,7 @@ const PaymentSuccessPage: React.FC = () => {
         const { orderData } = JSON.parse(pendingOrderData);
         
         // Creăm comanda în baza de date
-        const result = await orderService.createOrder(orderData);
+        const result = await orderService.createOrder(orderData, currentPayId);
         
         if (result.success && result.order?.id) {
           // Actualizăm statusul comenzii la confirmed (NU salvăm date despre plată în DB)
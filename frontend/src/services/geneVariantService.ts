@@ -9,6 +9,17 @@ export class GeneVariantService {
    * Obține toate grupurile de produse pentru listarea principală
    */
   static async getProductGroups(): Promise<GeneGroup[]> {
+    // Backend-ul servește catalogul precalculat (gene_groups) din cache, cu ETag
+    try {
+      const backendUrl = import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000';
+      const response = await fetch(`${backendUrl}/api/products/gene/groups`);
+      if (response.ok) {
+        return await response.json();
+      }
+    } catch {
+      // Backend indisponibil: grupăm produsele direct din Supabase
+    }
+
     // Încarcă toate produsele gene cu paginare
     let allData: any[] = [];
     let hasMore = true;
@@ -98,6 +109,19 @@ export class GeneVariantService {
    * Obține opțiunile disponibile pentru un produs (pentru chip-uri)
    */
   static async getVariantOptions(slug: string): Promise<GeneVariantOptions> {
+    // Backend-ul servește opțiunile din cache (invalidat la modificări în tabela gene)
+    try {
+      const backendUrl = import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000';
+      const response = await fetch(
+        `${backendUrl}/api/products/gene/${encodeURIComponent(slug)}/variant-options`
+      );
+      if (response.ok) {
+        return await response.json();
+      }
+    } catch {
+      // Backend indisponibil: continuăm cu RPC-ul direct
+    }
+
     // Query pentru opțiunile distincte
     const { data, error } = await supabase
       .rpc('get_gene_variant_options', { product_slug: slug });
@@ -153,9 +153,11 @@ class OrderService {
   }
 
   /**
-   * Creează o comandă nouă în baza de date și actualizează stocul produselor
+   * Creează o comandă nouă în baza de date și actualizează stocul produselor.
+   * Pentru plățile MAIB (maibPayId) stocul a fost rezervat la checkout și este scăzut
+   * o singură dată per plată de backend / trigger-ul comenzii, nu de aici.
    */
-  async createOrder(orderData: Omit<Order, 'id' | 'createdAt' | 'updatedAt'>): Promise<OrderResponse> {
+  async createOrder(orderData: Omit<Order, 'id' | 'createdAt' | 'updatedAt'>, maibPayId?: string): Promise<OrderResponse> {
     try {
       // Pregătim datele pentru inserare în baza de date
       const orderRecord = {
@@ -176,8 +178,8 @@ class OrderService {
         notes: orderData.notes || null,
         status: orderData.status,
         items: orderData.items,
-        // Nu salvăm informații despre plată MAIB în baza de date
-        // maib_pay_id: null,
+        // Salvăm doar payId-ul MAIB (cheia pentru scăderea idempotentă a stocului)
+        maib_pay_id: maibPayId || null,
         // maib_transaction_id: null,
         // maib_payment_status: null,
         created_at: new Date().toISOString(),
@@ -199,7 +201,9 @@ class OrderService {
       }
 
       // Actualizăm stocul produselor după plasarea comenzii cu succes
-      await this.updateProductStock(orderData.items);
+      if (!maibPayId) {
+        await this.updateProductStock(orderData.items);
+      }
 
       // Construim obiectul Order pentru răspuns
       const createdOrder: Order = {
@@ -0,0 +1,67 @@
+"""
+Configurație comună pentru testele backend-ului.
+
+Backend-ul este importat ca module plate (ca în `uvicorn server:app`), deci adăugăm
+backend/ în sys.path și setăm variabilele de mediu înainte de primul import. MongoDB este
+înlocuit cu mongomock-motor, iar MAIB cu un httpx.MockTransport: testele nu ies din proces.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "address_beauty_hub_test")
+os.environ.setdefault("MAIB_TOKEN_PREFETCH", "false")
+os.environ.setdefault("MAIB_TOKEN_SHARED_STORE", "false")
+# toate request-urile de test vin de la același client; testele limitării o activează explicit
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def fake_db():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["address_beauty_hub_test"]
+
+
+@pytest.fixture
+def server_app(fake_db, monkeypatch):
+    """Modulul `server` cu MongoDB înlocuit de fake_db."""
+    import server
+
+    monkeypatch.setattr(server, "db", fake_db)
+    monkeypatch.setattr(server.maib_ledger, "collection", fake_db.maib_payments)
+    monkeypatch.setattr(server.maib_callback_queue, "collection", fake_db.maib_callback_inbox)
+    return server
+
+
+@pytest.fixture
+def fake_maib(monkeypatch):
+    """Client HTTP MAIB care răspunde local, fără latență de rețea."""
+    import httpx
+    from maib_service import MaibPaymentService
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/generate-token"):
+            return httpx.Response(200, json={"ok": True, "result": {"accessToken": "token", "expiresIn": 300}})
+        if path.startswith("/v1/pay-info/"):
+            return httpx.Response(200, json={"ok": True, "result": {"status": "PENDING"}})
+        return httpx.Response(200, json={"ok": True, "result": {"payId": "pay-1", "payUrl": "https://maib.test/pay-1"}})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(MaibPaymentService, "http_client", client)
+    yield MaibPaymentService
+    asyncio.run(client.aclose())
@@ -0,0 +1,155 @@
+"""
+Benchmark-uri pentru căile critice ale backend-ului (checkout MAIB și status checks).
+
+Rulare (din rădăcina repo-ului):
+    pytest tests/test_benchmarks.py --benchmark-only
+
+Baseline-urile sunt per mașină (pytest-benchmark le grupează după interpretor și platformă), deci
+nu sunt comise (tests/.benchmarks/ este în .gitignore). Pentru a verifica o schimbare, salvează
+întâi un baseline local pe commit-ul de referință, apoi compară pe aceeași mașină:
+    git stash  # sau git checkout <commit-ul de referință>
+    pytest tests/test_benchmarks.py --benchmark-only \\
+        --benchmark-storage=tests/.benchmarks --benchmark-save=baseline
+    git stash pop
+
+Verificarea regresiilor: eșuează dacă mediana unui benchmark crește cu peste 25% față de
+cel mai recent baseline salvat:
+    pytest tests/test_benchmarks.py --benchmark-only \\
+        --benchmark-storage=tests/.benchmarks --benchmark-compare \\
+        --benchmark-compare-fail=median:25%
+
+test_cold_import urmărește pornirea la rece (importul aplicației într-un proces nou, ca la un
+worker serverless). Pentru detalii per modul: cd backend && python -X importtime -c "import server"
+"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from .conftest import BACKEND_DIR
+
+pytest.importorskip("pytest_benchmark")
+httpx = pytest.importorskip("httpx")
+
+SESSION_REQUEST = {
+    "amount": 1250.5,
+    "currency": "MDL",
+    "orderId": "ORD-1001",
+    "orderDescription": "Comandă Address Beauty",
+    "customerEmail": "client@example.com",
+    "customerName": "Client Test",
+    "customerPhone": "+37360000000",
+    "callbackUrl": "https://example.com/api/payment/maib/callback",
+    "redirectUrl": "https://example.com/plata-reusita",
+    "language": "ro",
+    "items": [
+        {"id": f"gene-{i}", "name": f"Gene {i} mm", "price": 12.5 + i % 7, "quantity": 1 + i % 3}
+        for i in range(500)
+    ],
+}
+
+CALLBACK_PAYLOAD = {
+    "result": {
+        "payId": "f16a9006-128a-46bc-8e2a-77a6ee99df75",
+        "orderId": "ORD-1001",
+        "status": "OK",
+        "statusCode": "000",
+        "statusMessage": "Approved",
+        "threeDs": "AUTHENTICATED",
+        "rrn": "331711380059",
+        "approval": "327593",
+        "cardNumber": "510218******1124",
+        "amount": 1250.5,
+        "currency": "MDL",
+    },
+    "signature": "ZcrbA6Yq2hcAhtJnB1sInxTtFvLcPFt0Hvq1LtHnW1o=",
+}
+
+
+def _asgi_client(server):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+
+
+def test_generate_signature(benchmark):
+    from maib_service import MaibPaymentService
+
+    data = {**CALLBACK_PAYLOAD["result"], "signature": "ignored"}
+    signature = benchmark(MaibPaymentService.generate_signature, data)
+    assert len(signature) == 64
+
+
+def test_build_pay_payload(benchmark):
+    from maib_service import MaibPaymentService
+
+    payload = benchmark(MaibPaymentService.build_pay_payload, SESSION_REQUEST)
+    assert len(payload["items"]) == 500
+    assert payload["callBackUrl"] == SESSION_REQUEST["callbackUrl"]
+
+
+def test_create_payment_session_mocked_maib(benchmark, loop, fake_maib):
+    request_data = {**SESSION_REQUEST, "items": SESSION_REQUEST["items"][:20]}
+
+    result = benchmark(lambda: loop.run_until_complete(fake_maib.create_payment_session(request_data)))
+    assert result["payId"] == "pay-1"
+
+
+def test_session_request_validation(benchmark):
+    from server import MaibPaymentSessionRequest
+
+    model = benchmark(MaibPaymentSessionRequest, **SESSION_REQUEST)
+    assert len(model.items) == 500
+
+
+def test_callback_parsing(benchmark, loop, server_app, monkeypatch):
+    submitted = []
+
+    async def submit(payload):
+        submitted.append(payload)
+
+    # măsurăm doar parsarea și răspunsul; procesarea din coadă are benchmark-ul ei
+    monkeypatch.setattr(server_app.maib_callback_queue, "submit", submit)
+    client = _asgi_client(server_app)
+    body = json.dumps(CALLBACK_PAYLOAD).encode("utf-8")
+
+    async def post_callback():
+        return await client.post(
+            "/api/payment/maib/callback", content=body, headers={"content-type": "application/json"}
+        )
+
+    response = benchmark(lambda: loop.run_until_complete(post_callback()))
+    assert response.json()["isSuccess"] is True
+    assert submitted
+
+
+def test_get_status_checks(benchmark, loop, server_app, fake_db):
+    started = datetime(2024, 1, 1)
+    loop.run_until_complete(fake_db.status_checks.insert_many([
+        {"id": f"{i:08d}", "client_name": f"agent-{i % 50}", "timestamp": started + timedelta(seconds=i)}
+        for i in range(5000)
+    ]))
+    client = _asgi_client(server_app)
+
+    async def get_page():
+        return await client.get("/api/status", params={"limit": 500})
+
+    response = benchmark(lambda: loop.run_until_complete(get_page()))
+    assert len(response.json()) == 500
+    assert response.headers["x-next-cursor"]
+
+
+def test_cold_import(benchmark):
+    # importul nu deschide conexiuni (MongoDB este creat la prima operație) și nu cere MONGO_URL
+    env = {key: value for key, value in os.environ.items() if key not in ("MONGO_URL", "DB_NAME")}
+    command = [
+        sys.executable, "-c",
+        "import server; assert not server.db.connected; assert server.app.router.lifespan_context",
+    ]
+
+    def cold_import():
+        return subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+
+    result = benchmark.pedantic(cold_import, rounds=5, iterations=1, warmup_rounds=1)
+    assert result.returncode == 0, result.stderr
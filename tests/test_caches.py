@@ -0,0 +1,94 @@
+"""
+Cache-urile in-process: încărcările simultane pentru aceeași cheie fac un singur apel, iar o
+invalidare în timpul unei încărcări nu lasă în cache valoarea de dinainte de schimbare.
+"""
+import asyncio
+
+
+def test_status_cache_coalesces_concurrent_loads(loop):
+    from maib_status_cache import PaymentStatusCache
+
+    cache = PaymentStatusCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"payId": "pay-1", "status": "PENDING"}
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("pay-1", loader) for _ in range(20)))
+
+    results = loop.run_until_complete(run())
+    assert len(calls) == 1
+    assert all(result["status"] == "PENDING" for result in results)
+    assert cache.stats()["coalesced"] == 19
+
+
+def test_status_cache_invalidation_during_load_drops_the_stale_result(loop):
+    from maib_status_cache import PaymentStatusCache
+
+    cache = PaymentStatusCache()
+    statuses = iter(["OK", "REVERSED"])
+
+    async def loader():
+        status = next(statuses)
+        await asyncio.sleep(0.01)
+        return {"payId": "pay-1", "status": status}
+
+    async def run():
+        stale = asyncio.ensure_future(cache.get_or_load("pay-1", loader))
+        await asyncio.sleep(0)
+        # refund-ul invalidează cât timp citirea de dinainte este în curs
+        cache.invalidate("pay-1")
+        fresh = await cache.get_or_load("pay-1", loader)
+        return (await stale)["status"], fresh["status"], cache.get("pay-1")["status"]
+
+    assert loop.run_until_complete(run()) == ("OK", "REVERSED", "REVERSED")
+
+
+def test_catalog_version_change_during_load_is_not_cached(loop):
+    from catalog_cache import CatalogCache
+
+    versions = iter([1, 2])
+    cache = CatalogCache(lambda: asyncio.sleep(0, next(versions)), version_check_interval=0)
+    values = iter(["old", "new"])
+
+    async def loader():
+        value = next(values)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        stale = asyncio.ensure_future(cache.get_or_load("groups", loader))
+        await asyncio.sleep(0.001)
+        # trigger-ul a incrementat versiunea: golirea scoate și încărcarea în curs
+        fresh = await cache.get_or_load("groups", loader)
+        return await stale, fresh, cache.get("groups")
+
+    assert loop.run_until_complete(run()) == ("old", "new", "new")
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_stock_invalidation_during_batch_load_is_not_overwritten(loop):
+    from stock_availability import StockAvailability
+
+    loads = []
+
+    async def loader(product_ids):
+        loads.append(list(product_ids))
+        await asyncio.sleep(0.01)
+        return [{"product_id": product_id, "store_stock": 5} for product_id in product_ids]
+
+    stock = StockAvailability(loader, ttl=60)
+
+    async def run():
+        reading = asyncio.ensure_future(stock.get_stock([1, 2]))
+        await asyncio.sleep(0)
+        # o comandă scade stocul produsului 1 în timpul citirii
+        stock.invalidate([1])
+        await reading
+        await stock.get_stock([1, 2])
+
+    loop.run_until_complete(run())
+    assert loads == [[1, 2], [1]]
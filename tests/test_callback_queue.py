@@ -0,0 +1,112 @@
+"""
+Coada de callback-uri MAIB: fiecare callback din inbox este procesat o singură dată chiar dacă
+ajunge de mai multe ori în coadă, eșecurile sunt reîncercate până la max_attempts, iar un
+callback blocat de alt worker este preluat doar după expirarea lock-ului.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+
+class Handler:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self, payload):
+        self.calls.append(payload["payId"])
+        await asyncio.sleep(0.001)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Supabase 503")
+
+
+def _queue(fake_db, handler, **kwargs):
+    from maib_callback_queue import CallbackQueue
+
+    options = {"workers": 3, "retry_base_delay": 0, "sweep_interval": 0.01, "lock_seconds": 60}
+    options.update(kwargs)
+    return CallbackQueue(fake_db.maib_callback_inbox, handler, **options)
+
+
+async def _drain(queue, doc_ids, statuses=("done", "failed")):
+    for _ in range(500):
+        docs = await queue.collection.find({"_id": {"$in": doc_ids}}).to_list(None)
+        if len(docs) == len(doc_ids) and all(doc["status"] in statuses for doc in docs):
+            return {doc["_id"]: doc for doc in docs}
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"callbacks not processed: {docs}")
+
+
+def test_callback_is_processed_once_even_if_swept_again(loop, fake_db):
+    handler = Handler()
+    queue = _queue(fake_db, handler)
+
+    async def run():
+        queue.start()
+        try:
+            doc_id = await queue.submit({"payId": "pay-1"})
+            # sweeper-ul și o reluare manuală pun același document din nou în coadă
+            queue._enqueue(doc_id, {"payId": "pay-1"})
+            await queue.collection.update_one({"_id": doc_id}, {"$set": {"nextAttemptAt": datetime.utcnow()}})
+            docs = await _drain(queue, [doc_id])
+            await asyncio.sleep(0.05)
+            return docs[doc_id]
+        finally:
+            await queue.stop()
+
+    doc = loop.run_until_complete(run())
+    assert doc["status"] == "done" and "lockedBy" not in doc
+    assert handler.calls == ["pay-1"]
+
+
+def test_failures_are_retried_then_marked_failed(loop, fake_db):
+    handler = Handler(failures=10)
+    queue = _queue(fake_db, handler, max_attempts=3)
+
+    async def run():
+        queue.start()
+        try:
+            doc_id = await queue.submit({"payId": "pay-1"})
+            return (await _drain(queue, [doc_id]))[doc_id]
+        finally:
+            await queue.stop()
+
+    doc = loop.run_until_complete(run())
+    assert doc["status"] == "failed" and doc["attempts"] == 3
+    assert handler.calls == ["pay-1"] * 3
+    assert queue.retried == 2 and queue.failed == 1
+
+
+def test_transient_failure_is_retried_until_done(loop, fake_db):
+    handler = Handler(failures=1)
+    queue = _queue(fake_db, handler)
+
+    async def run():
+        queue.start()
+        try:
+            doc_id = await queue.submit({"payId": "pay-1"})
+            return (await _drain(queue, [doc_id], statuses=("done",)))[doc_id]
+        finally:
+            await queue.stop()
+
+    doc = loop.run_until_complete(run())
+    assert doc["status"] == "done" and doc["attempts"] == 1
+    assert handler.calls == ["pay-1"] * 2
+
+
+def test_locked_callback_is_taken_over_only_after_the_lock_expires(loop, fake_db):
+    queue = _queue(fake_db, Handler())
+
+    async def run():
+        now = datetime.utcnow()
+        await queue.collection.insert_many([
+            {"_id": "held", "payload": {"payId": "pay-1"}, "status": "processing", "attempts": 0,
+             "lockedBy": "other-worker", "lockedUntil": now + timedelta(seconds=60), "nextAttemptAt": now},
+            {"_id": "abandoned", "payload": {"payId": "pay-2"}, "status": "processing", "attempts": 0,
+             "lockedBy": "other-worker", "lockedUntil": now - timedelta(seconds=1), "nextAttemptAt": now},
+            {"_id": "finished", "payload": {"payId": "pay-3"}, "status": "done", "attempts": 0,
+             "nextAttemptAt": now},
+        ])
+        return [await queue._claim(doc_id) for doc_id in ("held", "abandoned", "finished")]
+
+    assert loop.run_until_complete(run()) == [False, True, False]
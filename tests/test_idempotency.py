@@ -0,0 +1,99 @@
+"""
+Idempotența sesiunilor MAIB: request-urile simultane pentru același (orderId, amount) fac un
+singur /v1/pay, reîncercările primesc sesiunea deja creată, iar o sumă schimbată creează alta.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+
+class Creator:
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return {"orderId": "ORD-1", "payId": f"pay-{self.calls}", "formUrl": f"https://maib.test/pay-{self.calls}"}
+
+
+def test_concurrent_requests_share_one_session(loop):
+    from maib_idempotency import SessionIdempotency
+
+    idempotency = SessionIdempotency()
+    creator = Creator()
+    request = {"orderId": "ORD-1", "amount": 150}
+
+    async def run():
+        sessions = await asyncio.gather(*(idempotency.create_once(request, creator) for _ in range(10)))
+        retry = await idempotency.create_once({"orderId": "ORD-1", "amount": "150.00"}, creator)
+        return sessions, retry
+
+    sessions, retry = loop.run_until_complete(run())
+    assert creator.calls == 1
+    assert {session["payId"] for session in sessions} == {"pay-1"}
+    assert retry["payId"] == "pay-1"
+    assert idempotency.stats()["coalesced"] == 9 and idempotency.stats()["inflight"] == 0
+
+
+def test_changed_amount_or_forgotten_order_creates_a_new_session(loop):
+    from maib_idempotency import SessionIdempotency
+
+    idempotency = SessionIdempotency()
+    creator = Creator()
+
+    async def run():
+        first = await idempotency.create_once({"orderId": "ORD-1", "amount": 150}, creator)
+        changed = await idempotency.create_once({"orderId": "ORD-1", "amount": 175}, creator)
+        idempotency.forget("ORD-1")
+        again = await idempotency.create_once({"orderId": "ORD-1", "amount": 150}, creator)
+        return first, changed, again
+
+    first, changed, again = loop.run_until_complete(run())
+    assert [first["payId"], changed["payId"], again["payId"]] == ["pay-1", "pay-2", "pay-3"]
+
+
+def test_failed_creation_is_not_remembered(loop):
+    from maib_idempotency import SessionIdempotency
+
+    idempotency = SessionIdempotency()
+    creator = Creator(RuntimeError("MAIB 503"))
+    request = {"orderId": "ORD-1", "amount": 150}
+
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(idempotency.create_once(request, creator))
+    creator.error = None
+    assert loop.run_until_complete(idempotency.create_once(request, creator))["payId"] == "pay-2"
+
+
+class Ledger:
+    def __init__(self, entry):
+        self.entry = entry
+
+    async def find_recent_session(self, order_id, amount, since):
+        if self.entry and (order_id, amount) == (self.entry["orderId"], self.entry["amount"]):
+            return self.entry
+        return None
+
+
+def test_session_created_by_another_worker_is_reused(loop):
+    from maib_idempotency import SessionIdempotency
+
+    creator = Creator()
+    live = SessionIdempotency(ledger=Ledger({
+        "orderId": "ORD-1", "amount": 150.0, "payId": "pay-other", "formUrl": "https://maib.test/pay-other",
+    }))
+    session = loop.run_until_complete(live.create_once({"orderId": "ORD-1", "amount": 150}, creator))
+    assert session["payId"] == "pay-other" and creator.calls == 0
+
+    # o sesiune expirată la MAIB nu mai este refolosită
+    expired = SessionIdempotency(ledger=Ledger({
+        "orderId": "ORD-1", "amount": 150.0, "payId": "pay-other", "formUrl": "https://maib.test/pay-other",
+        "expiresAt": (datetime.utcnow() - timedelta(minutes=1)).isoformat() + "Z",
+    }))
+    session = loop.run_until_complete(expired.create_once({"orderId": "ORD-1", "amount": 150}, creator))
+    assert session["payId"] == "pay-1" and creator.calls == 1
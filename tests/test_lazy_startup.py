@@ -0,0 +1,20 @@
+"""
+Pornirea leneșă: importul aplicației nu creează clientul MongoDB și nu cere MONGO_URL,
+indiferent de componentele opționale activate.
+"""
+import os
+import subprocess
+import sys
+
+from .conftest import BACKEND_DIR
+
+
+def test_import_with_batched_status_writes_stays_lazy():
+    env = {key: value for key, value in os.environ.items() if key not in ("MONGO_URL", "DB_NAME")}
+    env["STATUS_CHECKS_BATCH_WRITES"] = "true"
+    command = [
+        sys.executable, "-c",
+        "import server; assert not server.db.connected; assert server.status_check_batcher.name == 'status_checks'",
+    ]
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,57 @@
+"""
+Registrul plăților MAIB: un document per payId, un status final nu este suprascris de unul
+intermediar, iar între statusurile finale sunt permise doar tranzițiile reale (OK → REVERSED).
+"""
+import pytest
+
+
+@pytest.fixture
+def ledger(fake_db):
+    from maib_ledger import PaymentLedger
+
+    return PaymentLedger(fake_db.maib_payments)
+
+
+def _status_after(loop, ledger, *statuses):
+    async def run():
+        for status in statuses:
+            await ledger.record_status({"payId": "pay-1", "status": status})
+        count = await ledger.collection.count_documents({"payId": "pay-1"})
+        return (await ledger.get("pay-1"))["status"], count
+
+    return loop.run_until_complete(run())
+
+
+@pytest.mark.parametrize("statuses, expected", [
+    (("PENDING", "OK"), "OK"),
+    # poll / callback întârziat după statusul final
+    (("OK", "PENDING"), "OK"),
+    (("OK", "REVERSED"), "REVERSED"),
+    # callback OK relivrat după refund
+    (("OK", "REVERSED", "OK"), "REVERSED"),
+    (("OK", "REFUNDED", "APPROVED"), "REFUNDED"),
+    (("FAILED", "OK"), "FAILED"),
+    (("FAILED", "REVERSED"), "FAILED"),
+    (("EXPIRED", "FAILED"), "EXPIRED"),
+    (("OK", "OK"), "OK"),
+])
+def test_terminal_status_transitions(loop, ledger, statuses, expected):
+    assert _status_after(loop, ledger, *statuses) == (expected, 1)
+
+
+def test_late_update_does_not_create_a_second_document(loop, ledger):
+    # fără indexul unic (ex. ensure_indexes eșuat) un update blocat nu inserează alt document
+    assert _status_after(loop, ledger, "REVERSED", "PENDING", "OK") == ("REVERSED", 1)
+
+
+def test_query_string_callback_amount_matches_the_session(loop, ledger):
+    from datetime import datetime, timedelta
+
+    async def run():
+        await ledger.record_session({"orderId": "ORD-1", "amount": 150, "currency": "MDL"}, {"payId": "pay-1"})
+        await ledger.record_callback({"payId": "pay-1", "orderId": "ORD-1", "status": "PENDING", "amount": "150.00"})
+        return await ledger.find_recent_session("ORD-1", 150.0, datetime.utcnow() - timedelta(minutes=1))
+
+    session = loop.run_until_complete(run())
+    assert session["payId"] == "pay-1"
+    assert session["amount"] == 150.0
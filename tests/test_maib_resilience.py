@@ -0,0 +1,134 @@
+"""
+Circuit breaker-ul și reîncercările din fața MAIB: circuitul se deschide după eșecuri consecutive
+și lasă un singur apel de probă, iar apelurile ne-idempotente se reîncearcă doar dacă nu au plecat.
+"""
+import time
+
+import httpx
+import pytest
+
+
+def test_breaker_opens_after_threshold_and_allows_a_single_probe():
+    from maib_resilience import CircuitBreaker, MaibCircuitOpenError
+
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=0.05)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(MaibCircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # cât timp proba este în zbor, celelalte apeluri sunt refuzate
+    with pytest.raises(MaibCircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    assert breaker.stats()["rejected"] == 2 and breaker.opened_count == 1
+
+
+def test_failed_probe_reopens_and_released_probe_frees_the_slot():
+    from maib_resilience import CircuitBreaker, MaibCircuitOpenError
+
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened_count == 2
+    with pytest.raises(MaibCircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    # proba anulată fără rezultat nu blochează circuitul în half-open
+    breaker.release_probe()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+@pytest.fixture
+def maib_http(monkeypatch):
+    """MaibPaymentService cu breaker/admisie proaspete și un transport MAIB controlat de test."""
+    from maib_resilience import MAIB_RETRY_CONFIG, AdmissionController, CircuitBreaker
+    from maib_service import MaibPaymentService
+
+    monkeypatch.setitem(MAIB_RETRY_CONFIG, "base_delay", 0)
+    monkeypatch.setitem(MAIB_RETRY_CONFIG, "max_attempts", 3)
+    monkeypatch.setitem(MAIB_RETRY_CONFIG, "connect_max_attempts", 2)
+    monkeypatch.setattr(MaibPaymentService, "circuit_breaker", CircuitBreaker(failure_threshold=3, open_seconds=60))
+    monkeypatch.setattr(MaibPaymentService, "admission", AdmissionController())
+
+    def install(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(MaibPaymentService, "http_client", client)
+        return client
+
+    return MaibPaymentService, install
+
+
+def test_non_idempotent_request_retries_only_connect_errors(loop, maib_http):
+    service, install = maib_http
+    attempts = []
+
+    def refuse(request):
+        attempts.append(request.url.path)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    install(refuse)
+    with pytest.raises(httpx.ConnectError):
+        loop.run_until_complete(service._request(
+            "pay", "POST", "https://maib.test/v1/pay", idempotent=False, authenticated=False, json={}
+        ))
+    assert len(attempts) == 2
+
+    attempts.clear()
+
+    def read_timeout(request):
+        attempts.append(request.url.path)
+        raise httpx.ReadTimeout("read timeout", request=request)
+
+    install(read_timeout)
+    # request-ul a plecat: o plată nu se retrimite
+    with pytest.raises(httpx.ReadTimeout):
+        loop.run_until_complete(service._request(
+            "pay", "POST", "https://maib.test/v1/pay", idempotent=False, authenticated=False, json={}
+        ))
+    assert len(attempts) == 1
+
+
+def test_open_circuit_rejects_without_calling_maib(loop, maib_http):
+    from maib_resilience import MaibCircuitOpenError
+
+    service, install = maib_http
+    calls = []
+
+    def unavailable(request):
+        calls.append(request.url.path)
+        return httpx.Response(503)
+
+    install(unavailable)
+
+    async def run():
+        resp = await service._request(
+            "pay-info", "GET", "https://maib.test/v1/pay-info/pay-1", idempotent=True, authenticated=False
+        )
+        with pytest.raises(MaibCircuitOpenError):
+            await service._request(
+                "pay-info", "GET", "https://maib.test/v1/pay-info/pay-1", idempotent=True, authenticated=False
+            )
+        return resp
+
+    resp = loop.run_until_complete(run())
+    assert resp.status_code == 503
+    # reîncercările primului apel deschid circuitul; al doilea nu mai pleacă spre MAIB
+    assert len(calls) == 3
+    assert service.circuit_breaker.state == "open"
@@ -0,0 +1,122 @@
+"""
+Token-ul MAIB: request-urile simultane împart un singur /v1/generate-token, un 401 duce la un
+singur refresh forțat, iar workerii cu store partajat generează token-ul o singură dată (lease).
+"""
+import asyncio
+
+import httpx
+import pytest
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return f"token-{self.calls}", 300
+
+
+def test_concurrent_requests_share_one_token_fetch(loop):
+    from maib_token import MaibTokenManager
+
+    fetcher = Fetcher()
+    manager = MaibTokenManager(fetcher)
+
+    async def run():
+        tokens = await asyncio.gather(*(manager.get_token() for _ in range(20)))
+        return tokens, await manager.get_token()
+
+    tokens, cached = loop.run_until_complete(run())
+    assert fetcher.calls == 1
+    assert set(tokens) == {"token-1"} and cached == "token-1"
+
+
+def test_forced_refresh_after_invalidate_fetches_a_new_token(loop):
+    from maib_token import MaibTokenManager
+
+    fetcher = Fetcher()
+    manager = MaibTokenManager(fetcher)
+
+    async def run():
+        await manager.get_token()
+        manager.invalidate()
+        refreshed = await asyncio.gather(*(manager.refresh(force=True) for _ in range(5)))
+        return refreshed, await manager.get_token()
+
+    refreshed, current = loop.run_until_complete(run())
+    assert fetcher.calls == 2
+    assert set(refreshed) == {"token-2"} and current == "token-2"
+
+
+def test_failed_fetch_is_not_cached(loop):
+    from maib_token import MaibTokenManager
+
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("MAIB 503")
+        return "token", 300
+
+    manager = MaibTokenManager(fetcher)
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(manager.get_token())
+    assert loop.run_until_complete(manager.get_token()) == "token"
+    assert len(calls) == 2
+
+
+def test_workers_sharing_the_store_fetch_once(loop, fake_db):
+    from maib_token import MaibTokenManager, MongoTokenStore
+
+    fetcher = Fetcher()
+    store = MongoTokenStore(fake_db.maib_tokens)
+    workers = [MaibTokenManager(fetcher, store=store, lease_seconds=5) for _ in range(3)]
+
+    async def run():
+        return await asyncio.gather(*(worker.get_token() for worker in workers))
+
+    tokens = loop.run_until_complete(run())
+    assert fetcher.calls == 1
+    assert tokens == ["token-1"] * 3
+    stored = loop.run_until_complete(fake_db.maib_tokens.find_one({"_id": MongoTokenStore.DOC_ID}))
+    assert stored["accessToken"] == "token-1" and "leaseOwner" not in stored
+
+
+def test_unauthorized_response_refreshes_the_token_once(loop, monkeypatch):
+    from maib_resilience import AdmissionController, CircuitBreaker
+    from maib_service import MaibPaymentService
+    from maib_token import MaibTokenManager
+
+    issued = []
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/generate-token"):
+            issued.append(f"token-{len(issued) + 1}")
+            return httpx.Response(200, json={"ok": True, "result": {"accessToken": issued[-1], "expiresIn": 300}})
+        seen.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "Bearer token-1":
+            return httpx.Response(401, json={"ok": False})
+        return httpx.Response(200, json={"ok": True, "result": {"payId": "pay-1", "status": "OK"}})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(MaibPaymentService, "http_client", client)
+    monkeypatch.setattr(MaibPaymentService, "circuit_breaker", CircuitBreaker())
+    monkeypatch.setattr(MaibPaymentService, "admission", AdmissionController())
+    monkeypatch.setattr(
+        MaibPaymentService, "token_manager", MaibTokenManager(MaibPaymentService.generate_access_token)
+    )
+
+    async def run():
+        try:
+            return await MaibPaymentService.check_payment_status("pay-1")
+        finally:
+            await client.aclose()
+
+    result = loop.run_until_complete(run())
+    assert result["status"] == "OK"
+    assert issued == ["token-1", "token-2"]
+    assert seen == ["Bearer token-1", "Bearer token-2"]
@@ -0,0 +1,73 @@
+"""
+Tranziția orders.maib_payment_status: o eroare Supabase nu este înghițită, plata rămâne fără
+status final în registru și este reîncercată (de coada de callback-uri sau de reconciliere).
+"""
+import pytest
+
+
+class FlakySupabase:
+    def __init__(self, failures):
+        self.failures = failures
+        self.updates = []
+
+    async def update(self, table, filters, values):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Supabase 503")
+        self.updates.append((table, filters, values))
+        return 1
+
+
+@pytest.fixture
+def supabase(server_app, monkeypatch):
+    fake = FlakySupabase(failures=1)
+    monkeypatch.setattr(server_app.SupabaseRest, "enabled", staticmethod(lambda: True))
+    monkeypatch.setattr(server_app.SupabaseRest, "update", fake.update)
+    monkeypatch.setitem(server_app.MAIB_CONFIG, "callback_signature_mode", "off")
+    return fake
+
+
+def test_failed_order_update_is_retried_by_the_callback_queue(loop, server_app, supabase, fake_db):
+    callback = {"result": {"payId": "pay-1", "orderId": "ORD-1", "status": "OK", "amount": "150"}}
+
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(server_app.process_maib_callback(callback))
+    entry = loop.run_until_complete(fake_db.maib_payments.find_one({"payId": "pay-1"}))
+    assert entry is None or not entry.get("terminal")
+
+    # reîncercarea cozii aplică tranziția, apoi registrul marchează plata ca finalizată
+    loop.run_until_complete(server_app.process_maib_callback(callback))
+    entry = loop.run_until_complete(fake_db.maib_payments.find_one({"payId": "pay-1"}))
+    assert entry["status"] == "OK" and entry["terminal"] is True
+    assert supabase.updates == [("orders", {"maib_pay_id": "eq.pay-1"}, {"maib_payment_status": "SUCCESS"})]
+
+
+def test_failed_order_update_is_retried_by_the_reconciler(loop, server_app, supabase, fake_db):
+    from datetime import datetime, timedelta
+
+    from maib_reconciler import MAIB_RECONCILE_CONFIG, PaymentReconciler
+
+    async def checker(pay_id, order_id):
+        return {"payId": pay_id, "orderId": order_id, "status": "OK"}
+
+    reconciler = PaymentReconciler(
+        fake_db.maib_payments, fake_db.maib_leases, checker, server_app._apply_reconciled_status,
+        {**MAIB_RECONCILE_CONFIG, "min_age_minutes": 0, "rate_per_second": 0},
+    )
+
+    async def run():
+        await fake_db.maib_payments.insert_one({
+            "payId": "pay-1", "orderId": "ORD-1", "status": "PENDING", "terminal": False,
+            "updatedAt": datetime.utcnow() - timedelta(minutes=5),
+        })
+        first = await reconciler.run_once()
+        pending = await fake_db.maib_payments.find_one({"payId": "pay-1"})
+        second = await reconciler.run_once()
+        return first, pending, second, await fake_db.maib_payments.find_one({"payId": "pay-1"})
+
+    first, pending, second, entry = loop.run_until_complete(run())
+    assert first["errors"] == 1
+    assert pending["status"] == "PENDING"
+    assert second["errors"] == 0
+    assert entry["status"] == "OK" and entry["terminal"] is True
+    assert len(supabase.updates) == 1
@@ -0,0 +1,148 @@
+"""
+Limitarea per client pe endpoint-urile de plată: cheia este adresa văzută de proxy-ul de
+încredere (sau adresa conexiunii), deci un client care rotește X-Forwarded-For nu scapă de limită. Apelurile către MAIB trec
+apoi prin controlul admisiei: peste limită așteaptă într-o coadă mărginită sau sunt refuzate.
+"""
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+BURST = 5
+
+
+@pytest.fixture
+def limited(server_app, fake_maib, monkeypatch):
+    from rate_limit import RATE_LIMIT_CONFIG, TokenBucketLimiter
+
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "enabled", True)
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "trusted_proxy_hops", 0)
+    monkeypatch.setattr(server_app, "payment_rate_limiter", TokenBucketLimiter(rate=0.01, burst=BURST))
+    return server_app
+
+
+def _poll(loop, server, headers_for):
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app, client=("203.0.113.7", 50000)),
+            base_url="http://test",
+        ) as client:
+            return [
+                (await client.post(
+                    "/api/payment/maib/status", json={"payId": f"pay-{i}"}, headers=headers_for(i)
+                )).status_code
+                for i in range(BURST * 3)
+            ]
+
+    return loop.run_until_complete(run())
+
+
+def test_rotating_forwarded_for_does_not_escape_the_bucket(loop, limited):
+    statuses = _poll(loop, limited, lambda i: {"x-forwarded-for": f"10.0.0.{i}"})
+    assert statuses.count(200) == BURST
+    assert statuses.count(429) == BURST * 2
+
+
+def test_trusted_proxy_address_is_the_key(loop, limited, monkeypatch):
+    from rate_limit import RATE_LIMIT_CONFIG
+
+    # în spatele unui proxy: clientul controlează doar intrările din stânga celei adăugate de proxy
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "trusted_proxy_hops", 1)
+    statuses = _poll(loop, limited, lambda i: {"x-forwarded-for": f"10.0.0.{i}, 198.51.100.20"})
+    assert statuses.count(200) == BURST
+    assert statuses.count(429) == BURST * 2
+
+
+def test_limiter_stays_off_until_proxy_hops_are_set(loop, limited, monkeypatch):
+    from rate_limit import RATE_LIMIT_CONFIG
+
+    # în spatele unui proxy nedeclarat toți clienții ar avea adresa proxy-ului: fără limitare
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "trusted_proxy_hops", None)
+    statuses = _poll(loop, limited, lambda i: {"x-forwarded-for": f"10.0.0.{i}"})
+    assert statuses == [200] * (BURST * 3)
+
+
+def test_maib_client_ip_is_the_first_forwarded_address(loop, limited, monkeypatch):
+    from rate_limit import RATE_LIMIT_CONFIG
+
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "trusted_proxy_hops", 1)
+    sent = []
+
+    async def create_payment_session(request_data):
+        sent.append(request_data["clientIp"])
+        return {
+            "orderId": request_data["orderId"], "payId": "pay-1",
+            "formUrl": "https://maib.test/pay-1", "redirectUrl": "https://maib.test/pay-1",
+        }
+
+    monkeypatch.setattr(limited.MaibPaymentService, "create_payment_session", create_payment_session)
+
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=limited.app, client=("203.0.113.7", 50000)),
+            base_url="http://test",
+        ) as client:
+            return await client.post(
+                "/api/payment/maib/session",
+                json={
+                    "amount": 10.0, "orderId": "ORD-1", "orderDescription": "Comandă",
+                    "customerEmail": "client@example.com", "customerName": "Client Test",
+                    "callbackUrl": "https://example.com/callback", "redirectUrl": "https://example.com/ok",
+                },
+                headers={"x-forwarded-for": "198.51.100.9, 10.0.0.1"},
+            )
+
+    response = loop.run_until_complete(run())
+    assert response.status_code == 200, response.text
+    # MAIB primește adresa cumpărătorului, nu a proxy-ului folosită drept cheie de limitare
+    assert sent == ["198.51.100.9"]
+
+
+def test_client_address():
+    from rate_limit import client_address
+
+    assert client_address("1.1.1.1, 2.2.2.2", "3.3.3.3", 0) == "3.3.3.3"
+    assert client_address("1.1.1.1, 2.2.2.2", "3.3.3.3", 1) == "2.2.2.2"
+    assert client_address("1.1.1.1, 2.2.2.2", "3.3.3.3", 2) == "1.1.1.1"
+    # lanț mai scurt decât numărul de proxy-uri de încredere: adresa conexiunii
+    assert client_address("2.2.2.2", "3.3.3.3", 2) == "3.3.3.3"
+    assert client_address(None, None, 1) == "127.0.0.1"
+    assert client_address("1.1.1.1", "3.3.3.3", None) == "3.3.3.3"
+
+
+def test_admission_queues_then_sheds_and_times_out(loop):
+    from maib_resilience import AdmissionController, MaibOverloadedError
+
+    admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+
+    async def hold(release):
+        async with admission.slot():
+            await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(release))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(hold(release))
+        await asyncio.sleep(0)
+        assert admission.in_flight == 1 and admission.queued == 1
+
+        # coada e plină: refuz imediat
+        with pytest.raises(MaibOverloadedError):
+            async with admission.slot():
+                pass
+        # cel din coadă nu prinde loc în queue_timeout
+        with pytest.raises(MaibOverloadedError):
+            await queued
+        release.set()
+        await holder
+
+        async with admission.slot():
+            pass
+
+    loop.run_until_complete(run())
+    stats = admission.stats()
+    assert stats["admitted"] == 2
+    assert stats["shed"] == 2 and stats["timedOut"] == 1
+    assert stats["inFlight"] == 0 and stats["queued"] == 0
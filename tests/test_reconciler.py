@@ -0,0 +1,91 @@
+"""
+Reconcilierea plăților MAIB: un singur worker deține lease-ul la un moment dat, plățile finale
+nu mai sunt reverificate, iar un circuit MAIB deschis nu amână plata cu backoff.
+"""
+from datetime import datetime, timedelta
+
+
+def _reconciler(fake_db, checker, on_result=None, **config):
+    from maib_reconciler import MAIB_RECONCILE_CONFIG, PaymentReconciler
+
+    async def record(entry, result):
+        pass
+
+    return PaymentReconciler(
+        fake_db.maib_payments, fake_db.maib_leases, checker, on_result or record,
+        {**MAIB_RECONCILE_CONFIG, "min_age_minutes": 0, "rate_per_second": 0, **config},
+    )
+
+
+async def _checker(pay_id, order_id):
+    return {"payId": pay_id, "orderId": order_id, "status": "OK"}
+
+
+def test_only_one_worker_holds_the_lease(loop, fake_db):
+    from maib_reconciler import LEASE_ID
+
+    first = _reconciler(fake_db, _checker)
+    second = _reconciler(fake_db, _checker)
+
+    async def run():
+        acquired = [await first._acquire_lease(), await second._acquire_lease(), await first._acquire_lease()]
+        # lease-ul expirat (worker oprit) este preluat de celălalt
+        await fake_db.maib_leases.update_one(
+            {"_id": LEASE_ID}, {"$set": {"leaseUntil": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        acquired += [await second._acquire_lease(), await first._acquire_lease()]
+        return acquired
+
+    assert loop.run_until_complete(run()) == [True, False, True, True, False]
+
+
+def test_only_unresolved_payments_are_checked(loop, fake_db):
+    checked = []
+    results = []
+
+    async def checker(pay_id, order_id):
+        checked.append(pay_id)
+        return await _checker(pay_id, order_id)
+
+    async def on_result(entry, result):
+        results.append((entry["payId"], result["status"]))
+
+    reconciler = _reconciler(fake_db, checker, on_result)
+
+    async def run():
+        old = datetime.utcnow() - timedelta(minutes=5)
+        await fake_db.maib_payments.insert_many([
+            {"payId": "pay-pending", "orderId": "ORD-1", "status": "PENDING", "terminal": False, "updatedAt": old},
+            {"payId": "pay-ok", "orderId": "ORD-2", "status": "OK", "terminal": True, "updatedAt": old},
+            {"payId": "pay-later", "orderId": "ORD-3", "status": "PENDING", "terminal": False, "updatedAt": old,
+             "nextReconcileAt": datetime.utcnow() + timedelta(minutes=10)},
+        ])
+        counts = await reconciler.run_once()
+        return counts, await fake_db.maib_payments.find_one({"payId": "pay-pending"})
+
+    counts, entry = loop.run_until_complete(run())
+    assert checked == ["pay-pending"]
+    assert results == [("pay-pending", "OK")]
+    assert counts == {"checked": 1, "resolved": 1, "errors": 0}
+    assert entry["reconcileAttempts"] == 1 and "nextReconcileAt" in entry
+
+
+def test_open_circuit_does_not_back_off_the_payment(loop, fake_db):
+    from maib_resilience import MaibCircuitOpenError
+
+    async def checker(pay_id, order_id):
+        raise MaibCircuitOpenError(30)
+
+    reconciler = _reconciler(fake_db, checker)
+
+    async def run():
+        await fake_db.maib_payments.insert_one({
+            "payId": "pay-1", "orderId": "ORD-1", "status": "PENDING", "terminal": False,
+            "updatedAt": datetime.utcnow() - timedelta(minutes=5),
+        })
+        counts = await reconciler.run_once()
+        return counts, await fake_db.maib_payments.find_one({"payId": "pay-1"})
+
+    counts, entry = loop.run_until_complete(run())
+    assert counts == {"checked": 0, "resolved": 0, "errors": 0}
+    assert "nextReconcileAt" not in entry and "reconcileAttempts" not in entry
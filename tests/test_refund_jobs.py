@@ -0,0 +1,146 @@
+"""
+Job-urile de refund: un refundId ajunge la MAIB o singură dată (job-uri simultane și endpoint-ul
+de refund individual), refund-urile parțiale repetate fără refundId sunt permise, iar erorile
+trecătoare MongoDB nu opresc runner-ul.
+"""
+import asyncio
+
+import pytest
+
+
+class Refunder:
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    async def __call__(self, pay_id, refund_amount):
+        self.calls.append((pay_id, refund_amount))
+        await asyncio.sleep(0.001)
+        if self.error is not None:
+            raise self.error
+        return {"ok": True, "payId": pay_id, "status": "REVERSED", "refundAmount": refund_amount}
+
+
+def _jobs(fake_db, refunder, claims=None):
+    from maib_refund_jobs import RefundJobs
+
+    return RefundJobs(
+        fake_db.maib_refund_jobs, fake_db.maib_refund_job_items,
+        claims if claims is not None else fake_db.maib_refund_claims,
+        refunder, lock_check_seconds=0.01,
+    )
+
+
+async def _wait(jobs, job_id):
+    for _ in range(500):
+        job = await jobs.get_job(job_id, include_items=True)
+        if job["status"] == "completed":
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not complete: {job}")
+
+
+def test_refund_id_is_sent_once_across_jobs_and_single_refunds(loop, fake_db):
+    from maib_refund_jobs import RefundConflictError
+
+    refunder = Refunder()
+    jobs = _jobs(fake_db, refunder)
+
+    async def run():
+        items = [{"payId": "pay-1", "refundAmount": 10.0, "refundId": "r-1"}]
+        first, second = await asyncio.gather(jobs.create_job(items), jobs.create_job(items))
+        done = [await _wait(jobs, first["jobId"]), await _wait(jobs, second["jobId"])]
+
+        # repetarea refund-ului individual întoarce rezultatul salvat, fără un nou apel
+        replay = await jobs.refund("pay-1", 10.0, "r-1")
+        with pytest.raises(RefundConflictError):
+            await jobs.refund("pay-1", 5.0, "r-1")
+        return done, replay
+
+    done, replay = loop.run_until_complete(run())
+    assert refunder.calls == [("pay-1", 10.0)]
+    statuses = sorted(job["items"][0]["status"] for job in done)
+    assert statuses == ["done", "skipped"]
+    assert replay["status"] == "REVERSED"
+
+
+def test_repeated_partial_refunds_without_refund_id_are_all_sent(loop, fake_db):
+    refunder = Refunder()
+    jobs = _jobs(fake_db, refunder)
+
+    async def run():
+        job = await jobs.create_job([{"payId": "pay-1", "refundAmount": 10.0}] * 2)
+        first = await _wait(jobs, job["jobId"])
+        await jobs.refund("pay-1", 10.0)
+        return first
+
+    job = loop.run_until_complete(run())
+    assert job["counts"]["done"] == 2
+    assert refunder.calls == [("pay-1", 10.0)] * 3
+
+
+def test_uncertain_refund_blocks_a_retry_with_the_same_refund_id(loop, fake_db):
+    from maib_refund_jobs import RefundConflictError
+    from maib_resilience import MaibUncertainResultError
+
+    refunder = Refunder(MaibUncertainResultError("read timeout"))
+    jobs = _jobs(fake_db, refunder)
+
+    async def run():
+        job = await jobs.create_job([{"payId": "pay-1", "refundId": "r-1"}])
+        done = await _wait(jobs, job["jobId"])
+        refunder.error = None
+        with pytest.raises(RefundConflictError):
+            await jobs.refund("pay-1", None, "r-1")
+        return done
+
+    job = loop.run_until_complete(run())
+    assert job["counts"]["uncertain"] == 1
+    assert len(refunder.calls) == 1
+
+
+def test_clear_refusal_releases_the_refund_id(loop, fake_db):
+    refunder = Refunder(Exception("MAIB refund failed: invalid amount"))
+    jobs = _jobs(fake_db, refunder)
+
+    async def run():
+        with pytest.raises(Exception):
+            await jobs.refund("pay-1", 10.0, "r-1")
+        refunder.error = None
+        return await jobs.refund("pay-1", 10.0, "r-1")
+
+    result = loop.run_until_complete(run())
+    assert result["status"] == "REVERSED"
+    assert len(refunder.calls) == 2
+
+
+class FlakyClaims:
+    """Colecția de revendicări, cu primele `failures` scrieri eșuate (MongoDB indisponibil)"""
+
+    def __init__(self, collection, failures):
+        self.collection = collection
+        self.failures = failures
+
+    async def update_one(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("connection pool paused")
+        return await self.collection.update_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_transient_mongo_errors_do_not_stop_the_job(loop, fake_db):
+    refunder = Refunder()
+    jobs = _jobs(fake_db, refunder, FlakyClaims(fake_db.maib_refund_claims, failures=3))
+
+    async def run():
+        job = await jobs.create_job([
+            {"payId": f"pay-{i}", "refundAmount": 1.0, "refundId": f"r-{i}"} for i in range(4)
+        ], concurrency=2)
+        return await _wait(jobs, job["jobId"])
+
+    job = loop.run_until_complete(run())
+    assert job["counts"]["done"] == 4
+    assert sorted(refunder.calls) == [(f"pay-{i}", 1.0) for i in range(4)]
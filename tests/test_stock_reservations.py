@@ -0,0 +1,143 @@
+"""
+Rezervările de stoc la checkout-ul MAIB: sute de checkout-uri simultane pe un produs cu stoc mic
+nu pot rezerva mai mult decât stocul (fără oversell), iar rezervările sunt eliberate / convertite.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+STOCK = 5
+CHECKOUTS = 300
+
+
+def _session_request(order_id, product_id=1, quantity=1):
+    return {
+        "amount": 150.0,
+        "currency": "MDL",
+        "orderId": order_id,
+        "orderDescription": "Comandă Address Beauty",
+        "customerEmail": "client@example.com",
+        "customerName": "Client Test",
+        "callbackUrl": "https://example.com/api/payment/maib/callback",
+        "redirectUrl": "https://example.com/plata-reusita",
+        "items": [{"id": product_id, "name": "Gene mătase C 0.07", "price": 150.0, "quantity": quantity}],
+    }
+
+
+@pytest.fixture
+def reservations(server_app, fake_db, monkeypatch):
+    from stock_reservations import StockReservations, STOCK_RESERVATION_CONFIG
+
+    committed = []
+    loads = []
+
+    async def load_stock(product_ids):
+        loads.append(list(product_ids))
+        # latență Supabase: rafala de checkout-uri ajunge la sync în același timp
+        await asyncio.sleep(0.01)
+        return {product_id: STOCK for product_id in product_ids}
+
+    async def commit(pay_id, items):
+        committed.append((pay_id, items))
+
+    service = StockReservations(
+        fake_db.stock_holds, fake_db.stock_reservations, load_stock, commit,
+        {**STOCK_RESERVATION_CONFIG, "enabled": True},
+    )
+    service.committed = committed
+    service.loads = loads
+    monkeypatch.setattr(server_app, "stock_reservations", service)
+    return service
+
+
+def test_concurrent_checkouts_do_not_oversell(loop, server_app, fake_maib, reservations, fake_db):
+    async def run():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server_app.app), base_url="http://test"
+        ) as client:
+            return await asyncio.gather(*(
+                client.post("/api/payment/maib/session", json=_session_request(f"ORD-{i}"))
+                for i in range(CHECKOUTS)
+            ))
+
+    responses = loop.run_until_complete(run())
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(200) == STOCK
+    assert statuses.count(409) == CHECKOUTS - STOCK
+    rejected = next(response.json() for response in responses if response.status_code == 409)
+    assert rejected["detail"]["productId"] == 1
+    assert rejected["detail"]["available"] == 0
+
+    hold = loop.run_until_complete(fake_db.stock_holds.find_one({"_id": 1}))
+    assert hold["reserved"] == STOCK
+    assert hold["available"] == 0
+    # stocul a fost citit din Supabase o singură dată pentru toată rafala
+    assert reservations.loads == [[1]]
+    active = loop.run_until_complete(fake_db.stock_reservations.count_documents({"status": "active"}))
+    assert active == STOCK
+
+
+def test_reservation_expires_and_converts(loop, reservations, fake_db):
+    from stock_reservations import InsufficientStockError
+
+    async def run():
+        await reservations.reserve("ORD-1", [{"id": 1, "quantity": 2}])
+        await reservations.attach_payment("ORD-1", "pay-1")
+        await reservations.reserve("ORD-2", [{"id": "1", "quantity": 3}])
+        await reservations.attach_payment("ORD-2", "pay-2")
+        with pytest.raises(InsufficientStockError) as error:
+            await reservations.reserve("ORD-3", [{"id": 1, "quantity": 1}])
+        assert error.value.available == 0
+
+        # ORD-2 este abandonată: rezervarea expiră și stocul redevine disponibil
+        await fake_db.stock_reservations.update_one(
+            {"_id": "ORD-2"}, {"$set": {"expiresAt": datetime.utcnow() - timedelta(minutes=1)}}
+        )
+        assert await reservations.sweep() == 1
+        assert (await fake_db.stock_holds.find_one({"_id": 1}))["available"] == 3
+
+        # plata ORD-1 reușește (callback-ul poate veni de mai multe ori)
+        assert await reservations.convert("pay-1") is True
+        assert await reservations.convert("pay-1") is False
+        return await fake_db.stock_holds.find_one({"_id": 1})
+
+    hold = loop.run_until_complete(run())
+    assert reservations.committed == [("pay-1", [{"productId": 1, "quantity": 2}])]
+    assert hold["stock"] == STOCK - 2
+    assert hold["reserved"] == 0
+    assert hold["available"] == 3
+
+
+def test_retried_checkout_with_a_changed_cart_is_not_paid_against_the_old_reservation(loop, reservations, fake_db):
+    from stock_reservations import ReservationConflictError
+
+    async def run():
+        # două request-uri simultane pentru aceeași comandă, cu coșuri diferite
+        outcomes = await asyncio.gather(
+            reservations.reserve("ORD-1", [{"id": 1, "quantity": 1}]),
+            reservations.reserve("ORD-1", [{"id": 1, "quantity": 3}]),
+            return_exceptions=True,
+        )
+        conflicts = [o for o in outcomes if isinstance(o, ReservationConflictError)]
+        assert len(conflicts) == 1
+
+        # reîncercare ulterioară cu alt coș: rezervarea veche este înlocuită
+        replaced = await reservations.reserve("ORD-1", [{"id": 1, "quantity": 2}])
+        assert replaced["items"] == [{"productId": 1, "quantity": 2}]
+        await reservations.attach_payment("ORD-1", "pay-1")
+        await reservations.convert("pay-1")
+
+        # comanda plătită nu poate primi un alt coș
+        with pytest.raises(ReservationConflictError):
+            await reservations.reserve("ORD-1", [{"id": 1, "quantity": 1}])
+        same = await reservations.reserve("ORD-1", [{"id": 1, "quantity": 2}])
+        assert same["status"] == "converted"
+        return await fake_db.stock_holds.find_one({"_id": 1})
+
+    hold = loop.run_until_complete(run())
+    assert hold["reserved"] == 0
+    assert hold["stock"] == STOCK - 2
+    assert hold["available"] == STOCK - 2